@@ -1,15 +1,20 @@
 import warnings
+import os
 import time
 import pathlib
 import logging
 import pandas as pd
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 import asyncio
+import json
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import brainaccess_board as bb  # Zakładamy, że to niestandardowy moduł
-import matplotlib.pyplot as plt
+from brainaccess_board.metrics import registry as metrics
 
 warnings.filterwarnings("ignore")
 
@@ -17,13 +22,72 @@ warnings.filterwarnings("ignore")
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-plt.ion()
-plt.show(block=False)
-
 app = FastAPI()
 
 stress_finetuning = 1
 
+PROCESSOR_METRIC = "eeg_processor_stage_seconds"
+PROCESSOR_HELP = "Czas etapów przetwarzania EEGProcessor"
+SAMPLE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000)
+
+# Tryb pamięci współdzielonej dla wielu workerów uvicorn:
+# EEG_SHM_NAME włącza tryb, EEG_SHM_ROLE = auto | producer | consumer.
+# W trybie auto pierwszy worker, który utworzy segment, zostaje producentem.
+SHM_NAME = os.environ.get("EEG_SHM_NAME")
+SHM_ROLE = os.environ.get("EEG_SHM_ROLE", "auto")
+SHM_CAPACITY = int(os.environ.get("EEG_SHM_CAPACITY", "10000"))
+# Konsument uznaje dane za nieaktualne (503), gdy producent nie zapisał nic
+# przez EEG_SHM_MAX_AGE sekund; bezczynny producent odświeża czas co cykl.
+SHM_MAX_AGE = float(os.environ.get("EEG_SHM_MAX_AGE", "15"))
+# Metadane mają stały rozmiar (META_SIZE), publikujemy tylko najnowsze zakresy artefaktów
+SHM_MAX_ARTIFACT_RANGES = int(os.environ.get("EEG_SHM_MAX_ARTIFACT_RANGES", "200"))
+
+# Typ próbek w ścieżce strumieniowej (dekodowanie, filtr, bufor współdzielony);
+# float32 zmniejsza o połowę pamięć i transfer okna
+DTYPE = np.dtype(os.environ.get("EEG_DTYPE", "float32"))
+
+# Linia bazowa stresu: stała pamięć niezależnie od długości kalibracji.
+# EEG_BASELINE_FILE zachowuje ją między restartami, EEG_BASELINE_HALF_LIFE
+# (w próbkach) włącza stopniowe zapominanie starych danych.
+BASELINE_FILE = os.environ.get("EEG_BASELINE_FILE")
+BASELINE_HALF_LIFE = float(os.environ.get("EEG_BASELINE_HALF_LIFE", "0")) or None
+BASELINE_SAVE_INTERVAL = 60.0
+
+# Endpointy /admin (profilowanie, tracemalloc) są domyślnie wyłączone:
+# EEG_ADMIN=1 je włącza, EEG_ADMIN_TOKEN wymaga nagłówka X-Admin-Token.
+ADMIN_ENABLED = os.environ.get("EEG_ADMIN", "0").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.environ.get("EEG_ADMIN_TOKEN")
+MAX_PROFILE_SECONDS = 300.0
+
+# Trwała pamięć podręczna zdekodowanych próbek: po restarcie dekodowane są
+# tylko wiersze dopisane od ostatniego zapisu. EEG_SAMPLE_CACHE = katalog
+# (pusty wyłącza), EEG_SAMPLE_CACHE_MB = limit rozmiaru (usuwanie LRU).
+SAMPLE_CACHE_DIR = os.environ.get("EEG_SAMPLE_CACHE")
+SAMPLE_CACHE_MB = float(os.environ.get("EEG_SAMPLE_CACHE_MB", "2048"))
+
+# Potok przetwarzania: odczyt -> filtr/cechy -> ocena -> publikacja, etapy
+# połączone ograniczonymi kolejkami. Gdy etap nie nadąża, EEG_PIPELINE_POLICY
+# decyduje o nowym elemencie: coalesce (scalenie z oczekującym, bez utraty
+# próbek), drop_oldest (odrzucenie najstarszego, filtr widzi przerwę) lub
+# block (producent czeka). EEG_PIPELINE_QUEUE = pojemność kolejek.
+PIPELINE_POLICY = os.environ.get("EEG_PIPELINE_POLICY", "coalesce")
+PIPELINE_QUEUE = int(os.environ.get("EEG_PIPELINE_QUEUE", "1"))
+PIPELINE_STAGES = ("features", "scoring", "publish")
+LAG_METRIC = "eeg_pipeline_lag_seconds"
+LAG_HELP = "Wiek danych (od rozpoczęcia odczytu) po zakończeniu etapu"
+
+# Wielu badanych w jednym procesie: EEG_SUBJECTS = plik JSON
+# {"id": {"database": ścieżka, "device": nazwa, "baseline_file": ścieżka}},
+# poziomy pod /subjects/{id}/levels. Wszystkie procesory dzielą pętlę zdarzeń
+# i pulę EEG_WORKERS wątków (domyślnie liczba rdzeni).
+SUBJECTS_FILE = os.environ.get("EEG_SUBJECTS")
+
+# Okno ostatnich surowych próbek (wszystkie kanały, V) w pamięci dla /get_window;
+# starsze dane są czytane z bazy. EEG_WINDOW_SECONDS = długość okna w pamięci.
+WINDOW_SECONDS = float(os.environ.get("EEG_WINDOW_SECONDS", "60"))
+MAX_WINDOW_SECONDS = 3600.0
+WORKERS = int(os.environ.get("EEG_WORKERS", "0")) or os.cpu_count() or 1
+
 class SlidingDataFrame:
     def __init__(self, max_length):
         """
@@ -97,20 +161,139 @@ class SlidingDataFrame:
         count_above_mean = (other_data["Value"] > mean_value).sum()
         return (count_above_mean / total_values) * 100
 
+# Progi poziomu relaksu dla poziomów stresu 0, 1, 2 (poniżej ostatniego: 3)
+STRESS_THRESHOLDS = (75, 50, 25)
+
+
+def score_relaxation(baseline, o1, finetuning=None):
+    """
+    Dodaje fragment o1 do linii bazowej i zwraca poziom relaksu (0-100).
+    Wspólne dla ścieżki na żywo i przeliczeń offline (backfill.py).
+    """
+    if finetuning is None:
+        finetuning = stress_finetuning
+    baseline.update(o1)
+    stress_threshold = baseline.mean * finetuning
+    return 100 - baseline.fraction_above(o1, stress_threshold)
+
+
+def stress_from_relaxation(relaxation_level, thresholds=STRESS_THRESHOLDS):
+    """
+    Zamienia poziom relaksu na poziom stresu 0-3.
+    """
+    for level, threshold in enumerate(thresholds):
+        if relaxation_level > threshold:
+            return level
+    return len(thresholds)
+
+
+def merge_raw(older, newer, labels=None):
+    """
+    Scala dwa odczyty surowych próbek czekające w kolejce (ciągłość filtra).
+    Odczytów innego urządzenia lub częstotliwości nie da się połączyć:
+    starsze próbki są odrzucane i liczone w eeg_pipeline_dropped_samples.
+    """
+    if older["device"] != newer["device"] or older["sfreq"] != newer["sfreq"]:
+        dropped = older["data"].shape[1]
+        logger.warning(f"Odrzucono {dropped} próbek {older['device']}: zmiana urządzenia lub częstotliwości")
+        metrics.inc("eeg_pipeline_dropped_samples", dropped, labels=labels or {},
+                    help="Próbki odrzucone przy scalaniu niezgodnych odczytów")
+        return newer
+    merged = dict(newer)
+    merged["data"] = np.concatenate([older["data"], newer["data"]], axis=1)
+    merged["start"] = older["start"]
+    # Opóźnienie liczone od najstarszych danych w scalonym elemencie
+    merged["fetch_started"] = min(older["fetch_started"], newer["fetch_started"])
+    return merged
+
+
+def merge_frames(older, newer):
+    """
+    Scala dwa przefiltrowane fragmenty razem z maskami artefaktów.
+    """
+    # pd.concat porównuje attrs, a maski artefaktów to tablice
+    frame = pd.DataFrame(
+        np.concatenate([older.to_numpy(), newer.to_numpy()]),
+        index=older.index.append(newer.index),
+        columns=newer.columns,
+    )
+    frame.attrs = dict(newer.attrs)
+    if "fetch_started" in older.attrs and "fetch_started" in newer.attrs:
+        frame.attrs["fetch_started"] = min(older.attrs["fetch_started"], newer.attrs["fetch_started"])
+    if "artifacts" in older.attrs and "artifacts" in newer.attrs:
+        frame.attrs["artifacts"] = np.concatenate(
+            [older.attrs["artifacts"], newer.attrs["artifacts"]]
+        )
+    return frame
+
+
 class EEGProcessor:
-    def __init__(self) -> None:
+    def __init__(self, database="current", device=None, subject=None,
+                 baseline_file=BASELINE_FILE, executor=None) -> None:
+        # Baza danych (domyślnie bieżąca sesja płytki) i urządzenie (domyślnie pierwsze)
+        self.database = database
+        self.device = device
+        self.subject = subject
+        self.baseline_file = baseline_file
+        # Pula wątków dla blokującej pracy; None = domyślna pula pętli
+        self.executor = executor
+        # Etykieta metryk odróżnia badanych; procesor domyślny jej nie ma
+        self.labels = {"subject": subject} if subject is not None else {}
         self.db = None
         self.db_status = False
         self.prevrange = 0
         self.channels_to_include = [1, 2, 3, 4]  # Wybrane kanały
         self.latest_relaxation = None
         self.latest_stress = None
+        self.latest_quality = None
+        self.sfreq = None
+        self.dtype = DTYPE
+        self.cache = None
+
+        # Ostatnie surowe próbki do pobierania okien (tworzone przy pierwszych danych)
+        self.ring = None
+        self.ring_meta = None
+
+        # Pamięć współdzielona: producent zapisuje, konsumenci tylko czytają
+        self.shared_writer = None
+        self.shared_reader = None
 
         # Stress detection
         self.stress_threshold = 100
         self.historical_data = pd.DataFrame(columns=["fp2", "fp1", "o2", "o1"])
 
-        self.sliding_df = SlidingDataFrame(max_length=3000)        
+        # Histogram + momenty Welforda zamiast okna 3000 próbek w DataFrame
+        self.baseline = bb.StreamingBaseline(half_life=BASELINE_HALF_LIFE)
+        self.baseline_saved = time.monotonic()
+
+        # Filtr strumieniowy (pasmo 1-40 Hz, notch 50 Hz, usuwanie DC), stan per urządzenie
+        self.filter_bank = bb.FilterBank(bandpass=(1.0, 40.0), notch=50.0)
+
+        # Jakość sygnału (std, impedancja, flatline, saturacja) liczona na surowych danych
+        self.quality_monitor = bb.QualityMonitor(window=2.0)
+
+        # Mrugnięcia, ruchy oczu (fp1/fp2) i ruch na przefiltrowanych danych;
+        # maska próbek z artefaktami jest pomijana w ocenie i linii bazowej
+        self.artifact_monitor = bb.ArtifactMonitor()
+
+        # Cykl startuje, gdy płytka zapisze nowe dane (watcher bazy);
+        # fetch_interval to interwał zapasowy, gdy watcher jest niedostępny
+        self.watcher = None
+        self.watched_file = None
+        self.fetch_interval = .5
+        self.min_fetch_interval = .05
+        self.idle_timeout = 5.0
+
+        # Zadanie w tle uruchamiane przy starcie aplikacji
+        self.fetch_task = None
+
+        # Kolejki wejściowe etapów potoku (nazwa etapu -> kolejka)
+        self.queues = self.create_queues(PIPELINE_POLICY, PIPELINE_QUEUE)
+
+        # Profilowanie cykli na żądanie (/admin/profile); nieaktywne nic nie kosztuje
+        self.profiler = bb.TickProfiler()
+        # Wątki puli, które wykonywały pracę procesora (do próbkowania)
+        self.worker_threads = set()
 
         # Lock dla bezpieczeństwa wątków
         self.lock = asyncio.Lock()
@@ -122,16 +305,94 @@ class EEGProcessor:
         root_dir = pathlib.Path(__file__).parent
         logger.info(f"Kod znajduje się w: {root_dir}")
 
-        self.db, self.db_status = bb.db_connect()
+        # sqlite utworzyłby pusty plik w miejscu błędnej ścieżki
+        if self.database != "current" and not os.path.exists(self.database):
+            raise ConnectionError(f"Brak pliku bazy danych {self.database}")
+
+        if SAMPLE_CACHE_DIR:
+            self.cache = bb.SampleCache(SAMPLE_CACHE_DIR, max_bytes=int(SAMPLE_CACHE_MB * 1024**2))
+            logger.info(f"Pamięć podręczna próbek: {self.cache.directory}")
+        self.db, self.db_status = bb.db_connect(self.database, cache=self.cache)
         if not self.db_status:
             logger.error("Nie udało się połączyć z bazą danych")
             raise ConnectionError("Nie udało się połączyć z bazą danych.")
 
         logger.info("Połączenie z bazą danych udane")
 
-    async def _fetch_data(self):
+        self._watch()
+
+        if self.baseline_file and os.path.exists(self.baseline_file):
+            self.baseline = bb.StreamingBaseline.load(self.baseline_file)
+            logger.info(f"Wczytano linię bazową z {self.baseline_file} ({self.baseline.weight:.0f} próbek)")
+
+    def start(self):
+        """
+        Uruchamia potok w tle (referencja chroni zadanie przed usunięciem).
+        """
+        self.fetch_task = asyncio.create_task(self.data_fetching_task())
+
+    async def stop(self):
         """
-        Pobiera dane z bazy danych.
+        Zatrzymuje potok, zamyka watchera i zapisuje linię bazową.
+        """
+        if self.fetch_task is not None:
+            self.fetch_task.cancel()
+            # Zadanie musi się zakończyć, zanim zamkniemy watchera, na którym czeka
+            try:
+                await self.fetch_task
+            except asyncio.CancelledError:
+                pass
+            self.fetch_task = None
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.watched_file = None
+        if self.db_status:
+            self.save_baseline()
+
+    async def run_blocking(self, func, *args):
+        """
+        Wykonuje blokującą funkcję we wspólnej puli wątków.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._in_worker, func, *args
+        )
+
+    def _in_worker(self, func, *args):
+        """
+        Wywołanie w wątku puli; profilowane osobno, bo cProfile i próbkowanie
+        pętli zdarzeń nie widzą innych wątków.
+        """
+        self.worker_threads.add(threading.get_ident())
+        with self.profiler.section():
+            return func(*args)
+
+    def save_baseline(self):
+        """
+        Zapisuje linię bazową na dysk, jeśli skonfigurowano plik linii bazowej.
+        """
+        if self.baseline_file and self.baseline.weight:
+            self.baseline.save(self.baseline_file)
+            self.baseline_saved = time.monotonic()
+
+    def create_queues(self, policy="coalesce", maxsize=1):
+        """
+        Tworzy kolejki między etapami potoku z podaną polityką przepełnienia.
+        """
+        merges = {
+            "features": partial(merge_raw, labels=self.labels),
+            "scoring": merge_frames,
+            "publish": merge_frames,
+        }
+        return {
+            stage: bb.StageQueue(stage, maxsize=maxsize, policy=policy, merge=merges[stage],
+                                 labels=self.labels)
+            for stage in PIPELINE_STAGES
+        }
+
+    def _read_new(self):
+        """
+        Odczytuje nowe próbki wybranych kanałów (blokujące, uruchamiane w wątku).
         """
         if not self.db_status:
             logger.error("Brak dostępnego połączenia z bazą danych.")
@@ -151,20 +412,162 @@ class EEGProcessor:
         #data = self.db.get_mne(time_range=time_range)
         ###
 
-        data = self.db.get_mne()
+        # Surowe tablice w self.dtype, skalowane do V w miejscu (bez konwersji do MNE);
+        # tylko próbki od self.prevrange, z pamięci podręcznej bez kopii całej sesji
+        data = self.db.get_arrays(device=self.device, dtype=self.dtype, scale=True,
+                                  start=self.prevrange)
         if not data:
             logger.warning("Brak dostępnych danych, proszę podłączyć urządzenie w konfiguracji płytki.")
             return None
 
         for device, device_data in data.items():
-            data_chunk = pd.DataFrame(device_data.get_data().T)
-            unfiltered = data_chunk.iloc[:, [ch - 1 for ch in self.channels_to_include]]
-            filtered = unfiltered[self.prevrange:]
-            self.prevrange = len(unfiltered)
-            return filtered
+            columns = [ch - 1 for ch in self.channels_to_include]
+            first = device_data["first_sample"]
+            total = first + device_data["data"].shape[1]
+            raw = {
+                "device": device,
+                "data": device_data["data"][columns],
+                "start": first,
+                "columns": columns,
+                "channels": [device_data["meta"]["channels"][c] for c in columns],
+                "sfreq": device_data["meta"]["srate"],
+                "fetch_started": time.time(),
+                # Wszystkie kanały dla okna w pamięci
+                "window": device_data["data"],
+                "times": device_data["time"],
+                "all_channels": device_data["meta"]["channels"],
+            }
+            self.prevrange = total
+            return raw
 
         return None
 
+    def _buffer(self, raw):
+        """
+        Przenosi surowe próbki wszystkich kanałów z odczytu do okna w pamięci.
+        """
+        window, times = raw.pop("window"), raw.pop("times")
+        meta = {"device": raw["device"], "channels": raw.pop("all_channels"), "sfreq": raw["sfreq"]}
+        if self.ring is None or self.ring_meta != meta:
+            self.ring = bb.window.SampleRing(len(meta["channels"]), int(WINDOW_SECONDS * meta["sfreq"]))
+            self.ring_meta = meta
+        self.ring.append(window, times)
+
+    def _select_channels(self, names, channels=None):
+        """
+        Pozycje kanałów podanych nazwą lub numerem (od 1); domyślnie wybrane kanały.
+        """
+        if channels is None:
+            return [ch - 1 for ch in self.channels_to_include]
+        rows = []
+        for channel in channels:
+            channel = channel.strip()
+            if channel.isdigit() and 0 < int(channel) <= len(names):
+                rows.append(int(channel) - 1)
+            elif channel in names:
+                rows.append(names.index(channel))
+            else:
+                raise ValueError(f"Nieznany kanał {channel}")
+        return rows
+
+    async def get_window(self, seconds=None, start=None, end=None, channels=None):
+        """
+        Surowe próbki (V, float32): ostatnie `seconds` sekund albo zakres czasu
+        próbek [start, end). Z okna w pamięci, gdy je obejmuje, inaczej z bazy.
+        """
+        ring, meta = self.ring, self.ring_meta
+        if ring is not None and len(ring):
+            first = ring.last_time - seconds if seconds is not None else start
+            if ring.covers(first):
+                rows = self._select_channels(meta["channels"], channels)
+                if seconds is not None:
+                    data, times = ring.last(seconds, rows)
+                else:
+                    data, times = ring.read(start, end, rows)
+                metrics.inc("eeg_window_requests", labels={"source": "memory", **self.labels},
+                            help="Liczba pobranych okien próbek")
+                return {
+                    "data": data,
+                    "times": times,
+                    "channels": [meta["channels"][r] for r in rows],
+                    "sfreq": meta["sfreq"],
+                    "source": "memory",
+                }
+        device = self.device or (meta["device"] if meta else None)
+        window = await self.run_blocking(self._read_window, device, seconds, start, end, channels)
+        metrics.inc("eeg_window_requests", labels={"source": "database", **self.labels},
+                    help="Liczba pobranych okien próbek")
+        return window
+
+    def _read_window(self, device, seconds, start, end, channels):
+        """
+        Okno z bazy danych (blokujące), osobne połączenie obok potoku.
+        """
+        try:
+            db = bb.ReadDB(self.database, cache=self.cache)
+        except Exception as e:
+            logger.warning(f"Nie udało się otworzyć bazy danych {self.database}: {e}")
+            return None
+        if seconds is None:
+            # Zakres czasu: tylko wiersze, które go obejmują (wyszukiwanie po rowid)
+            device_data = db.get_range(device, start, end, dtype=np.float32, scale=True)
+            if not device_data:
+                return None
+            lo, hi = 0, None
+        else:
+            # Ostatnie sekundy według local_clock, z zapasem na dokładne przycięcie
+            data = db.get_arrays(device=device, duration=int(np.ceil(seconds)) + 1,
+                                 dtype=np.float32, scale=True)
+            if not data:
+                return None
+            device_data = next(iter(data.values()))
+            times = np.ravel(device_data["time"])
+            lo, hi = int(np.searchsorted(times, times[-1] - seconds, side="right")), None
+        names = device_data["meta"]["channels"]
+        rows = self._select_channels(names, channels)
+        times = np.ravel(device_data["time"])
+        return {
+            "data": device_data["data"][rows, lo:hi],
+            "times": times[lo:hi],
+            "channels": [names[r] for r in rows],
+            "sfreq": device_data["meta"]["srate"],
+            "source": "database",
+        }
+
+    async def _extract_features(self, raw):
+        """
+        Jakość sygnału, filtr i wykrywanie artefaktów dla nowych próbek.
+        Obliczenia w wątku: stan filtrów zmienia tylko ten etap.
+        """
+        if raw is None:
+            return None
+        frame, quality = await self.run_blocking(self._features, raw)
+        async with self.lock:
+            self.latest_quality = quality
+        return frame
+
+    def _features(self, raw):
+        """
+        Zwraca przefiltrowany fragment (z maską artefaktów) i jakość sygnału.
+        """
+        device, new_data, columns = raw["device"], raw["data"], raw["columns"]
+        index = pd.RangeIndex(raw["start"], raw["start"] + new_data.shape[1])
+        sfreq = raw["sfreq"]
+        self.sfreq = sfreq
+        # Jakość kontaktu elektrod (dane w V, monitor oczekuje uV)
+        quality = self.quality_monitor.update(device, new_data * 1e6, sfreq).summary()
+        # Każda nowa próbka przechodzi przez filtr dokładnie raz
+        filtered = self.filter_bank.process(device, new_data, sfreq)
+        artifacts = self.artifact_monitor.update(
+            device, filtered * 1e6, sfreq, bb.artifacts.frontal_channels(raw["channels"])
+        )
+        metrics.inc("eeg_artifact_samples", int(artifacts.sum()), labels=self.labels,
+                    help="Liczba próbek oznaczonych jako artefakty")
+        frame = pd.DataFrame(filtered.T, index=index, columns=columns)
+        frame.attrs["artifacts"] = artifacts
+        frame.attrs["fetch_started"] = raw["fetch_started"]
+        return frame, quality
+
     async def _compute_levels(self, data_chunk):
         """
         Oblicza poziomy relaksu i stresu na podstawie danych.
@@ -172,42 +575,34 @@ class EEGProcessor:
         if data_chunk is None or data_chunk.empty:
             return
 
-        # ELEKTRODA o1
-        o1 = data_chunk[0]
-        self.sliding_df.add_data(o1)
-        stress_threshold = self.sliding_df.calculate_mean()
-        percentage_above_mean = self.sliding_df.calculate_percentage_above_mean(o1)
-
-        # IMPEDANCE_DRIVE_AMPS = 6.0e-9  # 6 nA
-        # BOARD_RESISTOR_OHMS = 2 * 4.7e3  # 4.7 kOhm
-
-        # # o1 = data_chunk[0]
-        # # print("o1 first element: ", o1[self.prevrange-1])
-        # # print("GG: ", (
-        # #     (np.sqrt(2.0) * o1[self.prevrange-1] * 1.0e-6) / IMPEDANCE_DRIVE_AMPS - BOARD_RESISTOR_OHMS
-        # # ))
-        # # print("o1 uV: ", o1[self.prevrange-1] * BOARD_RESISTOR_OHMS) # uV
-
-        # data = np.std(data_chunk, axis=1)
-        # impedance = (
-        #     (np.sqrt(2.0) * data * 1.0e-6) / IMPEDANCE_DRIVE_AMPS - BOARD_RESISTOR_OHMS
-        # ) / 1000
-        # impedance[impedance < 0] = 0
-
-        # print(impedance)
-        
-        # print("GG: ", (
-        #     (np.sqrt(2.0) * o1[self.prevrange-1] * 1.0e-6) / IMPEDANCE_DRIVE_AMPS - BOARD_RESISTOR_OHMS
-        # ))
+        # Słaby kontakt elektrody o1 - wynik byłby niewiarygodny
+        async with self.lock:
+            quality = self.latest_quality
+            if quality is not None and not quality["good"][0]:
+                logger.warning("Słaby kontakt elektrody o1, pomijam obliczenie poziomów")
+                self.latest_relaxation = None
+                self.latest_stress = None
+                return
+
+        # ELEKTRODA o1, bez próbek z artefaktami
+        o1 = data_chunk[0].to_numpy()
+        artifacts = data_chunk.attrs.get("artifacts")
+        if artifacts is not None:
+            o1 = o1[~artifacts]
+        if o1.size == 0:
+            logger.info("Cały fragment zawiera artefakty, pozostawiam poprzednie poziomy")
+            return
+        relaxation_level = score_relaxation(self.baseline, o1)
 
         #relaxation_level = max(0, min(100, 50 + data_chunk.mean().mean() + fluctuation))
         #stress_level = 100 - relaxation_level
 
         #print("relaxation_level: ", relaxation_level)
         #print("stress_level: ", stress_level)
+        # import matplotlib.pyplot as plt  # tylko do debugowania, import kosztowny
         # plt.close()
         # time.sleep(0.001)
-        # plt.plot(impedance.head(100))
+        # plt.plot(self.latest_quality["impedance"])
         # plt.draw()
         # plt.pause(0.0001)
 
@@ -215,7 +610,6 @@ class EEGProcessor:
         print("----------------------------")
 
         # W TE ZMIENNE ZAPISUJEMY DANE, KTÓRE LĄDUJĄ NA API
-        relaxation_level = 100 - percentage_above_mean
         # stress_level = 100 - relaxation_level
         stress_level = 0  #o1[self.prevrange-1]
 
@@ -223,41 +617,287 @@ class EEGProcessor:
 
         async with self.lock:
             self.latest_relaxation = relaxation_level
-            
-            if (relaxation_level > 75):
-                self.latest_stress = 0
-            elif (relaxation_level > 50):
-                self.latest_stress = 1
-            elif (relaxation_level > 25):
-                self.latest_stress = 2
-            else:
-                self.latest_stress = 3
+            self.latest_stress = stress_from_relaxation(relaxation_level)
 
 
     async def data_fetching_task(self):
         """
-        Zadanie w tle do ciągłego pobierania danych i obliczania poziomów.
+        Zadanie w tle: etapy potoku działają współbieżnie, połączone kolejkami.
+        """
+        await asyncio.gather(
+            self._ingest_stage(),
+            self._run_stage("features", self._extract_features, "scoring"),
+            self._run_stage("scoring", self._score, "publish"),
+            self._run_stage("publish", self._publish, None),
+        )
+
+    async def _ingest_stage(self):
+        """
+        Etap odczytu: czeka na nowe wiersze i odczytuje je w wątku, nie blokując pętli.
+        """
+        while True:
+            fetch_started = time.time()
+            try:
+                with self.profiler.section(), \
+                        metrics.timer(PROCESSOR_METRIC, {"stage": "fetch", **self.labels}, PROCESSOR_HELP):
+                    raw = await self.run_blocking(self._read_new)
+            except Exception:
+                logger.exception("Błąd odczytu danych")
+                raw = None
+            samples = 0 if raw is None else raw["data"].shape[1]
+            if samples:
+                self._buffer(raw)
+            metrics.observe("eeg_samples_per_tick", samples, labels=self.labels,
+                            help="Liczba nowych próbek w cyklu", buckets=SAMPLE_BUCKETS)
+            if samples:
+                await self.queues["features"].put(raw)
+            elif self.shared_writer is not None:
+                # Brak nowych danych, ale producent działa
+                self.shared_writer.touch()
+
+            with metrics.timer(PROCESSOR_METRIC, {"stage": "wait", **self.labels}, PROCESSOR_HELP):
+                await self._wait_for_data(fetch_started)
+
+    async def _run_stage(self, stage, handler, next_stage):
+        """
+        Pętla etapu: pobiera element z kolejki, przetwarza go i przekazuje dalej.
+        Błąd jednego elementu nie zatrzymuje potoku.
         """
+        queue = self.queues[stage]
         while True:
-            data_chunk = await self._fetch_data()
+            item = await queue.get()
+            try:
+                with self.profiler.section(), \
+                        metrics.timer(PROCESSOR_METRIC, {"stage": stage, **self.labels}, PROCESSOR_HELP):
+                    result = await handler(item)
+            except Exception:
+                logger.exception(f"Błąd w etapie {stage}")
+                continue
+            if result is None:
+                continue
+            metrics.observe(LAG_METRIC, time.time() - result.attrs["fetch_started"],
+                            labels={"stage": stage, **self.labels}, help=LAG_HELP)
+            if next_stage is not None:
+                await self.queues[next_stage].put(result)
+
+    async def _score(self, data_chunk):
+        """
+        Etap oceny: aktualizuje poziomy udostępniane przez API.
+        """
+        await self._compute_levels(data_chunk)
+        return data_chunk
+
+    async def _publish(self, data_chunk):
+        """
+        Etap publikacji: pamięć współdzielona, metryki świeżości, zapis linii bazowej.
+        """
+        metrics.inc("eeg_ticks", labels=self.labels, help="Liczba wykonanych cykli")
+        # Para znaczników czasu pozwala zmierzyć świeżość wyników (dane -> API)
+        metrics.set("eeg_fetch_timestamp_seconds", data_chunk.attrs["fetch_started"],
+                    labels=self.labels,
+                    help="Czas rozpoczęcia pobrania danych dla ostatnich poziomów")
+        metrics.set("eeg_levels_timestamp_seconds", time.time(), labels=self.labels,
+                    help="Czas ostatniej aktualizacji poziomów")
+        if self.shared_writer is not None:
+            await self._publish_shared(data_chunk)
+        if time.monotonic() - self.baseline_saved > BASELINE_SAVE_INTERVAL:
+            self.save_baseline()
+        return data_chunk
+
+    def pipeline_stats(self):
+        """
+        Stan kolejek potoku: głębokość, odrzucone i scalone elementy, ostatnie opóźnienie.
+        """
+        return {stage: queue.stats() for stage, queue in self.queues.items()}
+
+    def _watch(self):
+        """
+        Tworzy watchera pliku bazy; "current" wskazuje nowy plik przy każdym nagraniu.
+        """
+        filename = str(self.db.filename)
+        if filename == self.watched_file:
+            return
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.watched_file = filename
+        try:
+            self.watcher = self.db.watch()
+            logger.info(f"Obserwuję zmiany pliku {filename}")
+        except Exception as e:
+            logger.warning(f"Brak powiadomień o zmianach bazy, odpytywanie co {self.fetch_interval} s: {e}")
+
+    async def _wait_for_data(self, fetch_started):
+        """
+        Czeka, aż płytka zapisze nowe wiersze w bazie (bez watchera: stały interwał).
+        """
+        self._watch()
+        if self.watcher is None:
+            await asyncio.sleep(self.fetch_interval)
+            return
+        await self.watcher.wait_async(timeout=self.idle_timeout)
+        # Łączenie serii zapisów w jeden cykl
+        remaining = self.min_fetch_interval - (time.time() - fetch_started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def _publish_shared(self, data_chunk):
+        """
+        Publikuje nowe próbki i poziomy w pamięci współdzielonej.
+        """
+        samples = None if data_chunk is None or data_chunk.empty else data_chunk.to_numpy().T
+        # Zakresy próbek z artefaktami w numeracji bufora (write_pos); początek
+        # fragmentu dłuższego niż bufor nie trafia do pamięci i nie ma zakresów
+        artifacts = []
+        if samples is not None and "artifacts" in data_chunk.attrs:
+            skipped, first = self.shared_writer.positions(samples.shape[1])
+            artifacts = bb.artifacts.mask_ranges(data_chunk.attrs["artifacts"][skipped:], first)
+        # Pominięte starsze zakresy są liczone, konsument wie, że lista jest niepełna
+        skipped = max(0, len(artifacts) - SHM_MAX_ARTIFACT_RANGES)
+        meta = {
+            "quality": self.latest_quality,
+            "artifacts": artifacts[skipped:],
+            "artifacts_skipped": skipped,
+        }
+        async with self.lock:
+            stored = self.shared_writer.publish(
+                samples,
+                relaxation=self.latest_relaxation,
+                stress=self.latest_stress,
+                meta=meta,
+                sfreq=self.sfreq,
+            )
+        if not stored:
+            logger.warning(f"Metadane przekraczają {bb.shared.META_SIZE} B, konsumenci widzą poprzednie")
+
+    def setup_shared(self, name, role="auto", capacity=10000):
+        """
+        Konfiguruje tryb pamięci współdzielonej. Zwraca rolę: producer lub consumer.
+        """
+        if role in ("auto", "producer"):
+            try:
+                self.shared_writer = bb.SharedWindowWriter(
+                    name, n_channels=len(self.channels_to_include), capacity=capacity,
+                    dtype=self.dtype,
+                )
+                logger.info(f"Producent pamięci współdzielonej {name}")
+                return "producer"
+            except FileExistsError:
+                if role == "producer":
+                    raise
+        self.shared_reader = bb.SharedWindowReader(name)
+        logger.info(f"Konsument pamięci współdzielonej {name}")
+        return "consumer"
 
-            await self._compute_levels(data_chunk)
-            await asyncio.sleep(.5)  # Możesz dostosować interwał czasowy
+    def close_shared(self):
+        if self.shared_writer is not None:
+            self.shared_writer.close(unlink=True)
+            self.shared_writer = None
+        if self.shared_reader is not None:
+            self.shared_reader.close()
+            self.shared_reader = None
 
     async def get_latest_levels(self):
         """
         Zwraca najnowsze obliczone poziomy.
         """
+        if self.shared_reader is not None:
+            levels = self.read_shared()
+            if levels is None:
+                return None, None
+            return levels["relaxation"], levels["stress"]
         async with self.lock:
             return self.latest_relaxation, self.latest_stress
 
+    async def get_latest_quality(self):
+        """
+        Zwraca najnowszą jakość sygnału dla wybranych kanałów.
+        """
+        if self.shared_reader is not None:
+            levels = self.read_shared()
+            return None if levels is None else levels["meta"].get("quality")
+        async with self.lock:
+            return self.latest_quality
+
+    def read_shared(self):
+        """
+        Stan z pamięci współdzielonej albo None, gdy producent przestał go odświeżać.
+        """
+        levels = self.shared_reader.read_levels()
+        age = time.time() - levels["updated"]
+        if age > SHM_MAX_AGE:
+            logger.warning(f"Dane producenta {self.shared_reader.name} sprzed {age:.0f} s, pomijam")
+            return None
+        return levels
+
+class SubjectManager:
+    """
+    Procesory wielu badanych (każdy z własną bazą i urządzeniem) w jednym procesie.
+    Wspólna pętla zdarzeń przełącza potoki, blokująca praca (odczyt bazy, filtry)
+    trafia do jednej puli wątków. Każdy potok ma naraz najwyżej jedno zadanie
+    na etap, a pula wykonuje je w kolejności zgłoszeń, więc badani są
+    obsługiwani po równo niezależnie od zaległości.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eeg")
+        self.processors = {}
+
+    async def add(self, subject, database="current", device=None, baseline_file=None):
+        """
+        Rejestruje i uruchamia procesor badanego.
+        """
+        if subject in self.processors:
+            raise ValueError(f"Badany {subject} jest już zarejestrowany")
+        processor = EEGProcessor(database, device=device, subject=subject,
+                                 baseline_file=baseline_file, executor=self.executor)
+        await processor.setup()
+        processor.start()
+        self.processors[subject] = processor
+        logger.info(f"Badany {subject}: baza {processor.db.filename}, urządzenie {device or 'pierwsze'}")
+        return processor
+
+    async def remove(self, subject):
+        """
+        Zatrzymuje i wyrejestrowuje procesor badanego.
+        """
+        await self.processors.pop(subject).stop()
+
+    def load(self, path):
+        """
+        Konfiguracja badanych z pliku JSON: {id: {database, device, baseline_file}}.
+        """
+        with open(path) as f:
+            return json.load(f)
+
+    async def close(self):
+        for subject in list(self.processors):
+            await self.remove(subject)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
 processor = EEGProcessor()
+subjects = SubjectManager()
 
 @app.on_event("startup")
 async def startup_event():
+    processor.executor = subjects.executor
+    if SUBJECTS_FILE:
+        # Tryb wielu badanych: procesor domyślny (bieżąca sesja) nie jest uruchamiany
+        for subject, config in subjects.load(SUBJECTS_FILE).items():
+            await subjects.add(subject, **config)
+        return
+    if SHM_NAME and processor.setup_shared(SHM_NAME, SHM_ROLE, SHM_CAPACITY) == "consumer":
+        # Konsument nie łączy się z bazą danych
+        return
     await processor.setup()
-    # Uruchomienie zadania w tle
-    asyncio.create_task(processor.data_fetching_task())
+    processor.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await processor.stop()
+    processor.close_shared()
+    await subjects.close()
 
 @app.get("/get_levels")
 async def get_levels():
@@ -266,5 +906,214 @@ async def get_levels():
         return JSONResponse(status_code=503, content={"message": "Brak dostępnych danych"})
     return stress 
 
+@app.get("/get_quality")
+async def get_quality():
+    quality = await processor.get_latest_quality()
+    if quality is None:
+        return JSONResponse(status_code=503, content={"message": "Brak dostępnych danych"})
+    return quality
+
+@app.get("/get_pipeline")
+async def get_pipeline():
+    """
+    Stan kolejek potoku (konsument pamięci współdzielonej nie ma własnego potoku).
+    """
+    if processor.shared_reader is not None:
+        return JSONResponse(status_code=404, content={"message": "Potok działa w innym procesie"})
+    return processor.pipeline_stats()
+
+def get_subject(subject):
+    if subject not in subjects.processors:
+        raise HTTPException(status_code=404, detail=f"Nieznany badany {subject}")
+    return subjects.processors[subject]
+
+@app.get("/subjects")
+async def list_subjects():
+    return {
+        subject: {"database": str(p.db.filename), "device": p.device}
+        for subject, p in subjects.processors.items()
+    }
+
+@app.get("/subjects/{subject}/levels")
+async def get_subject_levels(subject: str):
+    relaxation, stress = await get_subject(subject).get_latest_levels()
+    if relaxation is None or stress is None:
+        return JSONResponse(status_code=503, content={"message": "Brak dostępnych danych"})
+    return stress
+
+@app.get("/subjects/{subject}/quality")
+async def get_subject_quality(subject: str):
+    quality = await get_subject(subject).get_latest_quality()
+    if quality is None:
+        return JSONResponse(status_code=503, content={"message": "Brak dostępnych danych"})
+    return quality
+
+@app.get("/subjects/{subject}/pipeline")
+async def get_subject_pipeline(subject: str):
+    return get_subject(subject).pipeline_stats()
+
+async def window_response(target, seconds, start, end, channels, format):
+    """
+    Strumień binarny okna próbek (float32 LE, nagłówek raw lub npy), metadane w nagłówkach HTTP.
+    """
+    if format not in bb.window.FORMATS:
+        return JSONResponse(status_code=400, content={"message": f"Nieznany format {format}"})
+    if (seconds is None) == (start is None):
+        return JSONResponse(status_code=400, content={"message": "Podaj seconds albo start (i opcjonalnie end)"})
+    if seconds is not None and not 0 < seconds <= MAX_WINDOW_SECONDS:
+        return JSONResponse(status_code=400, content={"message": f"seconds musi być w (0, {MAX_WINDOW_SECONDS}]"})
+    if target.shared_reader is not None:
+        # Konsument nie ma okna w pamięci, a odczyt z bazy w każdym procesie
+        # przywróciłby obciążenie, które usuwa pamięć współdzielona
+        return JSONResponse(status_code=404, content={"message": "Okna udostępnia proces producenta"})
+    try:
+        window = await target.get_window(seconds, start, end, channels.split(",") if channels else None)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    if window is None:
+        return JSONResponse(status_code=503, content={"message": "Brak dostępnych danych"})
+    times = window["times"]
+    headers = {
+        "X-Channels": ",".join(window["channels"]),
+        "X-Sfreq": str(window["sfreq"]),
+        "X-Samples": str(len(times)),
+        "X-First-Time": str(times[0]) if len(times) else "",
+        "X-Last-Time": str(times[-1]) if len(times) else "",
+        "X-Source": window["source"],
+    }
+    return StreamingResponse(
+        bb.window.iter_window(window["data"], window["sfreq"], window["channels"], times, format),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+@app.get("/get_window")
+async def get_window(seconds: float | None = None, start: float | None = None, end: float | None = None,
+                     channels: str | None = None, format: str = "raw"):
+    """
+    Surowe próbki, z których liczone są poziomy: ostatnie `seconds` sekund albo
+    zakres [start, end) w czasie próbek; channels = nazwy lub numery po przecinku.
+    """
+    return await window_response(processor, seconds, start, end, channels, format)
+
+@app.get("/subjects/{subject}/window")
+async def get_subject_window(subject: str, seconds: float | None = None, start: float | None = None,
+                             end: float | None = None, channels: str | None = None, format: str = "raw"):
+    return await window_response(get_subject(subject), seconds, start, end, channels, format)
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Metryki opóźnień i liczniki w formacie Prometheus.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def check_admin_token(x_admin_token: str | None = Header(default=None)):
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Nieprawidłowy token administracyjny")
+
+admin = APIRouter(prefix="/admin", dependencies=[Depends(check_admin_token)])
+memory_tracker = bb.MemoryTracker()
+
+@admin.get("/profile")
+async def admin_profile(seconds: float = 10.0, mode: str = "cprofile",
+                        sort: str = "cumulative", limit: int = 30, subject: str | None = None):
+    """
+    Profiluje cykle data_fetching_task przez `seconds` sekund.
+    mode=cprofile: statystyki pstats tylko z cykli (bez oczekiwania na dane),
+    razem z odczytem i cechami liczonymi w wątkach puli,
+    mode=sampling: próbkowanie stosu pętli zdarzeń i zajętych wątków puli (bez narzutu).
+    subject wybiera procesor badanego zamiast domyślnego.
+    """
+    target = processor if subject is None else get_subject(subject)
+    profiler = target.profiler
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    if mode == "sampling":
+        # Pętla zdarzeń i wątki puli, w których procesor odczytuje bazę i liczy cechy
+        sampler = bb.SamplingProfiler(threading.get_ident(), workers=list(target.worker_threads))
+        return await asyncio.to_thread(sampler.run, seconds, limit)
+    if mode != "cprofile" or sort not in bb.profiling.SORT_KEYS:
+        return JSONResponse(status_code=400, content={"message": "Nieznany tryb lub klucz sortowania"})
+    try:
+        profiler.start(seconds)
+    except RuntimeError:
+        return JSONResponse(status_code=409, content={"message": "Profilowanie już trwa"})
+    logger.info(f"Profilowanie cykli przez {seconds} s")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        result = profiler.stop(sort=sort, limit=limit)
+    return result
+
+@admin.post("/memory/start")
+async def admin_memory_start():
+    """
+    Włącza tracemalloc (spowalnia alokacje do czasu /admin/memory/stop).
+    """
+    memory_tracker.start()
+    logger.info("tracemalloc włączony")
+    return {"tracing": memory_tracker.tracing}
+
+@admin.post("/memory/stop")
+async def admin_memory_stop():
+    memory_tracker.stop()
+    logger.info("tracemalloc wyłączony")
+    return {"tracing": memory_tracker.tracing}
+
+@admin.get("/memory/top")
+async def admin_memory_top(limit: int = 20, key: str = "lineno"):
+    """
+    Największe alokacje według linii, pliku lub pełnego śladu.
+    """
+    if key not in bb.profiling.MEMORY_KEYS:
+        return JSONResponse(status_code=400, content={"message": "Nieznany klucz grupowania"})
+    if not memory_tracker.tracing:
+        return JSONResponse(status_code=409, content={"message": "tracemalloc nie jest włączony"})
+    return memory_tracker.top(limit=limit, key=key)
+
+@admin.get("/memory/diff")
+async def admin_memory_diff(limit: int = 20, key: str = "lineno"):
+    """
+    Przyrost alokacji od poprzedniego wywołania (pierwsze zapisuje punkt odniesienia).
+    """
+    if key not in bb.profiling.MEMORY_KEYS:
+        return JSONResponse(status_code=400, content={"message": "Nieznany klucz grupowania"})
+    if not memory_tracker.tracing:
+        return JSONResponse(status_code=409, content={"message": "tracemalloc nie jest włączony"})
+    return memory_tracker.diff(limit=limit, key=key)
+
+@admin.get("/objects")
+async def admin_objects():
+    """
+    Liczba i pamięć żywych tablic numpy oraz DataFrame.
+    """
+    return bb.profiling.object_counts()
+
+@admin.post("/subjects/{subject}")
+async def admin_add_subject(subject: str, database: str = "current", device: str | None = None,
+                            baseline_file: str | None = None):
+    """
+    Rejestruje badanego w działającym serwerze.
+    """
+    try:
+        p = await subjects.add(subject, database, device=device, baseline_file=baseline_file)
+    except ValueError as e:
+        return JSONResponse(status_code=409, content={"message": str(e)})
+    except ConnectionError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    return {"subject": subject, "database": str(p.db.filename), "device": device}
+
+@admin.delete("/subjects/{subject}")
+async def admin_remove_subject(subject: str):
+    """
+    Zatrzymuje procesor badanego i zapisuje jego linię bazową.
+    """
+    get_subject(subject)
+    await subjects.remove(subject)
+    return {"subject": subject}
+
+if ADMIN_ENABLED:
+    app.include_router(admin)
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8000)
@@ -15,12 +15,21 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 class CSVLoggerApp:
-    def __init__(self, output_file="output.csv") -> None:
+    def __init__(self, output_file="output.csv", filter_settings=None, cache_dir=None) -> None:
         self.db = None
         self.db_status = False
         self.output_file = output_file
         self.prevrange = {}
         self.channels_to_include = [1, 2, 3, 4]  # Channels to include
+        # Optional streaming filter, e.g. {"bandpass": (1.0, 40.0), "notch": 50.0}
+        self.filter_bank = bb.FilterBank(**filter_settings) if filter_settings is not None else None
+        # Optional on-disk cache of decoded samples, restarts only decode new rows
+        self.cache = bb.SampleCache(cache_dir) if cache_dir else None
+        # Wakes the loop when the board commits new rows, poll_interval is the fallback
+        self.watcher = None
+        self.watched_file = None
+        self.poll_interval = 0.5
+        self.idle_timeout = 5.0
 
     def setup(self):
         """
@@ -29,12 +38,13 @@ class CSVLoggerApp:
         root_dir = pathlib.Path(__file__).parent
         logger.info(f"Code placed here: {root_dir}")
 
-        self.db, self.db_status = bb.db_connect()
+        self.db, self.db_status = bb.db_connect(cache=self.cache)
         if not self.db_status:
             logger.error("Database connection failed")
             raise ConnectionError("Failed to connect to the database.")
         
         logger.info("Database connection successful")
+        self._watch()
         self._initialize_csv_file()
 
     def _initialize_csv_file(self):
@@ -61,9 +71,11 @@ class CSVLoggerApp:
             return
 
         for device, device_data in data.items():
-            self._process_device_data(device, pd.DataFrame(device_data.get_data().T))
+            self._process_device_data(
+                device, pd.DataFrame(device_data.get_data().T), device_data.info["sfreq"]
+            )
 
-    def _process_device_data(self, device, data_chunk):
+    def _process_device_data(self, device, data_chunk, sfreq=None):
         """
         Processes and writes data for a specific device to the CSV file.
         Filters only the channels defined in `channels_to_include`.
@@ -79,9 +91,40 @@ class CSVLoggerApp:
             return
 
         self.prevrange[device] = len(filtered_chunk)
+        if self.filter_bank is not None:
+            new_chunk = pd.DataFrame(
+                self.filter_bank.process(device, new_chunk.to_numpy().T, sfreq).T,
+                columns=new_chunk.columns,
+            )
         logger.info(f"Device: {device} - Writing filtered data to CSV...")
         new_chunk.to_csv(self.output_file, mode="a", index=False, header=False)
 
+    def _watch(self):
+        """
+        Watches the database file, recreated when "current" moves to a new recording.
+        """
+        filename = str(self.db.filename)
+        if filename == self.watched_file:
+            return
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.watched_file = filename
+        try:
+            self.watcher = self.db.watch()
+        except Exception as e:
+            logger.warning(f"No change notifications, polling every {self.poll_interval} s: {e}")
+
+    def _wait_for_data(self):
+        """
+        Blocks until new rows are committed, or for poll_interval without a watcher.
+        """
+        self._watch()
+        if self.watcher is None:
+            time.sleep(self.poll_interval)
+        else:
+            self.watcher.wait(timeout=self.idle_timeout)
+
     def run(self):
         """
         Periodically fetches data and writes it to a CSV file.
@@ -90,14 +133,21 @@ class CSVLoggerApp:
         try:
             while True:
                 self._fetch_and_write_data()
-                time.sleep(0.5)  # Adjust the period as needed
+                self._wait_for_data()
         except KeyboardInterrupt:
             logger.info("Exiting on user request.")
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}")
+        finally:
+            if self.watcher is not None:
+                self.watcher.close()
+                self.watcher = None
+            self.watched_file = None
 
 if __name__ == "__main__":
-    app = CSVLoggerApp(output_file="brainaccess_data.csv")
+    app = CSVLoggerApp(
+        output_file="brainaccess_data.csv", cache_dir=os.environ.get("EEG_SAMPLE_CACHE")
+    )
     try:
         app.setup()
         app.run()
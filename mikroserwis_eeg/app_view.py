@@ -1,3 +1,4 @@
+import os
 import warnings
 import panel as pn
 import pathlib
@@ -15,8 +16,13 @@ logger = logging.getLogger(__name__)
 
 
 class VIEW:
-    def __init__(self) -> None:
+    def __init__(self, filter_settings=None, cache_dir=None) -> None:
         self.app = None
+        self.prevrange = {}
+        # Optional streaming filter, e.g. {"bandpass": (1.0, 40.0), "notch": 50.0}
+        self.filter_bank = bb.FilterBank(**filter_settings) if filter_settings is not None else None
+        # Optional on-disk cache of decoded samples, restarts only decode new rows
+        self.cache = bb.SampleCache(cache_dir) if cache_dir else None
 
     def setup(self):
         """Sets up all widgets"""
@@ -31,7 +37,7 @@ Code placed here: {root_dir}
 
         self.data_field = pn.widgets.StaticText(
             name="data", value="Data will be here")
-        self.db, self.db_status = bb.db_connect()
+        self.db, self.db_status = bb.db_connect(cache=self.cache)
         if self.db_status:
             self.data_field.value = "Database connection successful"
         else:
@@ -43,7 +49,14 @@ Code placed here: {root_dir}
             self.data_field.value = "No data available, please connect the device in the board configuration"
         devices = list(data.keys())
         for device in devices:
-            field = f"Device: {device}\n\n Data: {data[device].get_data()}"
+            samples = data[device].get_data()
+            if self.filter_bank is not None:
+                new_samples = samples[:, self.prevrange.get(device, 0):]
+                self.prevrange[device] = samples.shape[1]
+                if new_samples.shape[1] == 0:
+                    continue
+                samples = self.filter_bank.process(device, new_samples, data[device].info["sfreq"])
+            field = f"Device: {device}\n\n Data: {samples}"
             self.data_field.value = field
 
     def start(self):
@@ -98,7 +111,7 @@ def create(_):
 
 def get_app():
     pn.state.on_session_destroyed(destroy)
-    view = VIEW()
+    view = VIEW(cache_dir=os.environ.get("EEG_SAMPLE_CACHE"))
     app = view.get_app()
     return app
 
@@ -0,0 +1,328 @@
+"""Offline backfill of relaxation/stress levels over a recorded session.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python backfill.py session.db levels.npz --workers 4
+
+The session is cut into ticks, groups of rows whose `local_clock` falls into
+the same `--interval` bin, standing in for the fetch cycles of the live
+service. Each tick goes through the same path as `EEGProcessor`: samples are
+decoded in the processor dtype and scaled to volts, the selected channels are
+checked by the quality monitor, filtered by a streaming filter and screened
+for artifacts, and the clean o1 samples are scored against the running
+baseline.
+
+Decoding, filtering, quality and artifact detection run in a process pool on consecutive windows
+of ticks. A window starts `--warmup` seconds early so the filter and the
+quality window settle before its first scored tick; only the first window
+starts from the same state as the live service. The baseline depends on every
+earlier tick, so scoring runs in the main process, in tick order, as the
+windows come back.
+
+The output is a compressed `.npz` file with one entry per tick: `time` (local
+clock of the last row), `relaxation` (NaN when o1 contact was bad), `stress`
+(-1 when not scored), `samples`, `artifacts` (flagged samples), `good` and the
+`config` used, as JSON.
+"""
+import argparse
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+import brainaccess_board as bb
+from brainaccess_board import sq
+from brainaccess_board.utils import scale_units
+
+WINDOW = 300.0
+WARMUP = 10.0
+INTERVAL = 0.5
+
+
+def split_ticks(clocks: np.ndarray, interval: float) -> np.ndarray:
+    """Index of the first row of every tick.
+
+    Args:
+        clocks (np.ndarray): local clock of every row, in insertion order
+        interval (float): tick length in seconds, 0 makes every commit a tick
+
+    Returns:
+        np.ndarray: start row of each tick
+    """
+    if len(clocks) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if interval > 0:
+        bins = np.floor((clocks - clocks[0]) / interval)
+    else:
+        bins = clocks
+    return np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+
+
+def plan_windows(
+    rowids: np.ndarray,
+    clocks: np.ndarray,
+    starts: np.ndarray,
+    window: float,
+    warmup: float,
+) -> list[dict]:
+    """Cut the ticks into windows handed to the workers.
+
+    Returns:
+        list[dict]: rowid before the first row read, number of rows, rows per
+        tick and number of leading warmup ticks of every window
+    """
+    ends = np.r_[starts[1:], len(rowids)]
+    tick_clocks = clocks[starts]
+    windows = []
+    first = 0
+    while first < len(starts):
+        last = int(np.searchsorted(tick_clocks, tick_clocks[first] + window, side="left"))
+        last = max(last, first + 1)
+        begin = int(np.searchsorted(tick_clocks, tick_clocks[first] - warmup, side="left"))
+        row = starts[begin]
+        windows.append(
+            {
+                "after_rowid": int(rowids[row - 1]) if row > 0 else int(rowids[0]) - 1,
+                "rows": int(ends[last - 1] - row),
+                "ticks": (ends[begin:last] - starts[begin:last]).tolist(),
+                "warmup": first - begin,
+            }
+        )
+        first = last
+    return windows
+
+
+def process_window(
+    path: str,
+    device: str,
+    dtype: str,
+    columns: list[int],
+    filter_settings: dict,
+    quality_settings: dict,
+    artifact_settings: dict,
+    task: dict,
+) -> list[tuple]:
+    """Decode, quality-check, filter and screen one window of ticks (worker process).
+
+    Returns:
+        list[tuple]: (clean filtered o1, o1 contact good, samples, flagged
+        samples) of every scored tick
+    """
+    db = bb.ReadDB(path)
+    db._connect()
+    try:
+        meta = db._get_info(device)
+        rows = sq.get_data_after_rowid(db.handle, device, task["after_rowid"], task["rows"])
+    finally:
+        db._close()
+    sfreq = meta["srate"]
+    flt = bb.StreamingFilter(sfreq, len(columns), **filter_settings)
+    quality = bb.StreamingQuality(len(columns), sfreq, **quality_settings)
+    frontal = bb.artifacts.frontal_channels([meta["channels"][c] for c in columns])
+    detector = bb.StreamingArtifactDetector(len(columns), sfreq, frontal, **artifact_settings)
+    results = []
+    row = 0
+    for index, n_rows in enumerate(task["ticks"]):
+        chunk = rows[row:row + n_rows]
+        row += n_rows
+        data = np.concatenate([x[1] for x in chunk], axis=-1, dtype=np.dtype(dtype))
+        data = scale_units({"data": data, "meta": meta})["data"]
+        new_data = data[columns]
+        quality.update(new_data * 1e6)
+        filtered = flt.process(new_data)
+        artifacts = detector.update(filtered * 1e6)
+        if index >= task["warmup"]:
+            good = quality.summary()["good"][0]
+            results.append(
+                (filtered[0][~artifacts], good, new_data.shape[1], int(artifacts.sum()))
+            )
+    return results
+
+
+def _process(args: tuple) -> list[tuple]:
+    return process_window(*args)
+
+
+def backfill(
+    source: str | pathlib.Path,
+    device: Optional[str] = None,
+    workers: Optional[int] = None,
+    interval: float = INTERVAL,
+    window: float = WINDOW,
+    warmup: float = WARMUP,
+    finetuning: Optional[float] = None,
+    thresholds: Optional[tuple] = None,
+    dtype: Optional[str] = None,
+    baseline: Optional[str | pathlib.Path] = None,
+) -> dict:
+    """Score a whole recorded session.
+
+    Args:
+        source (str | pathlib.Path): board database
+        device (str | None): data device, the one the live service reads by default
+        workers (int | None): worker processes, one per CPU by default
+        interval (float): tick length in seconds
+        window (float): seconds of ticks handed to a worker at a time
+        warmup (float): seconds read before each window to settle the filter
+        finetuning (float | None): baseline multiplier, `app.stress_finetuning` by default
+        thresholds (tuple | None): relaxation thresholds of stress levels 0, 1, 2, ...
+        dtype (str | None): sample dtype, `app.DTYPE` by default
+        baseline (str | pathlib.Path | None): saved baseline to start from
+
+    Returns:
+        dict: per-tick arrays and the config, as written by `save`
+    """
+    import app  # imported lazily, workers only need the library
+
+    processor = app.EEGProcessor()
+    if finetuning is None:
+        finetuning = app.stress_finetuning
+    if thresholds is None:
+        thresholds = app.STRESS_THRESHOLDS
+    dtype = str(np.dtype(dtype or processor.dtype))
+    columns = [ch - 1 for ch in processor.channels_to_include]
+    # The quality window has to be full before the first scored tick
+    warmup = max(warmup, processor.quality_monitor.settings.get("window", 2.0))
+
+    source = str(source)
+    db = bb.ReadDB(source)
+    db._connect()
+    try:
+        if device is None:
+            devices = list(db.list_devices(only_lsl=True)["data"].keys())
+            if not devices:
+                raise ValueError(f"No data device in {source}")
+            device = devices[0]
+        row_clocks = sq.get_row_clocks(db.handle, device)
+    finally:
+        db._close()
+    if not row_clocks:
+        raise ValueError(f"No data of device {device} in {source}")
+    rowids = np.array([r[0] for r in row_clocks], dtype=np.int64)
+    clocks = np.array([r[1] for r in row_clocks], dtype=np.float64)
+    starts = split_ticks(clocks, interval)
+    ends = np.r_[starts[1:], len(rowids)]
+    tasks = plan_windows(rowids, clocks, starts, window, warmup)
+
+    state = bb.StreamingBaseline.load(baseline) if baseline else processor.baseline
+    n_ticks = len(starts)
+    relaxation = np.full(n_ticks, np.nan, dtype=np.float32)
+    stress = np.full(n_ticks, -1, dtype=np.int8)
+    samples = np.zeros(n_ticks, dtype=np.int32)
+    artifacts = np.zeros(n_ticks, dtype=np.int32)
+    good = np.zeros(n_ticks, dtype=bool)
+    arguments = [
+        (
+            source,
+            device,
+            dtype,
+            columns,
+            processor.filter_bank.settings,
+            processor.quality_monitor.settings,
+            processor.artifact_monitor.settings,
+            task,
+        )
+        for task in tasks
+    ]
+    tick = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for results in executor.map(_process, arguments):
+            for o1, o1_good, n_samples, n_artifacts in results:
+                samples[tick] = n_samples
+                artifacts[tick] = n_artifacts
+                good[tick] = o1_good
+                if n_samples == 0 or (o1_good and o1.size == 0):
+                    # The live service keeps the previous levels
+                    if tick:
+                        relaxation[tick], stress[tick] = relaxation[tick - 1], stress[tick - 1]
+                elif o1_good:
+                    level = app.score_relaxation(state, o1, finetuning)
+                    relaxation[tick] = level
+                    stress[tick] = app.stress_from_relaxation(level, thresholds)
+                tick += 1
+
+    return {
+        "time": clocks[ends - 1],
+        "relaxation": relaxation,
+        "stress": stress,
+        "samples": samples,
+        "artifacts": artifacts,
+        "good": good,
+        "baseline": state,
+        "config": {
+            "source": source,
+            "device": device,
+            "interval": interval,
+            "window": window,
+            "warmup": warmup,
+            "finetuning": finetuning,
+            "thresholds": list(thresholds),
+            "dtype": dtype,
+            "channels": processor.channels_to_include,
+            "filter": processor.filter_bank.settings,
+            "quality": processor.quality_monitor.settings,
+            "artifacts": processor.artifact_monitor.settings,
+            "baseline_half_life": state.half_life,
+        },
+    }
+
+
+def save(result: dict, path: str | pathlib.Path) -> None:
+    """Write the levels time series to a compressed `.npz` file"""
+    np.savez_compressed(
+        path,
+        time=result["time"],
+        relaxation=result["relaxation"],
+        stress=result["stress"],
+        samples=result["samples"],
+        artifacts=result["artifacts"],
+        good=result["good"],
+        config=np.array(json.dumps(result["config"])),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=pathlib.Path)
+    parser.add_argument("output", type=pathlib.Path)
+    parser.add_argument("--device")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="tick length in seconds")
+    parser.add_argument("--window", type=float, default=WINDOW, help="seconds per worker task")
+    parser.add_argument("--warmup", type=float, default=WARMUP)
+    parser.add_argument("--finetuning", type=float)
+    parser.add_argument("--thresholds", type=float, nargs="+")
+    parser.add_argument("--dtype")
+    parser.add_argument("--baseline", type=pathlib.Path, help="saved baseline to start from")
+    parser.add_argument("--save-baseline", type=pathlib.Path, help="write the final baseline")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    result = backfill(
+        args.source,
+        device=args.device,
+        workers=args.workers,
+        interval=args.interval,
+        window=args.window,
+        warmup=args.warmup,
+        finetuning=args.finetuning,
+        thresholds=tuple(args.thresholds) if args.thresholds else None,
+        dtype=args.dtype,
+        baseline=args.baseline,
+    )
+    save(result, args.output)
+    if args.save_baseline:
+        result["baseline"].save(args.save_baseline)
+    elapsed = time.perf_counter() - start
+    recorded = result["time"][-1] - result["time"][0] if len(result["time"]) else 0.0
+    print(
+        f"{len(result['time'])} ticks, {int(result['samples'].sum())} samples, "
+        f"{recorded:.0f} s recorded in {elapsed:.1f} s -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""HTTP load test of the levels API while data is being ingested.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m benchmarks.bench_http --clients 1 10 50 --duration 20 --output bench_http.json
+
+By default a synthetic session is replayed in real time into a live database
+(see `benchmarks.replay`) and `app.py` runs in-process with its background
+`data_fetching_task`. With `--url` the clients target an already running
+server instead; pass the live database with `--db` to also measure freshness.
+
+Freshness lag is the time from a row being written to the database until
+`/get_levels` serves levels computed from a fetch that started after it,
+taken from the `eeg_fetch_timestamp_seconds` and
+`eeg_levels_timestamp_seconds` gauges of `/metrics`.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import pathlib
+import platform
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+import httpx
+import mne
+import numpy as np
+
+from brainaccess_board import sq
+
+from .bench_read import _version
+from .replay import replay_session
+from .synthetic import generate_session
+
+FRESHNESS_POLL = 0.05
+GAUGES = ("eeg_fetch_timestamp_seconds", "eeg_levels_timestamp_seconds")
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p95/p99, mean and max of `values` in milliseconds"""
+    if not values:
+        return {"count": 0}
+    arr = np.asarray(values) * 1e3
+    return {
+        "count": int(arr.size),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "mean": float(arr.mean()),
+        "max": float(arr.max()),
+    }
+
+
+async def client(http: httpx.AsyncClient, path: str, stop: float, latencies: list, status: Counter) -> None:
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        try:
+            response = await http.get(path)
+            status[response.status_code] += 1
+        except httpx.HTTPError as e:
+            status[type(e).__name__] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        # In-process requests complete without suspending, let the fetch task run
+        await asyncio.sleep(0)
+
+
+def _parse_gauges(text: str) -> Optional[tuple[float, float]]:
+    values = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in GAUGES:
+            values[name] = float(value)
+    if len(values) < len(GAUGES):
+        return None
+    return values[GAUGES[0]], values[GAUGES[1]]
+
+
+async def watch_updates(http: httpx.AsyncClient, stop: float, updates: set) -> None:
+    """Collect (fetch start, levels visible) pairs of processing cycles"""
+    while time.perf_counter() < stop:
+        try:
+            response = await http.get("/metrics")
+            pair = _parse_gauges(response.text)
+        except httpx.HTTPError:
+            pair = None
+        if pair is not None:
+            updates.add(pair)
+        await asyncio.sleep(FRESHNESS_POLL)
+
+
+def freshness(database: pathlib.Path, updates: set, since: float) -> list[float]:
+    """Lag from each row's arrival (its local_clock) to the first levels
+    computed from a fetch that started after it."""
+    if not updates:
+        return []
+    cycles = np.array(sorted(updates))
+    handle = sq.get_handle(database)
+    arrivals = []
+    try:
+        for device in sq.get_devices(handle):
+            meta = sq.get_metadata(handle, device)
+            if meta and meta[0][3] > 0:
+                arrivals.extend(row[3] for row in sq.get_data_after_rowid(handle, device, 0))
+    finally:
+        sq.close_db(handle)
+    arrivals = np.asarray(sorted(a for a in arrivals if a >= since))
+    first_cycle = np.searchsorted(cycles[:, 0], arrivals, side="left")
+    seen = first_cycle < len(cycles)
+    return (cycles[first_cycle[seen], 1] - arrivals[seen]).tolist()
+
+
+async def run_load(
+    base_url: str,
+    transport: Optional[httpx.AsyncBaseTransport],
+    n_clients: int,
+    duration: float,
+    path: str = "/get_levels",
+) -> tuple[list, Counter, set]:
+    latencies: list[float] = []
+    status: Counter = Counter()
+    updates: set = set()
+    limits = httpx.Limits(max_connections=n_clients + 1)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits,
+                                 timeout=30.0) as http:
+        stop = time.perf_counter() + duration
+        await asyncio.gather(
+            watch_updates(http, stop, updates),
+            *(client(http, path, stop, latencies, status) for _ in range(n_clients)),
+        )
+    return latencies, status, updates
+
+
+async def bench_in_process(clients: list[int], duration: float, warmup: float, live: pathlib.Path) -> list:
+    import app  # imported lazily, it builds the FastAPI application
+
+    await app.startup_event()
+    transport = httpx.ASGITransport(app=app.app)
+    results = []
+    try:
+        await asyncio.sleep(warmup)
+        for n_clients in clients:
+            since = time.time()
+            start = time.perf_counter()
+            latencies, status, updates = await run_load("http://app", transport, n_clients, duration)
+            elapsed = time.perf_counter() - start
+            results.append(_result(n_clients, elapsed, latencies, status,
+                                   freshness(live, updates, since)))
+    finally:
+        await app.shutdown_event()
+    return results
+
+
+async def bench_url(url: str, clients: list[int], duration: float, live: Optional[pathlib.Path]) -> list:
+    results = []
+    for n_clients in clients:
+        since = time.time()
+        start = time.perf_counter()
+        latencies, status, updates = await run_load(url, None, n_clients, duration)
+        elapsed = time.perf_counter() - start
+        lags = freshness(live, updates, since) if live else []
+        results.append(_result(n_clients, elapsed, latencies, status, lags))
+    return results
+
+
+def _result(n_clients: int, elapsed: float, latencies: list, status: Counter, lags: list) -> dict:
+    return {
+        "clients": n_clients,
+        "seconds": elapsed,
+        "requests": sum(status.values()),
+        "throughput_rps": len(latencies) / elapsed,
+        "status": {str(k): v for k, v in status.items()},
+        "latency_ms": percentiles(latencies),
+        "freshness_ms": percentiles(lags),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the levels API")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per client count")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--db", type=pathlib.Path, help="live database of the server (--url)")
+    parser.add_argument("--source", type=pathlib.Path, help="recorded session to replay")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--srate", type=float, default=250.0)
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("bench_http.json"))
+    args = parser.parse_args()
+    mne.set_log_level("WARNING")
+
+    report: dict = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {
+            name: _version(name)
+            for name in ("brainaccess-board", "numpy", "pandas", "mne", "fastapi", "httpx")
+        },
+        "config": {
+            "mode": "url" if args.url else "in-process",
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "devices": args.devices,
+            "channels": args.channels,
+            "srate": args.srate,
+        },
+    }
+    if args.url:
+        report["results"] = asyncio.run(bench_url(args.url, args.clients, args.duration, args.db))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = args.source
+            total = args.warmup + len(args.clients) * (args.duration + 1) + 5
+            if source is None:
+                source = pathlib.Path(tmp) / "recorded.db"
+                generate_session(source, n_devices=args.devices, n_channels=args.channels,
+                                 srate=args.srate, duration=total)
+            live = pathlib.Path(tmp) / "live.db"
+            stop = threading.Event()
+            replay = threading.Thread(
+                target=replay_session, args=(source, live), kwargs={"speed": 1.0, "stop": stop}
+            )
+            replay.start()
+            while not live.exists():
+                time.sleep(0.05)
+            time.sleep(1.0)
+            # The app prints every computed level, keep the console readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                report["results"] = asyncio.run(
+                    bench_in_process(args.clients, args.duration, args.warmup, live)
+                )
+            stop.set()
+            replay.join()
+
+    for result in report["results"]:
+        latency, fresh = result["latency_ms"], result["freshness_ms"]
+        print(
+            f"{result['clients']:4d} clients  {result['throughput_rps']:8.1f} req/s  "
+            f"p50 {latency.get('p50', float('nan')):7.2f} ms  "
+            f"p99 {latency.get('p99', float('nan')):7.2f} ms  "
+            f"freshness p95 {fresh.get('p95', float('nan')):7.1f} ms"
+        )
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Import-time benchmarks.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m benchmarks.bench_import --repeat 10 --output bench_import.json
+
+Each scenario runs in a fresh interpreter, so module caches never hide the
+cost of a cold start. The report also lists which heavy dependencies each
+scenario ended up loading.
+"""
+import argparse
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("mne", "zmq", "pylsl", "matplotlib", "pandas", "fastapi")
+
+SCENARIOS = {
+    "import brainaccess_board": "import brainaccess_board",
+    "db_connect": "import brainaccess_board as bb; bb.db_connect({path!r})",
+    "ReadDB.list_devices": (
+        "import brainaccess_board as bb; db, _ = bb.db_connect({path!r}); "
+        "db._connect(); db.list_devices(); db._close()"
+    ),
+    "get_mne": "import brainaccess_board as bb; db, _ = bb.db_connect({path!r}); db.get_mne()",
+    "import app": "import app",
+}
+
+RUNNER = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_scenario(code: str, cwd: pathlib.Path) -> dict:
+    script = RUNNER.format(code=code, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cold import times")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("bench_import.json"))
+    args = parser.parse_args()
+
+    from .synthetic import generate_session
+
+    cwd = pathlib.Path(__file__).resolve().parent.parent
+    report: dict = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(pathlib.Path(tmp) / "session.db")
+        generate_session(path, duration=10)
+        for name, code in SCENARIOS.items():
+            runs = [run_scenario(code.format(path=path), cwd) for _ in range(args.repeat)]
+            times = [run["seconds"] for run in runs]
+            report["results"][name] = {
+                "min": min(times),
+                "median": statistics.median(times),
+                "mean": statistics.fmean(times),
+                "loaded": runs[-1]["loaded"],
+            }
+            print(f"{name:<28} {statistics.median(times) * 1e3:10.1f} ms  loaded: {runs[-1]['loaded']}")
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Read-path benchmarks on synthetic board databases.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m benchmarks.bench_read --durations 60 600 3600 --output bench_read.json
+
+Every benchmark is timed at each session length and the results are written
+as JSON so runs of different versions can be compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import importlib.metadata
+import io
+import json
+import pathlib
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+import mne
+
+from brainaccess_board import sq
+from brainaccess_board.database import ReadDB
+from brainaccess_board.utils import convert_to_mne
+
+from .synthetic import generate_session
+
+
+def measure(fn: Callable[[], object], repeat: int) -> dict:
+    """Time `fn` `repeat` times (after one warm-up call).
+
+    Returns:
+        dict: min/median/mean/stdev wall time in seconds
+    """
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def _version(package: str) -> str | None:
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def bench_session(session: dict, repeat: int) -> dict[str, dict]:
+    """Run every read-path benchmark against one generated session."""
+    import app  # imported lazily, it builds the FastAPI application
+
+    device = session["devices"][0]
+    results: dict[str, dict] = {}
+
+    db = ReadDB(session["path"])
+    db._connect()
+    rows = sq.get_data(db.handle, device=device, direction="all")
+    blob = sq.adapt_array(rows[0][0])
+
+    results["sq.get_data"] = measure(
+        lambda: sq.get_data(db.handle, device=device, direction="all"), repeat
+    )
+    results["convert_array"] = measure(lambda: sq.convert_array(blob), repeat)
+    results["ReadDB._get_data"] = measure(lambda: db._get_data(device=device), repeat)
+
+    data = db._get_data(device=device)
+    meta = db._get_info(device=device)
+    db._close()
+
+    def _convert() -> None:
+        sample = dict(data)
+        sample["meta"] = meta
+        convert_to_mne(sample, {})
+
+    results["convert_to_mne"] = measure(_convert, repeat)
+    results["get_mne"] = measure(lambda: db.get_mne(), repeat)
+    for dtype in ("float64", "float32"):
+        results[f"get_arrays.{dtype}"] = measure(
+            lambda: db.get_arrays(dtype=dtype, scale=True), repeat
+        )
+
+    o1 = data["data"][0]
+    tick = o1[-int(session["srate"] // 2):]
+
+    def _sliding_cold() -> None:
+        sliding = app.SlidingDataFrame(max_length=3000)
+        sliding.add_data(o1)
+        sliding.calculate_percentage_above_mean(o1)
+
+    warm = app.SlidingDataFrame(max_length=3000)
+
+    def _sliding_tick() -> None:
+        warm.add_data(tick)
+        warm.calculate_percentage_above_mean(tick)
+
+    baseline = app.bb.StreamingBaseline()
+    baseline.update(o1 * 1e-6)
+
+    def _baseline_tick() -> None:
+        baseline.update(tick * 1e-6)
+        baseline.fraction_above(tick * 1e-6, baseline.mean)
+        baseline.percentile_rank(tick * 1e-6)
+
+    chunk = app.pd.DataFrame(data["data"][:4].T * 1e-6)
+    loop = asyncio.new_event_loop()
+
+    def _compute_levels() -> None:
+        processor = app.EEGProcessor()
+        loop.run_until_complete(processor._compute_levels(chunk))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        warm.add_data(o1)
+        results["SlidingDataFrame.cold"] = measure(_sliding_cold, repeat)
+        results["SlidingDataFrame.tick"] = measure(_sliding_tick, repeat)
+        results["StreamingBaseline.tick"] = measure(_baseline_tick, repeat)
+        results["EEGProcessor._compute_levels"] = measure(_compute_levels, repeat)
+    loop.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the board database read path")
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 600, 3600])
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--srate", type=float, default=250.0)
+    parser.add_argument("--chunk-size", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("bench_read.json"))
+    args = parser.parse_args()
+    mne.set_log_level("WARNING")
+
+    report: dict = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {
+            name: _version(name)
+            for name in ("brainaccess-board", "numpy", "pandas", "mne")
+        },
+        "config": {
+            "channels": args.channels,
+            "srate": args.srate,
+            "chunk_size": args.chunk_size,
+            "repeat": args.repeat,
+        },
+        "sessions": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for duration in args.durations:
+            session = generate_session(
+                pathlib.Path(tmp) / f"session_{int(duration)}s.db",
+                n_channels=args.channels,
+                srate=args.srate,
+                chunk_size=args.chunk_size,
+                duration=duration,
+            )
+            print(f"Session {duration:g} s ({session['n_samples']} samples)...")
+            results = bench_session(session, args.repeat)
+            for name, stats in results.items():
+                print(f"  {name:<32} {stats['median'] * 1e3:10.3f} ms")
+            session.pop("path")
+            report["sessions"].append({"duration": duration, **session, "results": results})
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Real-time replay of a recorded session into a live board-format database.
+
+    python -m benchmarks.replay recorded.db live.db --speed 4 --copies 3
+
+Rows of every `data_*` and marker table are re-inserted in `local_clock`
+order at `speed` times real time, so readers see the same ingest pattern as
+with a headset attached. Each data device can be replayed as several
+simulated devices. A matching `utils.json` is written, so `db_connect()` and
+`get_utils_dict()` open the replayed file as the current session.
+"""
+import argparse
+import heapq
+import json
+import pathlib
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterator, Optional
+
+import numpy as np
+
+from brainaccess_board.database import ReadDB
+from brainaccess_board.sq import (
+    close_db,
+    create_device_tables,
+    get_data_after_rowid,
+    get_handle,
+    get_metadata,
+    insert_data,
+)
+from brainaccess_board.utils import find_free_port, user_log_utils
+
+BATCH_ROWS = 1000
+
+
+def copy_name(device: str, copy: int) -> str:
+    """Name of the `copy`-th simulated device, the first copy keeps the original name."""
+    if copy == 0:
+        return device
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{device}/{copy}"))
+
+
+def _rows(handle: dict, device: str) -> Iterator[tuple]:
+    rowid = 0
+    while True:
+        rows = get_data_after_rowid(handle, device, rowid, BATCH_ROWS)
+        if not rows:
+            return
+        rowid = rows[-1][0]
+        for row in rows:
+            yield row[3], device, row[1], row[2]
+
+
+def write_utils(destination: pathlib.Path, port: Optional[int] = None) -> Optional[pathlib.Path]:
+    """Point `utils.json` at `destination`.
+
+    Returns:
+        pathlib.Path | None: backup of the previous file, if there was one
+    """
+    user_log_utils.parent.mkdir(parents=True, exist_ok=True)
+    backup = None
+    if user_log_utils.exists():
+        backup = user_log_utils.with_suffix(".json.replay-backup")
+        shutil.copyfile(user_log_utils, backup)
+    user_log_utils.write_text(
+        json.dumps(
+            {
+                "current_save_file": str(destination.resolve()),
+                "socket_port": port or find_free_port(),
+            }
+        )
+    )
+    return backup
+
+
+def restore_utils(backup: Optional[pathlib.Path]) -> None:
+    if backup is None:
+        user_log_utils.unlink(missing_ok=True)
+    else:
+        shutil.move(backup, user_log_utils)
+
+
+def replay_session(
+    source: str | pathlib.Path,
+    destination: str | pathlib.Path,
+    speed: float = 1.0,
+    copies: int = 1,
+    loops: int = 1,
+    utils: bool = True,
+    restore: bool = True,
+    stop: Optional[threading.Event] = None,
+) -> dict:
+    """Replay `source` into a new database at `speed` times real time.
+
+    Device timestamps are kept (advanced by the recording length on every
+    further loop); `local_clock` is the actual insertion time, as on a live
+    board.
+
+    Args:
+        source (str | pathlib.Path): recorded board database
+        destination (str | pathlib.Path): live database, overwritten if it exists
+        speed (float): replay rate relative to real time, 0 inserts without waiting
+        copies (int): simulated devices per recorded data device
+        loops (int): number of passes over the recording
+        utils (bool): write `utils.json` pointing at `destination`
+        restore (bool): restore the previous `utils.json` when done
+        stop (threading.Event | None): ends the replay early when set
+
+    Returns:
+        dict: number of inserted rows and samples, wall time and lag statistics
+    """
+    destination = pathlib.Path(destination)
+    for suffix in ("", "-wal", "-shm"):
+        pathlib.Path(f"{destination}{suffix}").unlink(missing_ok=True)
+
+    db = ReadDB(str(source))
+    db._connect()
+    dst = get_handle(destination)
+    sampling = {}
+    for device in db.devices:
+        meta = get_metadata(db.handle, device)
+        if not meta:
+            continue
+        channels, channels_type, channels_unit, sf, _ = meta[0]
+        sampling[device] = sf
+        for copy in range(copies if sf > 0 else 1):
+            name = copy_name(device, copy)
+            create_device_tables(
+                dst,
+                name,
+                channels=channels.split(","),
+                channels_type=channels_type.split(","),
+                channels_unit=channels_unit.split(","),
+                sf=sf,
+                device_id=name,
+            )
+
+    backup = write_utils(destination) if utils else None
+    stats = {"rows": 0, "samples": 0, "max_lag": 0.0}
+    lags = []
+    try:
+        first = min(
+            (row[0] for row in (next(_rows(db.handle, d), None) for d in sampling) if row),
+            default=None,
+        )
+        if first is None:
+            return stats
+        span = 0.0
+        start = time.time()
+        for loop in range(loops):
+            previous = last = first
+            stream = heapq.merge(*(_rows(db.handle, d) for d in sampling), key=lambda r: r[0])
+            pending: dict[str, list] = {}
+            due_at = None
+            batch_clock = None
+            for local_clock, device, data, times in stream:
+                if stop is not None and stop.is_set():
+                    break
+                # Rows received together on the board are committed together
+                if batch_clock is not None and local_clock > batch_clock:
+                    _flush(dst, pending, sampling, copies, stats)
+                    lags.append(time.time() - due_at)
+                    pending = {}
+                recorded = local_clock - first + loop * span
+                due = start + recorded / speed if speed > 0 else time.time()
+                wait = due - time.time()
+                if wait > 0:
+                    if stop is not None:
+                        stop.wait(wait)
+                    else:
+                        time.sleep(wait)
+                due_at = due
+                batch_clock = local_clock
+                if local_clock > last:
+                    previous, last = last, local_clock
+                pending.setdefault(device, []).append(
+                    (data, np.asarray(times, dtype=np.float64) + loop * span)
+                )
+            if pending:
+                _flush(dst, pending, sampling, copies, stats)
+                lags.append(time.time() - due_at)
+            if stop is not None and stop.is_set():
+                break
+            if loop == 0:
+                # The next pass starts one row interval after the last row
+                span = last - first + (last - previous)
+        stats["wall_seconds"] = time.time() - start
+        stats["recorded_seconds"] = span * loops
+        if lags:
+            stats["max_lag"] = float(np.max(lags))
+            stats["p95_lag"] = float(np.percentile(lags, 95))
+    finally:
+        db._close()
+        close_db(dst)
+        if utils and restore:
+            restore_utils(backup)
+    return stats
+
+
+def _flush(dst: dict, pending: dict, sampling: dict, copies: int, stats: dict) -> None:
+    now = time.time()
+    for device, rows in pending.items():
+        records = [(data, times, now) for data, times in rows]
+        for copy in range(copies if sampling[device] > 0 else 1):
+            insert_data(dst, copy_name(device, copy), records)
+            stats["rows"] += len(records)
+            stats["samples"] += sum(np.shape(data)[-1] for data, _ in rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=pathlib.Path)
+    parser.add_argument("destination", type=pathlib.Path)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--no-utils", action="store_true", help="do not write utils.json")
+    parser.add_argument("--keep-utils", action="store_true",
+                        help="leave utils.json pointing at the replayed file")
+    args = parser.parse_args()
+    stats = replay_session(
+        args.source,
+        args.destination,
+        speed=args.speed,
+        copies=args.copies,
+        loops=args.loops,
+        utils=not args.no_utils,
+        restore=not args.keep_utils,
+    )
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Synthetic BrainAccess Board databases for benchmarks and load tests.
+
+The generated files use the same layout as the board: one `meta_<device>` and
+one `data_<device>` table per device, chunks stored as npy blobs and a scalar
+`local_clock` per chunk. Marker devices have a sampling rate of 0.
+"""
+import argparse
+import pathlib
+import uuid
+
+import numpy as np
+
+from brainaccess_board.sq import get_handle, create_device_tables, insert_data, close_db
+
+CHANNEL_NAMES = [
+    "O1", "O2", "Fp1", "Fp2", "C3", "C4", "P3", "P4",
+    "F3", "F4", "T7", "T8", "Cz", "Pz", "Fz", "Oz",
+]
+MARKER_DEVICE = "BrainAccessMarkers"
+LSL_CLOCK_START = 5000.0
+WALL_CLOCK_START = 1_700_000_000.0
+
+
+def device_name(index: int, seed: int = 0) -> str:
+    """Deterministic LSL-like device id (a UUID, so `only_lsl` accepts it)."""
+    rng = np.random.default_rng(seed + index)
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def synthetic_signal(
+    rng: np.random.Generator, n_channels: int, n_samples: int, srate: float, start: int = 0
+) -> np.ndarray:
+    """Background noise with a per-channel alpha rhythm, in microvolts.
+
+    Args:
+        rng (np.random.Generator): random generator
+        n_channels (int): number of channels
+        n_samples (int): number of samples
+        srate (float): sampling rate
+        start (int): index of the first sample, keeps the rhythm continuous
+
+    Returns:
+        np.ndarray: array of shape (n_channels, n_samples)
+    """
+    t = (start + np.arange(n_samples)) / srate
+    phase = np.arange(n_channels).reshape(-1, 1)
+    alpha = 20.0 * np.sin(2 * np.pi * 10.0 * t + phase)
+    noise = rng.standard_normal((n_channels, n_samples)) * 10.0
+    return alpha + noise
+
+
+def generate_session(
+    path: pathlib.Path | str,
+    n_devices: int = 1,
+    n_channels: int = 8,
+    srate: float = 250.0,
+    chunk_size: int = 25,
+    duration: float = 60.0,
+    marker_interval: float = 2.0,
+    seed: int = 0,
+) -> dict:
+    """Write a board-format SQLite database filled with synthetic data.
+
+    Args:
+        path (pathlib.Path | str): database file, overwritten if it exists
+        n_devices (int): number of EEG devices
+        n_channels (int): channels per device
+        srate (float): sampling rate in Hz
+        chunk_size (int): samples per stored row
+        duration (float): session length in seconds
+        marker_interval (float): seconds between markers, 0 disables markers
+        seed (int): random seed
+
+    Returns:
+        dict: description of the written session (devices, sample counts)
+    """
+    path = pathlib.Path(path)
+    for suffix in ("", "-wal", "-shm"):
+        pathlib.Path(f"{path}{suffix}").unlink(missing_ok=True)
+    rng = np.random.default_rng(seed)
+    n_chunks = int(duration * srate) // chunk_size
+    channels = [
+        CHANNEL_NAMES[i] if i < len(CHANNEL_NAMES) else f"ch{i + 1}"
+        for i in range(n_channels)
+    ]
+    handle = get_handle(path)
+    devices = []
+    for index in range(n_devices):
+        device = device_name(index, seed)
+        create_device_tables(
+            handle,
+            device,
+            channels=channels,
+            channels_type=["EEG"] * n_channels,
+            channels_unit=["uV"] * n_channels,
+            sf=srate,
+        )
+        rows = []
+        for chunk in range(n_chunks):
+            start = chunk * chunk_size
+            data = synthetic_signal(rng, n_channels, chunk_size, srate, start)
+            lsl_time = LSL_CLOCK_START + (start + np.arange(chunk_size)) / srate
+            local_clock = WALL_CLOCK_START + (start + chunk_size) / srate
+            rows.append((data, lsl_time, local_clock))
+        insert_data(handle, device, rows)
+        devices.append(device)
+
+    n_markers = 0
+    if marker_interval > 0:
+        create_device_tables(
+            handle,
+            MARKER_DEVICE,
+            channels=["Markers"],
+            channels_type=["Markers"],
+            channels_unit=["na"],
+            sf=0,
+        )
+        rows = []
+        for onset in np.arange(marker_interval, n_chunks * chunk_size / srate, marker_interval):
+            label = np.array([[str(n_markers % 4 + 1)]])
+            rows.append(
+                (label, np.array([LSL_CLOCK_START + onset]), WALL_CLOCK_START + onset)
+            )
+            n_markers += 1
+        insert_data(handle, MARKER_DEVICE, rows)
+    close_db(handle)
+    return {
+        "path": str(path),
+        "devices": devices,
+        "n_channels": n_channels,
+        "srate": srate,
+        "chunk_size": chunk_size,
+        "n_samples": n_chunks * chunk_size,
+        "n_markers": n_markers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=pathlib.Path)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--srate", type=float, default=250.0)
+    parser.add_argument("--chunk-size", type=int, default=25)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--marker-interval", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    session = generate_session(
+        args.path,
+        n_devices=args.devices,
+        n_channels=args.channels,
+        srate=args.srate,
+        chunk_size=args.chunk_size,
+        duration=args.duration,
+        marker_interval=args.marker_interval,
+        seed=args.seed,
+    )
+    print(session)
+
+
+if __name__ == "__main__":
+    main()
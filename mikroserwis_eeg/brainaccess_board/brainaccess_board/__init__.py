@@ -1,13 +1,85 @@
-from .database import ReadDB
-from .message_queue import BoardControl
-from .stream import Stimulation
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any, Optional
+
+from .metrics import get_registry
+
+if TYPE_CHECKING:
+    from .database import ReadDB
+    from .message_queue import BoardControl, BoardEvent, BoardEvents
+    from .stream import Stimulation
+    from .filters import FilterBank, StreamingFilter
+    from .quality import QualityMonitor, StreamingQuality
+    from .shared import SharedWindowReader, SharedWindowWriter
+    from .summary import SummaryStore
+    from .baseline import StreamingBaseline
+    from .catalog import SessionCatalog
+    from .watch import ChangeWatcher
+    from .profiling import MemoryTracker, SamplingProfiler, TickProfiler
+    from .cache import SampleCache
+    from .artifacts import ArtifactMonitor, StreamingArtifactDetector
+    from .pipeline import StageQueue
+    from .window import SampleRing
+
+# Heavy submodules (mne, zmq, pylsl, scipy) are imported on first use
+_lazy_attributes = {
+    "ReadDB": "database",
+    "BoardControl": "message_queue",
+    "BoardEvents": "message_queue",
+    "BoardEvent": "message_queue",
+    "Stimulation": "stream",
+    "FilterBank": "filters",
+    "StreamingFilter": "filters",
+    "QualityMonitor": "quality",
+    "StreamingQuality": "quality",
+    "SharedWindowWriter": "shared",
+    "SharedWindowReader": "shared",
+    "SummaryStore": "summary",
+    "StreamingBaseline": "baseline",
+    "SessionCatalog": "catalog",
+    "ChangeWatcher": "watch",
+    "TickProfiler": "profiling",
+    "SamplingProfiler": "profiling",
+    "MemoryTracker": "profiling",
+    "SampleCache": "cache",
+    "StreamingArtifactDetector": "artifacts",
+    "ArtifactMonitor": "artifacts",
+    "StageQueue": "pipeline",
+    "SampleRing": "window",
+}
+_lazy_modules = {
+    "database", "message_queue", "stream", "utils", "sq", "filters", "quality", "shared", "summary",
+    "compact", "align", "baseline", "catalog", "watch", "profiling", "cache", "artifacts",
+    "pipeline", "window",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_attributes:
+        module = importlib.import_module(f".{_lazy_attributes[name]}", __name__)
+        value = getattr(module, name)
+    elif name in _lazy_modules:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_lazy_attributes) | _lazy_modules)
 
 
 def stimulation_connect(name: str = "BrainAccessMarkers") -> Stimulation:
+    from .stream import Stimulation
+
     return Stimulation(name=name)
 
 
 def msg_connect() -> tuple:
+    from .message_queue import BoardControl
+
     board_control = BoardControl(request_timeout=100)
     response = board_control.get_commands()
     if "data" not in response:
@@ -20,11 +92,13 @@ def msg_connect() -> tuple:
     return board_control, commands, True
 
 
-def db_connect(filename: str = "current") -> tuple:
+def db_connect(filename: str = "current", cache: Optional[SampleCache] = None) -> tuple:
+    from .database import ReadDB
+
     db_status = False
     db = None
     try:
-        db = ReadDB(filename)
+        db = ReadDB(filename, cache=cache)
         if db.handle:
             db_status = True
     except Exception:
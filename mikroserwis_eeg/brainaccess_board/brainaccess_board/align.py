@@ -0,0 +1,243 @@
+from typing import Any, Optional
+
+import numpy as np
+
+
+class ClockModel:
+    """Linear mapping of a device clock onto the common (local) clock.
+
+    `common = offset + drift * (t - reference)`
+    """
+
+    def __init__(self, offset: float = 0.0, drift: float = 1.0, reference: float = 0.0) -> None:
+        self.offset = offset
+        self.drift = drift
+        self.reference = reference
+
+    def to_common(self, t: np.ndarray) -> np.ndarray:
+        return self.offset + self.drift * (np.asarray(t, dtype=np.float64) - self.reference)
+
+    def __repr__(self) -> str:
+        return f"ClockModel(offset={self.offset!r}, drift={self.drift!r}, reference={self.reference!r})"
+
+
+class ClockFit:
+    """Running least-squares fit of (device time, local clock) pairs.
+
+    Sums are accumulated around the first pair, so the fit stays accurate
+    with large absolute timestamps and can be updated chunk by chunk.
+    """
+
+    def __init__(self) -> None:
+        self.x0: Optional[float] = None
+        self.y0 = 0.0
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def add(self, t: np.ndarray, local_clock: np.ndarray) -> None:
+        t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+        local_clock = np.atleast_1d(np.asarray(local_clock, dtype=np.float64))
+        if t.size == 0:
+            return
+        if self.x0 is None:
+            self.x0, self.y0 = float(t[0]), float(local_clock[0])
+        x = t - self.x0
+        y = local_clock - self.y0
+        self.n += t.size
+        self.sx += x.sum()
+        self.sy += y.sum()
+        self.sxx += x @ x
+        self.sxy += x @ y
+
+    def model(self) -> ClockModel:
+        if self.x0 is None:
+            return ClockModel()
+        denominator = self.n * self.sxx - self.sx**2
+        drift = (self.n * self.sxy - self.sx * self.sy) / denominator if denominator > 0 else 1.0
+        intercept = (self.sy - drift * self.sx) / self.n
+        return ClockModel(offset=self.y0 + intercept, drift=drift, reference=self.x0)
+
+
+def clock_pairs(data: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    """(device time, local clock) pairs of a `ReadDB._get_data` result.
+
+    The local clock of a row is paired with the time of the last sample of
+    that row.
+    """
+    local_clock = np.atleast_1d(np.asarray(data["local_time"], dtype=np.float64))
+    chunk_samples = data.get("chunk_samples")
+    if chunk_samples is None:
+        chunk_samples = np.full(local_clock.shape, len(data["time"]) // max(len(local_clock), 1))
+    last = np.cumsum(chunk_samples) - 1
+    return np.asarray(data["time"], dtype=np.float64)[last], local_clock
+
+
+def estimate_clock(time: np.ndarray, local_clock: np.ndarray, robust: bool = True) -> ClockModel:
+    """Estimate offset and drift of a device clock from timestamp pairs.
+
+    Receipt times only ever lag the acquisition, so with `robust` the fit is
+    repeated on the pairs at or below the median residual, which follows the
+    minimal-latency envelope instead of the average delay.
+
+    Args:
+        time (np.ndarray): device timestamps
+        local_clock (np.ndarray): matching local clock values
+        robust (bool): refit on the lower half of residuals
+
+    Returns:
+        ClockModel: mapping from device time to local clock
+    """
+    fit = ClockFit()
+    fit.add(time, local_clock)
+    model = fit.model()
+    if robust and np.size(time) > 3:
+        residual = np.asarray(local_clock) - model.to_common(time)
+        keep = residual <= np.median(residual)
+        fit = ClockFit()
+        fit.add(np.asarray(time)[keep], np.asarray(local_clock)[keep])
+        model = fit.model()
+    return model
+
+
+def resample(
+    data: np.ndarray,
+    times: np.ndarray,
+    target: np.ndarray,
+    max_gap: Optional[float] = None,
+) -> np.ndarray:
+    """Linearly interpolate all channels onto `target` times at once.
+
+    Args:
+        data (np.ndarray): samples of shape (n_channels, n_samples)
+        times (np.ndarray): increasing sample times
+        target (np.ndarray): times to interpolate at
+        max_gap (float | None): neighbours further apart than this are a gap
+
+    Returns:
+        np.ndarray: (n_channels, n_target), NaN outside the data and in gaps
+    """
+    data = np.asarray(data, dtype=np.float64)
+    result = np.full((data.shape[0], target.shape[0]), np.nan)
+    if times.shape[0] < 2:
+        return result
+    n = times.shape[0]
+    right = np.searchsorted(times, target, side="right")
+    valid = (right > 0) & ((right < n) | (target == times[-1]))
+    right = np.clip(right, 1, n - 1)
+    left = right - 1
+    span = times[right] - times[left]
+    if max_gap is not None:
+        valid &= span <= max_gap
+    weight = (target - times[left]) / np.where(span > 0, span, 1)
+    values = data[:, left] * (1 - weight) + data[:, right] * weight
+    result[:, valid] = values[:, valid]
+    return result
+
+
+def align_devices(
+    arrays: dict[str, dict[str, Any]],
+    sfreq: Optional[float] = None,
+    time_range: Optional[tuple] = None,
+    max_gap: Optional[float] = None,
+) -> dict[str, Any]:
+    """Resample several devices onto one timeline of the common clock.
+
+    Args:
+        arrays (dict): device -> `ReadDB._get_data` result (e.g. from
+            `ReadDB.get_arrays`), with "meta" holding "srate"
+        sfreq (float | None): output rate, highest device rate by default
+        time_range (tuple | None): (start, end) on the common clock, the span
+            covered by all devices by default
+        max_gap (float | None): longest interpolated gap in seconds, 1.5
+            sample periods of each device by default
+
+    Returns:
+        dict: {"time": common timeline, "sfreq", "data": device -> array of
+        shape (n_channels, n_times), "clock": device -> ClockModel}
+    """
+    clocks = {}
+    common_times = {}
+    for device, data in arrays.items():
+        clocks[device] = estimate_clock(*clock_pairs(data))
+        common_times[device] = clocks[device].to_common(data["time"])
+    rates = {device: data.get("meta", {}).get("srate", 0) for device, data in arrays.items()}
+    if sfreq is None:
+        sfreq = max(rates.values())
+    if time_range is None:
+        start = max(t[0] for t in common_times.values())
+        end = min(t[-1] for t in common_times.values())
+    else:
+        start, end = time_range
+    n_times = max(0, int(np.floor((end - start) * sfreq)) + 1)
+    target = start + np.arange(n_times) / sfreq
+    aligned = {}
+    for device, data in arrays.items():
+        gap = max_gap if max_gap is not None else 1.5 / rates[device] if rates[device] else None
+        aligned[device] = resample(data["data"], common_times[device], target, gap)
+    return {"time": target, "sfreq": sfreq, "data": aligned, "clock": clocks}
+
+
+class StreamingAligner:
+    """Align chunks from several devices onto a common timeline as they arrive.
+
+    Clock models are refined with every chunk. `pull` returns the part of
+    the timeline that every registered device has already covered, each grid
+    point exactly once.
+
+    Args:
+        sfreq (float): output rate in Hz
+        devices (list[str]): devices to wait for
+        max_gap (float | None): longest interpolated gap in seconds
+    """
+
+    def __init__(self, sfreq: float, devices: list[str], max_gap: Optional[float] = None) -> None:
+        self.sfreq = sfreq
+        self.devices = list(devices)
+        self.max_gap = max_gap
+        self.fits = {device: ClockFit() for device in self.devices}
+        self.buffers: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self.next_index: Optional[int] = None
+        self.grid0: Optional[float] = None
+
+    def add(self, device: str, data: np.ndarray, time: np.ndarray, local_clock: float) -> None:
+        """Add one chunk: samples (n_channels, n), their device times and the
+        local clock at which the chunk was received."""
+        time = np.asarray(time, dtype=np.float64)
+        if time.size == 0:
+            return
+        self.fits[device].add(time[-1:], [local_clock])
+        if device in self.buffers:
+            old_data, old_time = self.buffers[device]
+            data = np.concatenate([old_data, data], axis=1)
+            time = np.concatenate([old_time, time])
+        self.buffers[device] = (np.asarray(data), time)
+
+    def pull(self) -> dict[str, Any]:
+        """Aligned samples newly covered by all devices.
+
+        Returns:
+            dict: {"time": grid times, "data": device -> (n_channels, n)}
+        """
+        if any(device not in self.buffers for device in self.devices):
+            return {"time": np.empty(0), "data": {}}
+        models = {device: self.fits[device].model() for device in self.devices}
+        common = {
+            device: models[device].to_common(self.buffers[device][1]) for device in self.devices
+        }
+        if self.grid0 is None:
+            self.grid0 = max(t[0] for t in common.values())
+            self.next_index = 0
+        end = min(t[-1] for t in common.values())
+        last_index = int(np.floor((end - self.grid0) * self.sfreq))
+        if last_index < self.next_index:
+            return {"time": np.empty(0), "data": {}}
+        target = self.grid0 + np.arange(self.next_index, last_index + 1) / self.sfreq
+        self.next_index = last_index + 1
+        aligned = {}
+        for device in self.devices:
+            data, time = self.buffers[device]
+            aligned[device] = resample(data, common[device], target, self.max_gap)
+            # Keep the samples still needed to interpolate the next grid point
+            keep = max(0, int(np.searchsorted(common[device], target[-1], side="right")) - 1)
+            self.buffers[device] = (data[:, keep:], time[keep:])
+        return {"time": target, "data": aligned}
@@ -0,0 +1,190 @@
+from typing import Optional, Sequence
+
+import numpy as np
+
+FRONTAL_NAMES = ("fp1", "fp2")
+KINDS = ("blink", "eog", "motion")
+
+
+def frontal_channels(channels: Sequence[str], names: Sequence[str] = FRONTAL_NAMES) -> list[int]:
+    """Positions of the frontal (eye-adjacent) channels in `channels`, matched by name"""
+    wanted = {name.lower() for name in names}
+    return [i for i, channel in enumerate(channels) if channel.strip().lower() in wanted]
+
+
+def mask_ranges(mask: np.ndarray, offset: int = 0) -> list[list[int]]:
+    """Contaminated stretches of `mask` as [start, stop) sample positions plus `offset`"""
+    edges = np.flatnonzero(np.diff(np.r_[0, np.asarray(mask, dtype=np.int8), 0]))
+    return (edges.reshape(-1, 2) + offset).tolist()
+
+
+def _dilate(flags: np.ndarray, pad: int, carry: int) -> tuple[np.ndarray, int]:
+    """Extend flagged samples by `pad` on both sides.
+
+    Returns:
+        tuple: dilated mask and the number of samples of the next chunk still
+        covered by a flag near the end of this one
+    """
+    n = flags.shape[0]
+    hits = np.flatnonzero(flags)
+    edges = np.zeros(n + 1, dtype=np.int64)
+    if carry:
+        edges[0] += 1
+        edges[min(carry, n)] -= 1
+    if hits.size:
+        np.add.at(edges, np.maximum(hits - pad, 0), 1)
+        np.add.at(edges, np.minimum(hits + pad + 1, n), -1)
+        carry = max(carry - n, int(hits[-1]) + pad + 1 - n, 0)
+    else:
+        carry = max(carry - n, 0)
+    return np.cumsum(edges[:-1]) > 0, carry
+
+
+class StreamingArtifactDetector:
+    """Flags blinks, eye movements and motion sample by sample.
+
+    Every chunk is tested with vectorised rules, the state needed to continue
+    them (last sample, tail of the correlation window, pending padding) is
+    carried to the next chunk:
+
+    - blink: a frontal channel exceeds `amplitude` while the frontal pair is
+      positively correlated over `window` seconds (eyelid artifacts have the
+      same polarity on fp1 and fp2)
+    - eog: the same amplitude with the pair anti-correlated (horizontal eye
+      movement), or any frontal deflection above twice `amplitude`
+    - motion: a sample-to-sample slope above `max_slope` on at least
+      `motion_fraction` of the channels, or any channel above `motion_amplitude`
+
+    Flagged samples are padded by `pad` seconds on both sides; padding before
+    a flag stops at the start of the chunk.
+
+    Args:
+        n_channels (int): number of channels
+        sfreq (float): sampling rate in Hz
+        frontal (Sequence[int]): positions of fp1/fp2, blink and eog tests need two
+        amplitude (float): frontal amplitude in microvolts treated as ocular
+        correlation (float): absolute fp1/fp2 correlation required for blink/eog
+        window (float): correlation window in seconds
+        max_slope (float): slope in microvolts per millisecond treated as motion
+        motion_fraction (float): fraction of channels the slope test needs
+        motion_amplitude (float): absolute value in microvolts treated as motion
+        pad (float): seconds flagged around every detection
+    """
+
+    def __init__(
+        self,
+        n_channels: int,
+        sfreq: float,
+        frontal: Sequence[int] = (),
+        amplitude: float = 80.0,
+        correlation: float = 0.7,
+        window: float = 0.2,
+        max_slope: float = 15.0,
+        motion_fraction: float = 0.5,
+        motion_amplitude: float = 250.0,
+        pad: float = 0.1,
+    ) -> None:
+        self.n_channels = n_channels
+        self.sfreq = sfreq
+        self.frontal = list(frontal)[:2]
+        self.amplitude = amplitude
+        self.correlation = correlation
+        self.window_samples = max(2, int(round(window * sfreq)))
+        self.max_slope_per_sample = max_slope * 1000.0 / sfreq
+        self.motion_channels = max(1, int(np.ceil(motion_fraction * n_channels)))
+        self.motion_amplitude = motion_amplitude
+        self.pad_samples = int(round(pad * sfreq))
+        self.reset()
+
+    def reset(self) -> None:
+        self._last: Optional[np.ndarray] = None
+        self._tail = np.empty((2, 0))
+        self._carry = 0
+        self.counts = dict.fromkeys(KINDS, 0)
+        self.samples = 0
+
+    def _frontal_correlation(self, pair: np.ndarray) -> np.ndarray:
+        """Correlation of the two frontal channels over the trailing window of every sample"""
+        history = np.concatenate([self._tail, pair], axis=1)
+        offset = self._tail.shape[1]
+        n = pair.shape[1]
+        self._tail = history[:, -(self.window_samples - 1):]
+        x, y = history
+        sums = np.zeros((5, history.shape[1] + 1))
+        np.cumsum(np.stack([x, y, x * x, y * y, x * y]), axis=1, out=sums[:, 1:])
+        end = offset + np.arange(1, n + 1)
+        start = np.maximum(end - self.window_samples, 0)
+        sx, sy, sxx, syy, sxy = sums[:, end] - sums[:, start]
+        count = end - start
+        cov = sxy - sx * sy / count
+        var = (sxx - sx * sx / count) * (syy - sy * sy / count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.sqrt(var)
+        return np.nan_to_num(corr)
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """Test a new chunk of shape (n_channels, n_samples), values in microvolts.
+
+        Returns:
+            np.ndarray: boolean mask of shape (n_samples,), True where contaminated
+        """
+        chunk = np.asarray(chunk, dtype=float)
+        n = chunk.shape[-1]
+        if n == 0:
+            return np.zeros(0, dtype=bool)
+
+        previous = chunk[:, :1] if self._last is None else self._last[:, None]
+        slopes = np.abs(np.diff(chunk, axis=1, prepend=previous))
+        self._last = chunk[:, -1].copy()
+        motion = (slopes > self.max_slope_per_sample).sum(axis=0) >= self.motion_channels
+        motion |= (np.abs(chunk) > self.motion_amplitude).any(axis=0)
+
+        blink = eog = np.zeros(n, dtype=bool)
+        if len(self.frontal) == 2:
+            pair = chunk[self.frontal]
+            peak = np.abs(pair).max(axis=0)
+            corr = self._frontal_correlation(pair)
+            ocular = peak > self.amplitude
+            blink = ocular & (corr >= self.correlation)
+            eog = (ocular & (corr <= -self.correlation)) | (peak > 2 * self.amplitude)
+            eog &= ~blink
+
+        for kind, flags in zip(KINDS, (blink, eog, motion)):
+            self.counts[kind] += int(flags.sum())
+        self.samples += n
+        mask, self._carry = _dilate(blink | eog | motion, self.pad_samples, self._carry)
+        return mask
+
+
+class ArtifactMonitor:
+    """Per-device artifact detectors created on first use.
+
+    Args:
+        **settings: keyword arguments passed to `StreamingArtifactDetector`
+    """
+
+    def __init__(self, **settings) -> None:
+        self.settings = settings
+        self.detectors: dict[str, StreamingArtifactDetector] = {}
+
+    def update(
+        self, device: str, chunk: np.ndarray, sfreq: float, frontal: Sequence[int] = ()
+    ) -> np.ndarray:
+        """Mask of contaminated samples in a new chunk (n_channels, n_samples) in microvolts"""
+        detector = self.detectors.get(device)
+        n_channels = np.shape(chunk)[0]
+        if (
+            detector is None
+            or detector.sfreq != sfreq
+            or detector.n_channels != n_channels
+            or detector.frontal != list(frontal)[:2]
+        ):
+            detector = StreamingArtifactDetector(n_channels, sfreq, frontal, **self.settings)
+            self.detectors[device] = detector
+        return detector.update(chunk)
+
+    def reset(self, device: Optional[str] = None) -> None:
+        if device is None:
+            self.detectors.clear()
+        else:
+            self.detectors.pop(device, None)
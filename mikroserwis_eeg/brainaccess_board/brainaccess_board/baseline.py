@@ -0,0 +1,129 @@
+import os
+import pathlib
+from typing import Optional
+
+import numpy as np
+
+
+class StreamingBaseline:
+    """Constant-memory baseline statistics of a signal.
+
+    Values are counted in a fixed-edge histogram (plus underflow and
+    overflow bins) and summarised by weighted Welford moments, so hours of
+    calibration data take the same memory as a few seconds. With
+    `half_life` older samples are exponentially forgotten. Two baselines with
+    the same edges can be merged.
+
+    Args:
+        low (float): lower histogram edge
+        high (float): upper histogram edge
+        n_bins (int): number of histogram bins between the edges
+        half_life (float | None): forgetting half-life in samples, None keeps all
+    """
+
+    def __init__(
+        self,
+        low: float = -500e-6,
+        high: float = 500e-6,
+        n_bins: int = 2000,
+        half_life: Optional[float] = None,
+    ) -> None:
+        self.edges = np.linspace(low, high, n_bins + 1)
+        self.half_life = half_life
+        self.counts = np.zeros(n_bins + 2)
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a chunk of samples"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        n = values.size
+        if n == 0:
+            return
+        if self.half_life:
+            decay = 0.5 ** (n / self.half_life)
+            self.counts *= decay
+            self.weight *= decay
+            self.m2 *= decay
+        index = np.searchsorted(self.edges, values, side="right")
+        self.counts += np.bincount(index, minlength=self.counts.size)
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        self._combine(n, chunk_mean, chunk_m2)
+
+    def _combine(self, weight: float, mean: float, m2: float) -> None:
+        total = self.weight + weight
+        if total == 0:
+            return
+        delta = mean - self.mean
+        self.mean += delta * weight / total
+        self.m2 += m2 + delta**2 * self.weight * weight / total
+        self.weight = total
+
+    def merge(self, other: "StreamingBaseline") -> None:
+        """Add the statistics of another baseline with the same edges"""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Baselines must share histogram edges to be merged")
+        self.counts += other.counts
+        self._combine(other.weight, other.mean, other.m2)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.weight if self.weight else float("nan")
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def _cdf_at_edges(self) -> np.ndarray:
+        cumulative = np.cumsum(self.counts)
+        return cumulative / cumulative[-1] if cumulative[-1] else cumulative
+
+    def percentile_rank(self, values: np.ndarray) -> np.ndarray:
+        """Percentage of the baseline below each value, interpolated inside bins"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.weight == 0:
+            return np.full(values.shape, np.nan)
+        cdf = self._cdf_at_edges()
+        # cdf[i] is the share of samples below edges[i]
+        below = np.concatenate([[cdf[0]], cdf[1:-1]])
+        return 100 * np.interp(values, self.edges, below)
+
+    def quantile(self, q: np.ndarray) -> np.ndarray:
+        """Values below which the share `q` (0..1) of the baseline lies"""
+        cdf = self._cdf_at_edges()
+        below = np.concatenate([[cdf[0]], cdf[1:-1]])
+        return np.interp(q, below, self.edges)
+
+    def fraction_above(self, values: np.ndarray, threshold: float) -> float:
+        """Percentage of `values` above `threshold`"""
+        values = np.asarray(values)
+        if values.size == 0:
+            return float("nan")
+        return float(100 * np.count_nonzero(values > threshold) / values.size)
+
+    def save(self, path: str | pathlib.Path) -> None:
+        """Store the baseline atomically in an `.npz` file"""
+        path = pathlib.Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                edges=self.edges,
+                counts=self.counts,
+                moments=np.array([self.weight, self.mean, self.m2]),
+                half_life=np.array(np.nan if self.half_life is None else self.half_life),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path) -> "StreamingBaseline":
+        with np.load(path) as stored:
+            half_life = float(stored["half_life"])
+            baseline = cls(half_life=None if np.isnan(half_life) else half_life)
+            baseline.edges = stored["edges"]
+            baseline.counts = stored["counts"]
+            baseline.weight, baseline.mean, baseline.m2 = stored["moments"].tolist()
+        return baseline
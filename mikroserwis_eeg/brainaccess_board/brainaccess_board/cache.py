@@ -0,0 +1,258 @@
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from typing import Any, Iterator, Optional
+
+import appdirs
+import numpy as np
+
+from .metrics import registry
+from .sq import STAGE_HELP, STAGE_METRIC, get_data_after_rowid, get_local_clock
+
+try:
+    import fcntl
+except ImportError:  # Windows, writers are not serialised across processes
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Rows decoded per batch, bounds memory when catching up on a long session
+BATCH_ROWS = 10000
+default_cache_dir: pathlib.Path = pathlib.Path(
+    appdirs.user_cache_dir(appname="baboard", appauthor="Neurotechnology")
+).joinpath("samples")
+
+
+class SampleCache:
+    """Persistent cache of decoded samples, shared by all readers of a session.
+
+    Every (database, device) pair has a directory of append-only files:
+    samples (sample-major, in the stored dtype), sample times, and per-row
+    local clocks and sample counts. `state.json` records how much of them is
+    valid and the rowid and `local_clock` of the last cached row. Updates only
+    decode rows added after that row and are serialised by a file lock, so
+    any process can extend the cache while others read it through `np.memmap`.
+
+    If the last cached row is gone or has another `local_clock`, the database
+    was replaced or rewritten and the entry is rebuilt under a new generation
+    of file names, leaving existing memory maps of the old files valid. Least
+    recently used entries are removed once the cache exceeds `max_bytes`.
+
+    Args:
+        directory (str | pathlib.Path | None): cache root, the user cache dir by default
+        max_bytes (int): size above which least recently used entries are evicted
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str | pathlib.Path] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.directory = pathlib.Path(directory or default_cache_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _entry(self, database: str | pathlib.Path, device: str) -> pathlib.Path:
+        key = f"{pathlib.Path(database).resolve()}\0{device}"
+        return self.directory / hashlib.sha1(key.encode()).hexdigest()[:24]
+
+    @staticmethod
+    def _files(entry: pathlib.Path, generation: int) -> dict[str, pathlib.Path]:
+        return {
+            name: entry / f"{name}.{generation}.bin"
+            for name in ("data", "time", "local", "chunks")
+        }
+
+    @staticmethod
+    def _load_state(entry: pathlib.Path) -> Optional[dict[str, Any]]:
+        try:
+            return json.loads((entry / "state.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_state(entry: pathlib.Path, state: dict[str, Any]) -> None:
+        tmp = entry / "state.tmp"
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, entry / "state.json")
+
+    @contextlib.contextmanager
+    def _locked(self, entry: pathlib.Path) -> Iterator[None]:
+        entry.mkdir(parents=True, exist_ok=True)
+        with open(entry / "lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _valid(self, handle: dict, device: str, state: dict[str, Any]) -> bool:
+        if not state["rows"]:
+            return True
+        return get_local_clock(handle, device, state["last_rowid"]) == state["last_local_clock"]
+
+    def update(self, handle: dict, database: str | pathlib.Path, device: str) -> int:
+        """Decode and append rows added to `device` since the last update.
+
+        Args:
+            handle (dict): database handle
+            database (str | pathlib.Path): database file of `handle`
+            device (str): data device
+
+        Returns:
+            int: number of newly cached samples
+        """
+        entry = self._entry(database, device)
+        total = 0
+        with self._locked(entry):
+            state = self._load_state(entry)
+            if state is not None and not self._valid(handle, device, state):
+                for path in self._files(entry, state["generation"]).values():
+                    path.unlink(missing_ok=True)
+                state = {"generation": state["generation"] + 1}
+                registry.inc("board_cache_invalidations", help="Sample cache entries rebuilt")
+            if state is None or "rows" not in state:
+                state = {
+                    "database": str(pathlib.Path(database).resolve()),
+                    "device": device,
+                    "generation": state["generation"] if state else 0,
+                    "dtype": None,
+                    "time_dtype": None,
+                    "n_channels": 0,
+                    "rows": 0,
+                    "samples": 0,
+                    "last_rowid": 0,
+                    "last_local_clock": None,
+                }
+            files = self._files(entry, state["generation"])
+            self._truncate(files, state)
+            while True:
+                rows = get_data_after_rowid(handle, device, state["last_rowid"], BATCH_ROWS)
+                if not rows:
+                    break
+                total += self._append(files, state, rows)
+                self._save_state(entry, state)
+                if len(rows) < BATCH_ROWS:
+                    break
+        os.utime(entry)
+        if total:
+            registry.inc("board_cache_samples", total, help="Samples decoded into the sample cache")
+            self.evict(keep=entry)
+        return total
+
+    def _truncate(self, files: dict[str, pathlib.Path], state: dict[str, Any]) -> None:
+        """Drop whatever an interrupted update wrote past the recorded extent"""
+        sizes = {
+            "data": state["samples"] * state["n_channels"] * _itemsize(state["dtype"]),
+            "time": state["samples"] * _itemsize(state["time_dtype"]),
+            "local": state["rows"] * 8,
+            "chunks": state["rows"] * 8,
+        }
+        for name, path in files.items():
+            if path.exists() and path.stat().st_size != sizes[name]:
+                os.truncate(path, sizes[name])
+
+    def _append(self, files: dict[str, pathlib.Path], state: dict[str, Any], rows: list) -> int:
+        with registry.timer(STAGE_METRIC, {"stage": "concat"}, STAGE_HELP):
+            data = np.concatenate([x[1] for x in rows], axis=-1)
+            times = np.concatenate([np.ravel(x[2]) for x in rows])
+        if state["dtype"] is None:
+            state["dtype"] = data.dtype.str
+            state["time_dtype"] = times.dtype.str
+            state["n_channels"] = int(data.shape[0])
+        data = data.astype(state["dtype"], copy=False)
+        chunks = np.array([np.shape(x[2])[-1] for x in rows], dtype=np.int64)
+        local = np.array([x[3] for x in rows], dtype=np.float64)
+        for name, array in (
+            ("data", data.T),
+            ("time", times.astype(state["time_dtype"], copy=False)),
+            ("local", local),
+            ("chunks", chunks),
+        ):
+            with open(files[name], "ab") as f:
+                f.write(np.ascontiguousarray(array).tobytes())
+        state["rows"] += len(rows)
+        state["samples"] += int(data.shape[1])
+        state["last_rowid"] = int(rows[-1][0])
+        state["last_local_clock"] = rows[-1][3]
+        registry.inc("board_db_rows", len(rows), help="Data rows read from the database")
+        registry.inc("board_db_samples", data.shape[1], help="Samples decoded from the database")
+        return int(data.shape[1])
+
+    def read(self, database: str | pathlib.Path, device: str) -> dict[str, Any]:
+        """Memory-mapped, read-only view of the cached samples of `device`.
+
+        Returns:
+            dict: {"data" (n_channels, n_samples), "time", "local_time",
+            "chunk_samples", "id"}, empty if nothing is cached
+        """
+        entry = self._entry(database, device)
+        state = self._load_state(entry)
+        if state is None or not state.get("samples"):
+            return {}
+        files = self._files(entry, state["generation"])
+        samples, rows = state["samples"], state["rows"]
+        try:
+            data = np.memmap(
+                files["data"], dtype=state["dtype"], mode="r", shape=(samples, state["n_channels"])
+            )
+            times = np.memmap(files["time"], dtype=state["time_dtype"], mode="r", shape=(samples,))
+            local = np.memmap(files["local"], dtype=np.float64, mode="r", shape=(rows,))
+            chunks = np.memmap(files["chunks"], dtype=np.int64, mode="r", shape=(rows,))
+        except FileNotFoundError:
+            # Rebuilt or evicted by another process meanwhile
+            return {}
+        os.utime(entry)
+        registry.inc("board_cache_hits", help="Reads served from the sample cache")
+        return {
+            "data": data.T,
+            "time": times,
+            "local_time": local,
+            "chunk_samples": chunks,
+            "id": device,
+        }
+
+    def get(self, handle: dict, database: str | pathlib.Path, device: str) -> dict[str, Any]:
+        """`update` followed by `read`"""
+        self.update(handle, database, device)
+        return self.read(database, device)
+
+    def size(self) -> int:
+        """Total size of the cached files in bytes"""
+        return sum(path.stat().st_size for path in self.directory.glob("*/*.bin"))
+
+    def evict(self, keep: Optional[pathlib.Path] = None) -> int:
+        """Remove least recently used entries until the cache fits `max_bytes`.
+
+        Args:
+            keep (pathlib.Path | None): entry directory that is never removed
+
+        Returns:
+            int: number of removed entries
+        """
+        entries = []
+        for entry in self.directory.iterdir():
+            if entry.is_dir():
+                size = sum(path.stat().st_size for path in entry.glob("*.bin"))
+                entries.append((entry.stat().st_mtime, entry, size))
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for _, entry, size in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        for entry in self.directory.iterdir():
+            if entry.is_dir():
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+def _itemsize(dtype: Optional[str]) -> int:
+    return np.dtype(dtype).itemsize if dtype else 0
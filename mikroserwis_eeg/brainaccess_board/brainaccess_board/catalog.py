@@ -0,0 +1,355 @@
+"""Index of many board session files.
+
+    python -m brainaccess_board.catalog catalog.db scan ~/recordings
+    python -m brainaccess_board.catalog catalog.db find --device <device>
+
+The catalog is a small SQLite file with one row per session file (its
+modification time and size) and one row per device in it (channel metadata,
+row count and time span). Scans only reopen files whose mtime or size changed;
+files that are not board sessions are remembered too, without devices.
+Session files are opened read-only and never modified.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import pathlib
+import sqlite3
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+import numpy as np
+
+from .sq import close_db, get_data, get_data_between, get_devices, get_handle, get_metadata, get_span, query
+
+if TYPE_CHECKING:
+    import mne
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files "
+    "(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, markers INTEGER, scanned TEXT)",
+    "CREATE TABLE IF NOT EXISTS devices "
+    "(path TEXT, device TEXT, device_id TEXT, sf REAL, channels TEXT, channels_type TEXT, "
+    "channels_unit TEXT, rows INTEGER, start REAL, end REAL, time_start REAL, time_end REAL, "
+    "PRIMARY KEY (path, device))",
+    "CREATE INDEX IF NOT EXISTS devices_device ON devices (device, start)",
+    "CREATE INDEX IF NOT EXISTS devices_span ON devices (start, end)",
+)
+COLUMNS = (
+    "path", "device", "device_id", "sf", "channels", "channels_type", "channels_unit",
+    "rows", "start", "end", "time_start", "time_end",
+)
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _file_state(path: pathlib.Path) -> tuple[float, int]:
+    """Latest mtime and total size of a database and its WAL file"""
+    mtime, size = 0.0, 0
+    for suffix in ("", "-wal"):
+        try:
+            stat = os.stat(f"{path}{suffix}")
+        except FileNotFoundError:
+            continue
+        if suffix and not stat.st_size:
+            # Opening a WAL session, even read-only, leaves an empty -wal behind
+            continue
+        mtime = max(mtime, stat.st_mtime)
+        size += stat.st_size
+    return mtime, size
+
+
+class SessionCatalog:
+    """Cross-session index of board databases.
+
+    Args:
+        index (str | pathlib.Path): catalog database file, created if missing
+    """
+
+    def __init__(self, index: str | pathlib.Path) -> None:
+        self.index = pathlib.Path(index)
+        self.handle = get_handle(self.index)
+        with self.handle["lock"]:
+            for statement in SCHEMA:
+                self.handle["cur"].execute(statement)
+            self.handle["con"].commit()
+
+    def close(self) -> None:
+        close_db(self.handle)
+
+    def __enter__(self) -> "SessionCatalog":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def scan(
+        self,
+        directory: str | pathlib.Path,
+        pattern: str = "*.db",
+        recursive: bool = True,
+    ) -> dict[str, int]:
+        """Bring the catalog up to date with the session files in `directory`.
+
+        Args:
+            directory (str | pathlib.Path): folder with board databases
+            pattern (str): file name pattern
+            recursive (bool): include subfolders
+
+        Returns:
+            dict: number of added, updated, unchanged, skipped (not board
+            sessions) and removed files
+        """
+        directory = pathlib.Path(directory).resolve()
+        files = directory.rglob(pattern) if recursive else directory.glob(pattern)
+        known = {
+            path: (mtime, size)
+            for path, mtime, size in query(self.handle, "SELECT path, mtime, size FROM files")
+        }
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+        seen = set()
+        for path in sorted(files):
+            if path.resolve() == self.index.resolve() or not path.is_file():
+                continue
+            key = str(path)
+            seen.add(key)
+            state = _file_state(path)
+            if known.get(key) == state:
+                stats["unchanged"] += 1
+                continue
+            if self._index_file(path, state):
+                stats["updated" if key in known else "added"] += 1
+            else:
+                stats["skipped"] += 1
+        prefix = str(directory) + os.sep
+        removed = [p for p in known if p.startswith(prefix) and p not in seen]
+        with self.handle["lock"]:
+            for key in removed:
+                self.handle["cur"].execute("DELETE FROM devices WHERE path = ?", (key,))
+                self.handle["cur"].execute("DELETE FROM files WHERE path = ?", (key,))
+            self.handle["con"].commit()
+        stats["removed"] = len(removed)
+        return stats
+
+    def _index_file(self, path: pathlib.Path, state: tuple[float, int]) -> bool:
+        """Record the devices of `path`; files without any are stored with no devices"""
+        rows = []
+        markers = 0
+        try:
+            handle = get_handle(path, read_only=True)
+            try:
+                for device in get_devices(handle):
+                    meta = get_metadata(handle, device)
+                    if not meta:
+                        continue
+                    channels, channels_type, channels_unit, sf, device_id = meta[0]
+                    span = get_span(handle, device) or (0, None, None, None, None)
+                    if sf <= 0:
+                        markers += span[0]
+                    rows.append(
+                        (str(path), device, device_id, sf, channels, channels_type, channels_unit, *span)
+                    )
+            finally:
+                close_db(handle)
+        except sqlite3.Error:
+            # Not an SQLite database
+            rows = []
+        with self.handle["lock"]:
+            cur = self.handle["cur"]
+            cur.execute("DELETE FROM devices WHERE path = ?", (str(path),))
+            cur.executemany(
+                f"INSERT INTO devices VALUES ({', '.join('?' * len(COLUMNS))})", rows
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(path),
+                    state[0],
+                    state[1],
+                    markers,
+                    datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                ),
+            )
+            self.handle["con"].commit()
+        return bool(rows)
+
+    def find(
+        self,
+        device: Optional[str] = None,
+        start: Optional[float | datetime.datetime] = None,
+        end: Optional[float | datetime.datetime] = None,
+        channel: Optional[str] = None,
+        markers: bool = False,
+    ) -> list[dict[str, Any]]:
+        """Devices of all sessions matching the filters, oldest first.
+
+        Args:
+            device (str | None): device name
+            start (float | datetime | None): sessions ending after this local clock time
+            end (float | datetime | None): sessions starting before this local clock time
+            channel (str | None): only devices recording this channel
+            markers (bool): include marker devices
+
+        Returns:
+            list[dict]: catalog rows with channel lists and the marker count of the file
+        """
+        conditions, params = [], []
+        if device is not None:
+            conditions.append("d.device = ?")
+            params.append(device)
+        if start is not None:
+            conditions.append("d.end >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            conditions.append("d.start <= ?")
+            params.append(_timestamp(end))
+        if not markers:
+            conditions.append("d.sf > 0")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ", ".join(f"d.{column}" for column in COLUMNS)
+        rows = query(
+            self.handle,
+            f"SELECT {columns}, f.markers FROM devices d JOIN files f USING (path) "
+            f"{where} ORDER BY d.start",
+            tuple(params),
+        )
+        result = []
+        for row in rows:
+            entry = dict(zip(COLUMNS + ("markers",), row))
+            for key in ("channels", "channels_type", "channels_unit"):
+                entry[key] = entry[key].split(",")
+            if channel is not None and channel not in entry["channels"]:
+                continue
+            result.append(entry)
+        return result
+
+    def devices(self) -> dict[str, dict[str, Any]]:
+        """Every catalogued data device with its number of sessions and time span"""
+        rows = query(
+            self.handle,
+            "SELECT device, COUNT(*), MIN(start), MAX(end), SUM(rows) FROM devices "
+            "WHERE sf > 0 GROUP BY device ORDER BY device",
+        )
+        return {
+            device: {"sessions": n, "start": first, "end": last, "rows": total}
+            for device, n, first, last, total in rows
+        }
+
+    def read(
+        self,
+        device: str,
+        start: Optional[float | datetime.datetime] = None,
+        end: Optional[float | datetime.datetime] = None,
+        as_mne: bool = False,
+    ) -> dict[str, Any] | mne.io.RawArray:
+        """Read `device` across every catalogued session overlapping the range.
+
+        Sessions are concatenated in time order; `sessions` gives the sample
+        offset where each file starts.
+
+        Args:
+            device (str): data device
+            start (float | datetime | None): start of the range (local clock)
+            end (float | datetime | None): end of the range (local clock)
+            as_mne (bool): return an `mne.io.RawArray`
+
+        Returns:
+            dict | mne.io.RawArray: {"data", "time", "local_time",
+            "chunk_samples", "id", "meta", "sessions"}, empty if nothing matches
+        """
+        entries = self.find(device=device, start=start, end=end)
+        start, end = _timestamp(start), _timestamp(end)
+        parts = []
+        sessions = []
+        offset = 0
+        for entry in entries:
+            handle = get_handle(entry["path"], read_only=True)
+            try:
+                if start is None and end is None:
+                    rows = get_data(handle, device=device, direction="all")[::-1]
+                else:
+                    rows = get_data_between(
+                        handle,
+                        device,
+                        -np.inf if start is None else start,
+                        np.inf if end is None else end,
+                    )
+            finally:
+                close_db(handle)
+            if not rows:
+                continue
+            parts.append(rows)
+            sessions.append({"path": entry["path"], "first_sample": offset})
+            offset += sum(np.shape(x[1])[-1] for x in rows)
+        if not parts:
+            return {}
+        rows = [row for part in parts for row in part]
+        first = entries[0]
+        data = {
+            "data": np.block([x[0] for x in rows]),
+            "time": np.block([x[1] for x in rows]),
+            "local_time": np.array([x[2] for x in rows]),
+            "chunk_samples": np.array([np.shape(x[1])[-1] for x in rows]),
+            "id": device,
+            "meta": {
+                "channels": first["channels"],
+                "channels_type": first["channels_type"],
+                "channels_unit": first["channels_unit"],
+                "srate": first["sf"],
+                "id": first["device_id"],
+                "first_timestamp": first["start"],
+            },
+            "sessions": sessions,
+        }
+        if as_mne:
+            from .utils import convert_to_mne
+
+            return convert_to_mne(data, {})
+        return data
+
+
+def _print_rows(rows: Iterable[dict]) -> None:
+    for row in rows:
+        start = datetime.datetime.fromtimestamp(row["start"]) if row["start"] else None
+        end = datetime.datetime.fromtimestamp(row["end"]) if row["end"] else None
+        print(f"{row['path']}  {row['device']}  {row['sf']:g} Hz  {start} - {end}  "
+              f"{row['rows']} rows  {row['markers']} markers")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Index and search BrainAccess Board sessions")
+    parser.add_argument("index", type=pathlib.Path)
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan")
+    scan.add_argument("directory", type=pathlib.Path)
+    scan.add_argument("--pattern", default="*.db")
+    find = commands.add_parser("find")
+    find.add_argument("--device")
+    find.add_argument("--channel")
+    find.add_argument("--start", type=datetime.datetime.fromisoformat)
+    find.add_argument("--end", type=datetime.datetime.fromisoformat)
+    find.add_argument("--markers", action="store_true")
+    args = parser.parse_args()
+    with SessionCatalog(args.index) as catalog:
+        if args.command == "scan":
+            print(catalog.scan(args.directory, pattern=args.pattern))
+        else:
+            _print_rows(
+                catalog.find(
+                    device=args.device,
+                    start=args.start,
+                    end=args.end,
+                    channel=args.channel,
+                    markers=args.markers,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Compaction of finished board sessions.
+
+    python -m brainaccess_board.compact session.db session.compact.db --seconds 10
+
+The archive keeps the board layout (`meta_<device>`, `data_<device>`, marker
+tables), so `ReadDB` and `db_connect` open it like the original, but data
+rows are merged into chunks of `seconds` length and optionally compressed.
+Each data table gets an `index_<device>` table with the sample offset and
+time span of every merged chunk.
+"""
+import argparse
+import datetime
+import os
+import pathlib
+from typing import Optional
+
+import numpy as np
+
+from .sq import (
+    adapt_array,
+    compress_array,
+    create_chunk_index,
+    create_device_tables,
+    close_db,
+    get_data_after_rowid,
+    get_devices,
+    get_handle,
+    get_metadata,
+    insert_data,
+    query,
+)
+from .utils import get_utils_dict
+
+BATCH_ROWS = 10000
+
+
+class SessionInUseError(Exception):
+    pass
+
+
+def _is_current(source: pathlib.Path) -> bool:
+    try:
+        current = get_utils_dict()
+    except Exception:
+        return False
+    return bool(current) and pathlib.Path(current.current_save_file).resolve() == source.resolve()
+
+
+def compact_session(
+    source: str | pathlib.Path,
+    destination: str | pathlib.Path,
+    seconds: float = 10.0,
+    compression: Optional[str] = "zlib",
+    force: bool = False,
+) -> dict:
+    """Rewrite a closed session into large merged chunks.
+
+    Args:
+        source (str | pathlib.Path): board database to compact
+        destination (str | pathlib.Path): archive file, overwritten if it exists
+        seconds (float): length of merged data chunks
+        compression (str | None): 'zlib', 'lzma' or None
+        force (bool): compact even if the board is still writing to `source`
+
+    Returns:
+        dict: number of rows and bytes before and after compaction
+    """
+    source = pathlib.Path(source)
+    destination = pathlib.Path(destination)
+    if not force and _is_current(source):
+        raise SessionInUseError(f"{source} is the current board session, close it first")
+    for suffix in ("", "-wal", "-shm"):
+        pathlib.Path(f"{destination}{suffix}").unlink(missing_ok=True)
+
+    def encode(arr: np.ndarray):
+        return compress_array(arr, compression) if compression else adapt_array(arr)
+
+    src = get_handle(source)
+    dst = get_handle(destination)
+    stats = {"rows_before": 0, "rows_after": 0}
+    try:
+        for device in get_devices(src):
+            meta = get_metadata(src, device)
+            if not meta:
+                continue
+            channels, channels_type, channels_unit, sf, device_id = meta[0]
+            create_device_tables(
+                dst,
+                device,
+                channels=channels.split(","),
+                channels_type=channels_type.split(","),
+                channels_unit=channels_unit.split(","),
+                sf=sf,
+                device_id=device_id,
+            )
+            chunk_samples = max(1, int(seconds * sf))
+            pending: list = []
+            pending_samples = 0
+            index = []
+            sample = 0
+            last_rowid = 0
+
+            def flush() -> None:
+                nonlocal pending, pending_samples, sample
+                data = np.concatenate([x[1] for x in pending], axis=-1)
+                times = np.concatenate([np.atleast_1d(x[2]) for x in pending])
+                local_clock = pending[-1][3]
+                insert_data(dst, device, [(encode(data), encode(times), local_clock)])
+                rowid = query(dst, f"SELECT MAX(rowid) FROM `data_{device}`")[0][0]
+                index.append(
+                    (rowid, sample, data.shape[-1], float(times[0]), float(times[-1]), local_clock)
+                )
+                sample += data.shape[-1]
+                stats["rows_after"] += 1
+                pending = []
+                pending_samples = 0
+
+            while True:
+                rows = get_data_after_rowid(src, device, last_rowid, BATCH_ROWS)
+                if not rows:
+                    break
+                last_rowid = rows[-1][0]
+                stats["rows_before"] += len(rows)
+                if sf <= 0:
+                    # Marker rows keep their own local_clock, epoching relies on it
+                    insert_data(dst, device, [(encode(x[1]), encode(x[2]), x[3]) for x in rows])
+                    stats["rows_after"] += len(rows)
+                    continue
+                for row in rows:
+                    pending.append(row)
+                    pending_samples += np.shape(row[1])[-1]
+                    if pending_samples >= chunk_samples:
+                        flush()
+            if pending:
+                flush()
+            if index:
+                create_chunk_index(dst, device, index)
+        with dst["lock"]:
+            dst["cur"].execute(
+                "CREATE TABLE archive_info (source TEXT, created TEXT, seconds REAL, compression TEXT)"
+            )
+            dst["cur"].execute(
+                "INSERT INTO archive_info VALUES (?, ?, ?, ?)",
+                (
+                    str(source),
+                    datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    seconds,
+                    compression or "",
+                ),
+            )
+            dst["con"].commit()
+            dst["cur"].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        close_db(src)
+        close_db(dst)
+    stats["bytes_before"] = sum(
+        os.path.getsize(f"{source}{suffix}")
+        for suffix in ("", "-wal")
+        if os.path.exists(f"{source}{suffix}")
+    )
+    stats["bytes_after"] = os.path.getsize(destination)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact a finished BrainAccess Board session")
+    parser.add_argument("source", type=pathlib.Path)
+    parser.add_argument("destination", type=pathlib.Path)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--compression", choices=["zlib", "lzma", "none"], default="zlib")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    stats = compact_session(
+        args.source,
+        args.destination,
+        seconds=args.seconds,
+        compression=None if args.compression == "none" else args.compression,
+        force=args.force,
+    )
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,58 @@
-from typing import Any, Optional
+from __future__ import annotations
+
+from typing import Any, Callable, Optional, TYPE_CHECKING
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import mne
-from .utils import get_utils_dict, convert_to_mne
+from .utils import get_utils_dict, convert_to_mne, create_info, get_units_conversion, scale_units
+from .metrics import registry
+from .summary import SummaryStore
+from .cache import SampleCache
+from .align import align_devices
+from .watch import ChangeWatcher
 from .sq import (
+    STAGE_METRIC,
+    STAGE_HELP,
     get_handle,
+    clone_handle,
     get_data_after,
+    get_data_between,
     get_devices,
     get_data,
     get_last_seconds_data,
+    get_chunk_index,
     get_metadata,
     get_first_timestamp,
     close_db,
 )
 
+if TYPE_CHECKING:
+    import mne
+
+
+def _match_event(event_filter: Any, label: str) -> bool:
+    if event_filter is None:
+        return True
+    if callable(event_filter):
+        return bool(event_filter(label))
+    if isinstance(event_filter, str):
+        return label == event_filter
+    return label in event_filter
+
 
 class ReadDB:
     """Get current database file to read from it"""
 
-    def __init__(self, filename: str = "current") -> None:
+    def __init__(self, filename: str = "current", cache: Optional[SampleCache] = None) -> None:
         self.name = filename
         self._connect()
         self._close()
 
+        self._summary: Optional[SummaryStore] = None
+        # Decoded samples of data devices persist across restarts
+        self.cache = cache
+
     def _get_current(self) -> str:
         p = get_utils_dict()
         if p:
@@ -36,44 +66,142 @@ class ReadDB:
             self.filename = self._get_current()
         else:
             self.filename = self.name
-        self.handle = get_handle(self.filename, uri=True)
+        with registry.timer(STAGE_METRIC, {"stage": "connect"}, STAGE_HELP):
+            self.handle = get_handle(self.filename, uri=True)
         self.devices = get_devices(self.handle)
 
     def _close(self) -> None:
         close_db(handle=self.handle)
 
+    def watch(self, **kwargs: Any) -> ChangeWatcher:
+        """Change notifications for the database file read by this instance.
+
+        Args:
+            **kwargs: passed to `ChangeWatcher`
+
+        Returns:
+            ChangeWatcher: wakes waiters when the board commits new rows
+        """
+        return ChangeWatcher(self.filename, **kwargs)
+
     def _get_data(
         self,
         device: str,
         chunk_count: Optional[int] = None,
         duration: Optional[int] = None,
         time_range: Optional[tuple] = None,
+        handle: Optional[dict] = None,
+        dtype: Optional[np.dtype] = None,
+        use_cache: bool = False,
+        start: Optional[int] = None,
     ) -> dict[str, Any]:
+        handle = handle or self.handle
         data = None
+        index: list = []
+        if use_cache and self.cache is not None and not duration and not chunk_count:
+            return self._get_cached_data(device, handle, dtype, start)
         if duration:
-            data = get_last_seconds_data(self.handle, duration=duration, device=device)
+            data = get_last_seconds_data(handle, duration=duration, device=device)
+            if data:
+                index = get_chunk_index(handle, device)
         elif time_range:
-            data = get_data(self.handle, device=device, direction="all")
+            data = get_data(handle, device=device, direction="all")
         elif chunk_count:
-            data = get_data(self.handle, count=chunk_count, device=device)
+            data = get_data(handle, count=chunk_count, device=device)
         else:
-            data = get_data(self.handle, device=device, direction="all")
+            data = get_data(handle, device=device, direction="all")
         if not data:
             return {}
         else:
-            _data = np.block([x[0] for x in data[::-1]])
-            _time = np.block([x[1] for x in data[::-1]])
-            _l = np.block([x[2] for x in data[::-1]])
-            return {
+            with registry.timer(STAGE_METRIC, {"stage": "concat"}, STAGE_HELP):
+                if dtype is None:
+                    _data = np.block([x[0] for x in data[::-1]])
+                else:
+                    # Chunks are converted straight into the output array
+                    _data = np.concatenate([x[0] for x in data[::-1]], axis=-1, dtype=dtype)
+                _time = np.block([x[1] for x in data[::-1]])
+                _l = np.block([x[2] for x in data[::-1]])
+            registry.inc("board_db_rows", len(data), help="Data rows read from the database")
+            registry.inc(
+                "board_db_samples", _data.shape[-1], help="Samples decoded from the database"
+            )
+            result = {
                 "data": _data,
                 "time": _time,
                 "local_time": _l,
+                "chunk_samples": np.array([np.shape(x[1])[-1] for x in data[::-1]]),
                 "id": device,
             }
+            if index:
+                result = self._trim_to_duration(result, index, duration)
+            if start is not None:
+                result = self._from_sample(result, start)
+            return result
 
-    def _get_info(self, device: str) -> dict[str, Any]:
-        _info = get_metadata(self.handle, device=device)
-        first_timestamp = get_first_timestamp(self.handle, device=device)
+    @staticmethod
+    def _trim_to_duration(data: dict, index: list, duration: float) -> dict[str, Any]:
+        """Cut the oldest merged chunk of a compacted session down to `duration`.
+
+        Compacted rows hold many seconds of samples under the local_clock of
+        the last one, so the row filter alone returns up to a chunk too much.
+        The newest chunk of the index ties local_clock to sample time.
+        """
+        last_time = index[-1][4]
+        first = int(np.searchsorted(data["time"], last_time - duration, side="right"))
+        return ReadDB._slice_samples(data, first)
+
+    @staticmethod
+    def _from_sample(data: dict, start: int) -> dict[str, Any]:
+        """Keep the samples from index `start` on, recorded in "first_sample"."""
+        first = min(max(0, start), data["time"].shape[0])
+        data = ReadDB._slice_samples(data, first)
+        data["first_sample"] = first
+        return data
+
+    @staticmethod
+    def _slice_samples(data: dict, lo: int, hi: Optional[int] = None) -> dict[str, Any]:
+        """Keep samples `lo`:`hi`, splitting the rows they start and end in."""
+        n = data["time"].shape[0]
+        hi = n if hi is None else min(hi, n)
+        lo = min(lo, hi)
+        if lo == 0 and hi == n:
+            return data
+        ends = np.cumsum(data["chunk_samples"])
+        first = int(np.searchsorted(ends, lo, side="right"))
+        last = int(np.searchsorted(ends, hi - 1, side="right")) + 1 if hi > lo else first
+        row_ends = ends[first:last]
+        row_starts = row_ends - np.asarray(data["chunk_samples"][first:last])
+        data["data"] = data["data"][..., lo:hi]
+        data["time"] = data["time"][lo:hi]
+        data["local_time"] = data["local_time"][first:last]
+        data["chunk_samples"] = np.minimum(row_ends, hi) - np.maximum(row_starts, lo)
+        return data
+
+    def _get_cached_data(
+        self,
+        device: str,
+        handle: dict,
+        dtype: Optional[np.dtype] = None,
+        start: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """Whole-session read through the sample cache, only new rows are decoded"""
+        data = self.cache.get(handle, self.filename, device)
+        if not data:
+            return {}
+        if start is not None:
+            # Only the samples the caller has not seen leave the memory map
+            data = self._from_sample(data, start)
+        with registry.timer(STAGE_METRIC, {"stage": "cache"}, STAGE_HELP):
+            # Callers scale in place, copy out of the read-only memory map
+            data["data"] = np.array(data["data"], dtype=dtype, order="C")
+            for key in ("time", "local_time", "chunk_samples"):
+                data[key] = np.array(data[key])
+        return data
+
+    def _get_info(self, device: str, handle: Optional[dict] = None) -> dict[str, Any]:
+        handle = handle or self.handle
+        _info = get_metadata(handle, device=device)
+        first_timestamp = get_first_timestamp(handle, device=device)
         # if not first_timestamp:
         #     return {}
         if not _info:
@@ -90,6 +218,10 @@ class ReadDB:
         return info
 
     def list_devices(self, only_lsl: bool = False) -> dict[str, Any]:
+        with registry.timer(STAGE_METRIC, {"stage": "catalog"}, STAGE_HELP):
+            return self._list_devices(only_lsl=only_lsl)
+
+    def _list_devices(self, only_lsl: bool = False) -> dict[str, Any]:
         self.devices = get_devices(self.handle)
         markers = {}
         data_devices = {}
@@ -119,7 +251,9 @@ class ReadDB:
 
         """
         data["meta"] = meta
-        data = convert_to_mne(data, markers)
+        with registry.timer(STAGE_METRIC, {"stage": "convert"}, STAGE_HELP):
+            # The decoded window is not shared, scale it without another copy
+            data = convert_to_mne(data, markers, copy=False)
         return data
 
     def _get_marker_data(self, time: float, column_name: str, device: str) -> dict:
@@ -134,6 +268,159 @@ class ReadDB:
             _l = np.block([x[2] for x in data[::-1]])
             return {"data": _data, "time": _time, "local_time": _l, "id": device}
 
+    def _map_devices(
+        self, devices: list[str], read: Callable[[str, dict], Any], workers: Optional[int]
+    ) -> dict[str, Any]:
+        """Run `read(device, handle)` for every device.
+
+        With more than one worker the devices are read concurrently, each
+        thread on its own connection (WAL readers do not block each other).
+        """
+        if not workers or workers < 2 or len(devices) < 2:
+            return {dev: read(dev, self.handle) for dev in devices}
+        local = threading.local()
+        handles: list[dict] = []
+        handles_lock = threading.Lock()
+
+        def task(dev: str) -> tuple[str, Any]:
+            handle = getattr(local, "handle", None)
+            if handle is None:
+                handle = clone_handle(self.handle)
+                local.handle = handle
+                with handles_lock:
+                    handles.append(handle)
+            return dev, read(dev, handle)
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, len(devices))) as pool:
+                return dict(pool.map(task, devices))
+        finally:
+            for handle in handles:
+                close_db(handle)
+
+    def get_arrays(
+        self,
+        device: Optional[str] = None,
+        duration: Optional[int] = None,
+        time_range: Optional[tuple] = None,
+        only_lsl: bool = True,
+        workers: Optional[int] = None,
+        dtype: Optional[np.dtype] = None,
+        scale: bool = False,
+        start: Optional[int] = None,
+    ) -> dict[str, dict[str, Any]]:
+        """Read raw arrays of data devices without converting them to MNE.
+
+        Args:
+            device (str | None): single device to read, all data devices by default
+            duration (int | None): only the last `duration` seconds
+            time_range (tuple | None): passed to `_get_data`
+            only_lsl (bool): skip devices that are not LSL streams
+            workers (int | None): number of devices read concurrently
+            dtype (np.dtype | None): sample dtype (e.g. np.float32), as stored by default
+            scale (bool): convert samples to volts in place
+            start (int | None): first sample returned, for readers that poll
+                for new samples; through the sample cache only these are copied
+
+        Returns:
+            dict: device -> {"data", "time", "local_time", "id", "meta"}, with
+            "first_sample" (`start` clipped to the session length) when `start`
+            is given
+        """
+        self._connect()
+        all_devices = self.list_devices(only_lsl=only_lsl)
+        data_devices = list(all_devices["data"].keys()) if device is None else [device]
+
+        def read(dev: str, handle: dict) -> dict[str, Any]:
+            data = self._get_data(
+                device=dev,
+                duration=duration,
+                time_range=time_range,
+                handle=handle,
+                dtype=dtype,
+                use_cache=True,
+                start=start,
+            )
+            if data:
+                data["meta"] = self._get_info(device=dev, handle=handle)
+                if scale:
+                    scale_units(data)
+            return data
+
+        try:
+            arrays = self._map_devices(data_devices, read, workers)
+        finally:
+            self._close()
+        return {dev: data for dev, data in arrays.items() if data}
+
+    def get_range(
+        self,
+        device: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        margin: float = 1.0,
+        dtype: Optional[np.dtype] = None,
+        scale: bool = False,
+    ) -> dict[str, Any]:
+        """Samples of `device` with `start` <= time < `end`, in sample `time` units.
+
+        Only the rows covering the range are read: the newest row ties sample
+        time to local_clock, then `get_data_between` finds the rows by binary
+        search over rowid.
+
+        Args:
+            device (str | None): data device, the first LSL data device by default
+            start (float | None): first sample time, the session start by default
+            end (float | None): end of the range (exclusive), the session end by default
+            margin (float): extra local-clock range in seconds covering chunk
+                length and clock jitter
+            dtype (np.dtype | None): sample dtype, as stored by default
+            scale (bool): convert samples to volts in place
+
+        Returns:
+            dict: {"data", "time", "local_time", "chunk_samples", "id", "meta"},
+            empty if no row overlaps the range
+        """
+        self._connect()
+        try:
+            if device is None:
+                device = next(iter(self.list_devices(only_lsl=True)["data"]), None)
+                if device is None:
+                    return {}
+            meta = self._get_info(device)
+            newest = get_data(self.handle, device=device, direction="last", count=1)
+            if not meta or not newest:
+                return {}
+            _, times, local_clock = newest[0]
+            offset = float(local_clock) - float(np.ravel(times)[-1])
+            rows = get_data_between(
+                self.handle,
+                device,
+                -np.inf if start is None else start + offset - margin,
+                np.inf if end is None else end + offset + margin,
+            )
+        finally:
+            self._close()
+        if not rows:
+            return {}
+        with registry.timer(STAGE_METRIC, {"stage": "concat"}, STAGE_HELP):
+            _data = np.concatenate([x[0] for x in rows], axis=-1, dtype=dtype)
+            _time = np.block([x[1] for x in rows])
+        data = {
+            "data": _data,
+            "time": _time,
+            "local_time": np.array([x[2] for x in rows]),
+            "chunk_samples": np.array([np.shape(x[1])[-1] for x in rows]),
+            "id": device,
+        }
+        lo = 0 if start is None else int(np.searchsorted(_time, start, side="left"))
+        hi = None if end is None else int(np.searchsorted(_time, end, side="left"))
+        data = self._slice_samples(data, lo, hi)
+        data["meta"] = meta
+        if scale:
+            scale_units(data)
+        return data
+
     def get_mne(
         self,
         device: Optional[str] = None,
@@ -141,6 +428,7 @@ class ReadDB:
         time_range: Optional[tuple] = None,
         only_lsl: bool = True,
         marker_devices_include: Optional[list[str]] = None,
+        workers: Optional[int] = None,
     ) -> dict[str, mne.io.Raw]:
         self._connect()
         all_devices = self.list_devices(only_lsl=only_lsl)
@@ -162,11 +450,181 @@ class ReadDB:
                 _dat = self._get_data(device=dev)
                 if _dat:
                     markers[dev] = _dat
-        meta = {}
-        mne_data = {}
-        for dev in data_devices:
-            data = self._get_data(device=dev, duration=duration, time_range=time_range)
-            meta = self._get_info(device=dev)
-            mne_data[dev] = self._convert_to_mne(data, markers, meta)
-        self._close()
+
+        def read(dev: str, handle: dict) -> mne.io.Raw:
+            data = self._get_data(
+                device=dev, duration=duration, time_range=time_range, handle=handle, use_cache=True
+            )
+            meta = self._get_info(device=dev, handle=handle)
+            return self._convert_to_mne(data, markers, meta)
+
+        try:
+            mne_data = self._map_devices(data_devices, read, workers)
+        finally:
+            self._close()
         return mne_data
+
+    def get_epochs(
+        self,
+        device: str,
+        marker_device: str,
+        event_filter: Any = None,
+        tmin: float = -0.2,
+        tmax: float = 0.8,
+        margin: float = 1.0,
+        as_mne: bool = False,
+    ) -> dict[str, Any] | mne.Epochs:
+        """Extract fixed windows of `device` data around markers.
+
+        Only the data rows whose `local_clock` falls near each marker are read,
+        so the cost grows with the number of epochs, not with the recording.
+
+        Args:
+            device (str): data device
+            marker_device (str): marker device
+            event_filter (str | Collection[str] | Callable | None): markers to keep
+            tmin (float): window start relative to the marker in seconds
+            tmax (float): window end relative to the marker in seconds
+            margin (float): extra local-clock range in seconds covering chunk
+                length and clock jitter between devices
+            as_mne (bool): return `mne.EpochsArray` instead of a dict
+
+        Returns:
+            dict: {"data": (n_epochs, n_channels, n_times) array in stored units,
+            "time": marker onsets, "events": labels, "times": time axis,
+            "dropped": number of markers without full data, "id", "meta"},
+            or `mne.EpochsArray` when `as_mne` is set
+
+        Raises:
+            ValueError: `as_mne` is set and no marker gave a complete epoch
+        """
+        self._connect()
+        try:
+            meta = self._get_info(device)
+            if not meta:
+                return {}
+            sfreq = meta["srate"]
+            n_times = int(round((tmax - tmin) * sfreq)) + 1
+            events = []
+            for labels, times, local_clock in reversed(
+                get_data(self.handle, device=marker_device, direction="all")
+            ):
+                for label, onset in zip(np.ravel(labels), np.ravel(times)):
+                    if _match_event(event_filter, str(label)):
+                        events.append((str(label), float(onset), float(local_clock)))
+            epochs = []
+            kept = []
+            for label, onset, local_clock in events:
+                rows = get_data_between(
+                    self.handle,
+                    device,
+                    start=local_clock + tmin - margin,
+                    end=local_clock + tmax + margin,
+                )
+                if not rows:
+                    continue
+                samples = np.block([x[0] for x in rows])
+                times = np.block([x[1] for x in rows])
+                start = int(np.searchsorted(times, onset + tmin - 0.5 / sfreq))
+                if start + n_times > times.shape[0] or times[start] - (onset + tmin) > 1 / sfreq:
+                    continue
+                epochs.append(samples[:, start:start + n_times])
+                kept.append((label, onset))
+        finally:
+            self._close()
+
+        n_channels = len(meta["channels"])
+        data = np.stack(epochs) if epochs else np.empty((0, n_channels, n_times))
+        result = {
+            "data": data,
+            "time": np.array([onset for _, onset in kept]),
+            "events": [label for label, _ in kept],
+            "times": tmin + np.arange(n_times) / sfreq,
+            "dropped": len(events) - len(kept),
+            "id": device,
+            "meta": meta,
+        }
+        if not as_mne:
+            return result
+        if not kept:
+            # mne.EpochsArray cannot hold zero epochs
+            raise ValueError(
+                f"No events match event_filter={event_filter!r} in {marker_device}"
+                if not events
+                else f"None of the {len(events)} matching events of {marker_device} has complete data"
+            )
+        import mne
+
+        event_id = {label: code for code, label in enumerate(sorted(set(result["events"])), 1)}
+        mne_events = np.array(
+            [
+                [int(round(onset * sfreq)), 0, event_id[label]]
+                for label, onset in kept
+            ],
+            dtype=int,
+        ).reshape(-1, 3)
+        units = get_units_conversion({"meta": meta})
+        return mne.EpochsArray(
+            data * units[None],
+            create_info({"meta": meta}),
+            events=mne_events,
+            tmin=tmin,
+            event_id=event_id or None,
+        )
+
+    def get_overview(
+        self,
+        device: str,
+        time_range: Optional[tuple] = None,
+        max_points: int = 1000,
+    ) -> dict[str, Any]:
+        """Coarse per-channel min/max/mean for long-range views.
+
+        The sidecar summary (`<database>.summary`) is first brought up to date
+        with rows added since the last call, then answered from the
+        decimation level that fits `max_points`.
+
+        Args:
+            device (str): data device
+            time_range (tuple | None): (start, end) in sample `time` units
+            max_points (int): maximal number of bins returned
+
+        Returns:
+            dict: see `SummaryStore.get_overview`
+        """
+        self._connect()
+        try:
+            # The current database changes with every new recording
+            if self._summary is None or self._summary.database != str(self.filename):
+                self._summary = SummaryStore(self.filename)
+            self._summary.update(self.handle, device)
+        finally:
+            self._close()
+        return self._summary.get_overview(device, time_range=time_range, max_points=max_points)
+
+    def get_aligned(
+        self,
+        devices: Optional[list[str]] = None,
+        sfreq: Optional[float] = None,
+        duration: Optional[int] = None,
+        only_lsl: bool = True,
+        workers: Optional[int] = None,
+    ) -> dict[str, Any]:
+        """Read several devices and resample them onto one common timeline.
+
+        Args:
+            devices (list[str] | None): devices to align, all data devices by default
+            sfreq (float | None): output rate, highest device rate by default
+            duration (int | None): only the last `duration` seconds
+            only_lsl (bool): skip devices that are not LSL streams
+            workers (int | None): number of devices read concurrently
+
+        Returns:
+            dict: see `align.align_devices`
+        """
+        arrays = self.get_arrays(duration=duration, only_lsl=only_lsl, workers=workers)
+        if devices is not None:
+            arrays = {dev: arrays[dev] for dev in devices if dev in arrays}
+        if not arrays:
+            return {}
+        return align_devices(arrays, sfreq=sfreq)
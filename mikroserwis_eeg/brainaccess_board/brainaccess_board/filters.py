@@ -0,0 +1,116 @@
+from typing import Optional
+
+import numpy as np
+from scipy import signal
+
+
+def design_sos(
+    sfreq: float,
+    bandpass: Optional[tuple[Optional[float], Optional[float]]] = (1.0, 40.0),
+    notch: Optional[float] = 50.0,
+    notch_q: float = 30.0,
+    dc_cutoff: Optional[float] = 0.1,
+    order: int = 4,
+) -> np.ndarray:
+    """Design a cascade of second-order sections for EEG preprocessing.
+
+    Args:
+        sfreq (float): sampling rate in Hz
+        bandpass (tuple | None): (low, high) edges in Hz, either may be None
+        notch (float | None): mains frequency to remove (50 or 60 Hz)
+        notch_q (float): quality factor of the notch
+        dc_cutoff (float | None): corner of the one-pole DC blocker in Hz
+        order (int): Butterworth order of the bandpass
+
+    Returns:
+        np.ndarray: SOS array of shape (n_sections, 6)
+    """
+    nyquist = sfreq / 2
+    sections = []
+    if dc_cutoff:
+        pole = np.exp(-2 * np.pi * dc_cutoff / sfreq)
+        sections.append(np.array([[1.0, -1.0, 0.0, 1.0, -pole, 0.0]]))
+    if bandpass:
+        low, high = bandpass
+        if high is not None and high >= nyquist:
+            high = None
+        if low and high:
+            sections.append(
+                signal.butter(order, (low, high), btype="bandpass", fs=sfreq, output="sos")
+            )
+        elif low:
+            sections.append(signal.butter(order, low, btype="highpass", fs=sfreq, output="sos"))
+        elif high:
+            sections.append(signal.butter(order, high, btype="lowpass", fs=sfreq, output="sos"))
+    if notch and notch < nyquist:
+        b, a = signal.iirnotch(notch, notch_q, fs=sfreq)
+        sections.append(signal.tf2sos(b, a))
+    if not sections:
+        return np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+    return np.vstack(sections)
+
+
+class StreamingFilter:
+    """Stateful SOS filter applied chunk by chunk.
+
+    The filter state `zi` is kept between calls, so filtering consecutive
+    chunks gives the same result as filtering the concatenated signal once.
+    """
+
+    def __init__(self, sfreq: float, n_channels: int, **settings) -> None:
+        self.sfreq = sfreq
+        self.n_channels = n_channels
+        self.settings = settings
+        self.sos = design_sos(sfreq, **settings)
+        self.zi: Optional[np.ndarray] = None
+
+    def reset(self) -> None:
+        self.zi = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Filter a new chunk.
+
+        Args:
+            chunk (np.ndarray): samples of shape (n_channels, n_samples)
+
+        Returns:
+            np.ndarray: filtered samples, same shape as `chunk`; floating
+            input keeps its dtype, the state is always float64
+        """
+        chunk = np.asarray(chunk)
+        if not np.issubdtype(chunk.dtype, np.floating):
+            chunk = chunk.astype(np.float64)
+        if chunk.shape[-1] == 0:
+            return chunk
+        if self.zi is None:
+            # Start from steady state at the first sample to avoid a step transient
+            self.zi = signal.sosfilt_zi(self.sos)[:, None, :] * chunk[:, 0][None, :, None]
+        filtered, self.zi = signal.sosfilt(self.sos, chunk, axis=-1, zi=self.zi)
+        return filtered.astype(chunk.dtype, copy=False)
+
+
+class FilterBank:
+    """Per-device streaming filters created on first use.
+
+    Args:
+        **settings: keyword arguments passed to `design_sos`
+    """
+
+    def __init__(self, **settings) -> None:
+        self.settings = settings
+        self.filters: dict[str, StreamingFilter] = {}
+
+    def process(self, device: str, chunk: np.ndarray, sfreq: float) -> np.ndarray:
+        """Filter a new chunk of `device`, samples of shape (n_channels, n_samples)"""
+        flt = self.filters.get(device)
+        n_channels = np.shape(chunk)[0]
+        if flt is None or flt.sfreq != sfreq or flt.n_channels != n_channels:
+            flt = StreamingFilter(sfreq, n_channels, **self.settings)
+            self.filters[device] = flt
+        return flt.process(chunk)
+
+    def reset(self, device: Optional[str] = None) -> None:
+        if device is None:
+            self.filters.clear()
+        else:
+            self.filters.pop(device, None)
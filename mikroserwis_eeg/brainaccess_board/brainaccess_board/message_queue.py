@@ -1,7 +1,10 @@
 import zmq
+import json
 import time
 import logging
-from typing import Any
+import threading
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional, Sequence
 
 from .utils import get_utils_dict
 
@@ -144,3 +147,175 @@ class BoardControl(SocketClient):
             port, commands, logger=logger, mode="json", request_timeout=request_timeout
         )
         self.log(f"Board Control created using port: {port}")
+
+
+# Topics of events published by the board (prefix matching, "" is everything)
+DEVICE_CONNECTED = "device.connected"
+DEVICE_DISCONNECTED = "device.disconnected"
+RECORDING_STARTED = "recording.started"
+RECORDING_STOPPED = "recording.stopped"
+SAVE_FILE_CHANGED = "session.save_file"
+
+
+@dataclass
+class BoardEvent:
+    """Event received from the board
+
+    Attributes:
+        topic (str): event topic, e.g. `DEVICE_CONNECTED`
+        data (dict): JSON payload
+        received (float): local receive time (`time.time()`)
+    """
+
+    topic: str
+    data: dict = field(default_factory=dict)
+    received: float = field(default_factory=time.time)
+
+
+EventCallback = Callable[[BoardEvent], None]
+
+
+def parse_event(frames: Sequence[bytes]) -> BoardEvent:
+    """Decode a published message.
+
+    Either two frames, the topic and a JSON payload, or a single JSON object
+    whose "event" (or "command") field is the topic.
+    """
+    if len(frames) == 1:
+        payload = json.loads(frames[0]) if frames[0] else {}
+        if not isinstance(payload, dict):
+            payload = {"message": payload}
+        topic = str(payload.get("event") or payload.get("command") or "")
+        return BoardEvent(topic, payload)
+    payload = json.loads(frames[-1]) if frames[-1] else {}
+    if not isinstance(payload, dict):
+        payload = {"message": payload}
+    return BoardEvent(frames[0].decode(errors="replace"), payload)
+
+
+class BoardEvents:
+    """Subscriber to events published by the board over a ZMQ PUB socket.
+
+    Callbacks registered with `on` run in a background listener thread
+    started by `start`; alternatively `async for event in events` receives
+    events on the running event loop. Each consumer has its own SUB socket,
+    so both can be used at once. Topics are matched on the client, which
+    also covers single-frame messages that ZMQ prefix filtering would drop.
+
+    Args:
+        port (int | None): event port, `event_port` of utils.json by default
+        topics (Sequence[str]): topic prefixes to subscribe to, "" for all
+        host (str): publisher host
+        logger (logging.Logger | None): logger, print by default
+    """
+
+    def __init__(
+        self,
+        port: Optional[int] = None,
+        topics: Sequence[str] = ("",),
+        host: str = "localhost",
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.logger = logger
+        if port is None:
+            utils = get_utils_dict()
+            port = utils.event_port if utils is not None else None
+            if port is None:
+                raise Exception("Event port not found, the board does not publish events")
+        self.endpoint = f"tcp://{host}:{port}"
+        self.topics = tuple(topics)
+        self.callbacks: list[tuple[str, EventCallback]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def log(self, message: str, level: str = "info") -> None:
+        if self.logger:
+            self.logger.log(level_map[level], message)
+        else:
+            print(f"{level.upper()}: {message}")
+
+    def on(self, topic: str, callback: Optional[EventCallback] = None) -> Any:
+        """Call `callback(event)` for events whose topic starts with `topic`.
+
+        Usable as a decorator: `@events.on(DEVICE_CONNECTED)`.
+        """
+        if callback is None:
+            def register(func: EventCallback) -> EventCallback:
+                self.callbacks.append((topic, func))
+                return func
+            return register
+        self.callbacks.append((topic, callback))
+        return callback
+
+    def off(self, callback: EventCallback) -> None:
+        self.callbacks = [(t, c) for t, c in self.callbacks if c is not callback]
+
+    def dispatch(self, event: BoardEvent) -> None:
+        for topic, callback in list(self.callbacks):
+            if event.topic.startswith(topic):
+                try:
+                    callback(event)
+                except Exception as e:
+                    self.log(f"Event callback failed for {event.topic}: {e}", level="error")
+
+    def _socket(self, context: zmq.Context) -> zmq.Socket:
+        socket = context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+        socket.connect(self.endpoint)
+        return socket
+
+    def _receive(self, frames: Sequence[bytes]) -> Optional[BoardEvent]:
+        try:
+            event = parse_event(frames)
+        except ValueError as e:
+            self.log(f"Received invalid event: {e}", level="error")
+            return None
+        if not any(event.topic.startswith(topic) for topic in self.topics):
+            return None
+        return event
+
+    def start(self) -> None:
+        """Start dispatching events to callbacks in a background thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="board-events", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _listen(self) -> None:
+        socket = self._socket(zmq.Context.instance())
+        try:
+            while not self._stop.is_set():
+                if not socket.poll(100) & zmq.POLLIN:
+                    continue
+                event = self._receive(socket.recv_multipart())
+                if event is not None:
+                    self.dispatch(event)
+        finally:
+            socket.close()
+
+    def __enter__(self) -> "BoardEvents":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    async def __aiter__(self) -> AsyncIterator[BoardEvent]:
+        import zmq.asyncio
+
+        socket = self._socket(zmq.asyncio.Context.instance())
+        try:
+            while True:
+                event = self._receive(await socket.recv_multipart())
+                if event is not None:
+                    yield event
+        finally:
+            socket.close()
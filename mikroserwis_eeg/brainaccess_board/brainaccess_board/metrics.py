@@ -0,0 +1,221 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Listener = Callable[[str, dict, float], None]
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    items = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return "{" + items + "}"
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, labels: dict) -> None:
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        # += is not atomic, worker threads increment concurrently
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        return [(f"{self.name}_total", self.labels, self.value)]
+
+
+class Gauge:
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, labels: dict) -> None:
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        return [(self.name, self.labels, self.value)]
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, labels: dict, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            counts = list(self.counts)
+            total, observed = self.sum, self.count
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            result.append((f"{self.name}_bucket", {**self.labels, "le": le}, cumulative))
+        result.append((f"{self.name}_sum", self.labels, total))
+        result.append((f"{self.name}_count", self.labels, observed))
+        return result
+
+
+class Registry:
+    """Collects counters, gauges and latency histograms.
+
+    Metrics are created on first use and identified by name and labels.
+    Listeners added with `add_listener` receive every observation, which lets
+    applications outside FastAPI forward the numbers elsewhere.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self._metrics: dict[tuple, Counter | Gauge | Histogram] = {}
+        self._help: dict[str, tuple[str, str]] = {}
+        self._listeners: list[Listener] = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls: type, name: str, help: str, labels: Optional[dict], **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, dict(labels or {}), **kwargs)
+                    self._metrics[key] = metric
+                    self._help.setdefault(name, (cls.kind, help))
+        return metric
+
+    def counter(self, name: str, help: str = "", labels: Optional[dict] = None) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", labels: Optional[dict] = None) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = "",
+        labels: Optional[dict] = None,
+        buckets: tuple = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call `listener(name, labels, value)` for every observation"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        self._listeners.remove(listener)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Optional[dict] = None,
+        help: str = "",
+        buckets: tuple = DEFAULT_BUCKETS,
+    ) -> None:
+        """Record a value in the histogram `name`"""
+        if not self.enabled:
+            return
+        self.histogram(name, help, labels, buckets).observe(value)
+        for listener in self._listeners:
+            listener(name, labels or {}, value)
+
+    def inc(self, name: str, amount: float = 1.0, labels: Optional[dict] = None, help: str = "") -> None:
+        """Increase the counter `name`"""
+        if not self.enabled:
+            return
+        self.counter(name, help, labels).inc(amount)
+        for listener in self._listeners:
+            listener(name, labels or {}, amount)
+
+    def set(self, name: str, value: float, labels: Optional[dict] = None, help: str = "") -> None:
+        """Set the gauge `name`"""
+        if not self.enabled:
+            return
+        self.gauge(name, help, labels).set(value)
+        for listener in self._listeners:
+            listener(name, labels or {}, value)
+
+    @contextmanager
+    def timer(self, name: str, labels: Optional[dict] = None, help: str = "") -> Iterator[None]:
+        """Observe the wall time of the block in the histogram `name`"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels, help)
+
+    def snapshot(self) -> dict[str, list[tuple[dict, float]]]:
+        """Current values as `{sample_name: [(labels, value), ...]}`"""
+        result: dict[str, list[tuple[dict, float]]] = {}
+        for metric in list(self._metrics.values()):
+            for sample_name, labels, value in metric.samples():
+                result.setdefault(sample_name, []).append((labels, value))
+        return result
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        by_name: dict[str, list] = {}
+        for metric in list(self._metrics.values()):
+            by_name.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name in sorted(by_name):
+            kind, help = self._help[name]
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in by_name[name]:
+                for sample_name, labels, value in metric.samples():
+                    lines.append(f"{sample_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+            self._help.clear()
+
+
+registry = Registry()
+
+
+def get_registry() -> Registry:
+    """Process-wide registry used by ReadDB and the example apps"""
+    return registry
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from .metrics import registry
+
+POLICIES = ("coalesce", "drop_oldest", "block")
+QUEUE_HELP = "Time items spent in a pipeline queue"
+
+
+class StageQueue:
+    """Bounded asyncio queue connecting two pipeline stages.
+
+    When the consumer falls behind and the queue is full, `policy` decides
+    what happens to a new item:
+
+    - coalesce: it is merged into the newest queued item with `merge`, so no
+      data is lost and the consumer catches up with one larger item
+    - drop_oldest: the oldest queued item is discarded
+    - block: the producer waits for free space (backpressure)
+
+    Every item remembers when it entered the queue; a coalesced item keeps
+    the time of its oldest part, so the wait observed by `get` is the lag of
+    the oldest data it carries.
+
+    Args:
+        name (str): stage label of the queue metrics
+        maxsize (int): number of queued items
+        policy (str): one of `POLICIES`
+        merge (Callable | None): merge(older, newer) -> item, required for coalesce
+        labels (dict | None): extra labels of the queue metrics
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1,
+        policy: str = "coalesce",
+        merge: Optional[Callable[[Any, Any], Any]] = None,
+        labels: Optional[dict] = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {POLICIES}")
+        if policy == "coalesce" and merge is None:
+            raise ValueError("The coalesce policy needs a merge function")
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.merge = merge
+        self.labels = {**(labels or {}), "stage": name}
+        self._items: deque = deque()
+        self._changed = asyncio.Condition()
+        self.put_count = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.last_wait = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def put(self, item: Any) -> None:
+        """Queue `item`, applying the policy when the queue is full"""
+        async with self._changed:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    await self._changed.wait_for(lambda: len(self._items) < self.maxsize)
+                elif self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                    registry.inc("board_pipeline_dropped", labels=self.labels,
+                                 help="Items discarded by full pipeline queues")
+                else:
+                    queued, older = self._items[-1]
+                    self._items[-1] = (queued, self.merge(older, item))
+                    self.coalesced += 1
+                    registry.inc("board_pipeline_coalesced", labels=self.labels,
+                                 help="Items merged into a queued item by full pipeline queues")
+                    self._changed.notify_all()
+                    return
+            self._items.append((time.monotonic(), item))
+            self.put_count += 1
+            registry.set("board_pipeline_depth", len(self._items), labels=self.labels,
+                         help="Items waiting in pipeline queues")
+            self._changed.notify_all()
+
+    async def get(self) -> Any:
+        """Oldest queued item, waiting for one if the queue is empty"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._items) > 0)
+            queued, item = self._items.popleft()
+            self._changed.notify_all()
+        self.last_wait = time.monotonic() - queued
+        registry.set("board_pipeline_depth", len(self._items), labels=self.labels,
+                     help="Items waiting in pipeline queues")
+        registry.observe(
+            "board_pipeline_queue_seconds", self.last_wait, labels=self.labels, help=QUEUE_HELP
+        )
+        return item
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "depth": len(self._items),
+            "maxsize": self.maxsize,
+            "put": self.put_count,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "last_wait": self.last_wait,
+        }
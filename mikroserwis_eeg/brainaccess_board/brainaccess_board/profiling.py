@@ -0,0 +1,323 @@
+"""On-demand CPU and memory profiling of a running process.
+
+Nothing here is active until started: `TickProfiler.section` is a cheap
+no-op while no session runs, the sampler is a thread that exists only for the
+duration of a request and `tracemalloc` is switched on only by
+`MemoryTracker.start`.
+"""
+import cProfile
+import gc
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls")
+MEMORY_KEYS = ("lineno", "filename", "traceback")
+
+
+class TickProfiler:
+    """cProfile enabled only inside `section` blocks, for a limited time.
+
+    The profiled code marks the part of interest (e.g. one processing cycle)
+    with `section`; idle waiting in between is not recorded. Sections of
+    concurrent tasks on one event loop may overlap, the profiler then runs
+    from the first entry to the last exit. cProfile hooks a single thread,
+    so sections entered on other threads (e.g. executor workers) are recorded
+    by profilers of their own and merged into the report.
+    """
+
+    def __init__(self) -> None:
+        self.profile: Optional[cProfile.Profile] = None
+        self.until = 0.0
+        self.started = 0.0
+        self.sections = 0
+        self.thread_id: Optional[int] = None
+        self._open = 0
+        self._threads: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.profile is not None
+
+    def start(self, duration: float) -> None:
+        """Record sections for the next `duration` seconds.
+
+        Sections on the calling thread share one profiler, see `section`.
+
+        Raises:
+            RuntimeError: a session is already running
+        """
+        if self.profile is not None:
+            raise RuntimeError("Profiling session already running")
+        self.profile = cProfile.Profile()
+        self.started = time.monotonic()
+        self.until = self.started + duration
+        self.sections = 0
+        self.thread_id = threading.get_ident()
+        self._open = 0
+        self._threads = []
+
+    @contextmanager
+    def section(self) -> Iterator[None]:
+        profile = self.profile
+        if profile is None or time.monotonic() > self.until:
+            yield
+            return
+        if threading.get_ident() != self.thread_id:
+            own = cProfile.Profile()
+            own.enable()
+            try:
+                yield
+            finally:
+                own.disable()
+                with self._lock:
+                    if self.profile is profile:
+                        self._threads.append(own)
+                        self.sections += 1
+            return
+        # One cProfile hook per thread: enable on the first open section only
+        if self._open == 0:
+            profile.enable()
+        self._open += 1
+        try:
+            yield
+        finally:
+            # A session stopped meanwhile was already disabled by `stop`
+            if self.profile is profile:
+                self._open -= 1
+                if self._open == 0:
+                    profile.disable()
+                with self._lock:
+                    self.sections += 1
+
+    def stop(self, sort: str = "cumulative", limit: int = 30) -> dict[str, Any]:
+        """End the session.
+
+        Args:
+            sort (str): pstats sort key, one of `SORT_KEYS`
+            limit (int): number of functions in the report
+
+        Returns:
+            dict: profiled sections (of them on other threads), wall seconds
+            and the pstats report text
+        """
+        with self._lock:
+            profile, self.profile = self.profile, None
+            threads, self._threads = self._threads, []
+        if profile is None:
+            raise RuntimeError("No profiling session running")
+        if self._open:
+            profile.disable()
+            self._open = 0
+        stream = io.StringIO()
+        if self.sections:
+            # A profiler that was never enabled has no stats to load
+            parts = [profile, *threads] if self.sections > len(threads) else threads
+            stats = pstats.Stats(*parts, stream=stream)
+            stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return {
+            "sections": self.sections,
+            "thread_sections": len(threads),
+            "seconds": time.monotonic() - self.started,
+            "report": stream.getvalue(),
+        }
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Statistical profiler reading the stack of one thread at fixed intervals.
+
+    Unlike cProfile it adds no overhead to the profiled thread, so it can be
+    used on the event loop of a service under load. Executor worker threads
+    that the loop hands blocking work to can be sampled as well; they count
+    only while running a task, and their stacks start with the thread name.
+
+    Args:
+        thread_id (int | None): thread to sample, the calling thread by default
+        interval (float): seconds between samples
+        max_depth (int): innermost frames kept per stack
+        workers (Iterable[int]): ids of executor threads sampled in addition
+    """
+
+    def __init__(
+        self,
+        thread_id: Optional[int] = None,
+        interval: float = 0.005,
+        max_depth: int = 64,
+        workers: Iterable[int] = (),
+    ) -> None:
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.workers = [ident for ident in workers if ident != self.thread_id]
+
+    def run(self, duration: float, limit: int = 30) -> dict[str, Any]:
+        """Sample for `duration` seconds, blocking the calling thread.
+
+        Returns:
+            dict: number of samples, functions by own and total samples and
+            the most frequent stacks in collapsed ("outer;inner") format
+        """
+        stacks: Counter = Counter()
+        samples = 0
+        until = time.monotonic() + duration
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while time.monotonic() < until:
+            frames = sys._current_frames()
+            frame = frames.get(self.thread_id)
+            if frame is None:
+                break
+            stacks[self._stack(frame)] += 1
+            for ident in self.workers:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = self._stack(frame)
+                if any(name.startswith("run (thread.py") for name in stack):
+                    stacks[(names.get(ident, str(ident)), *stack)] += 1
+            samples += 1
+            time.sleep(self.interval)
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                total[name] += count
+        return {
+            "samples": samples,
+            "interval": self.interval,
+            "own": own.most_common(limit),
+            "total": total.most_common(limit),
+            "stacks": [(";".join(stack), count) for stack, count in stacks.most_common(limit)],
+        }
+
+    def _stack(self, frame: Any) -> tuple[str, ...]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+
+def _trace(stat: Any, key: str) -> str | list[str]:
+    if key == "traceback":
+        return stat.traceback.format()
+    return str(stat.traceback[-1])
+
+
+class MemoryTracker:
+    """tracemalloc snapshots, top allocations and diffs between snapshots.
+
+    Args:
+        frames (int): traceback depth stored per allocation
+    """
+
+    def __init__(self, frames: int = 10) -> None:
+        self.frames = frames
+        self.previous: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.previous = None
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.previous = None
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            )
+        )
+
+    def _traced(self) -> dict[str, int]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current": current, "peak": peak}
+
+    def top(self, limit: int = 20, key: str = "lineno") -> dict[str, Any]:
+        """Largest allocations by `key`, one of `MEMORY_KEYS`"""
+        stats = self._snapshot().statistics(key)
+        return {
+            "traced": self._traced(),
+            "top": [
+                {"trace": _trace(stat, key), "size": stat.size, "count": stat.count}
+                for stat in stats[:limit]
+            ],
+        }
+
+    def diff(self, limit: int = 20, key: str = "lineno") -> dict[str, Any]:
+        """Growth since the previous call; the first call only stores a snapshot"""
+        snapshot = self._snapshot()
+        previous, self.previous = self.previous, snapshot
+        if previous is None:
+            return {"traced": self._traced(), "diff": None}
+        stats = snapshot.compare_to(previous, key)
+        return {
+            "traced": self._traced(),
+            "diff": [
+                {
+                    "trace": _trace(stat, key),
+                    "size": stat.size,
+                    "size_diff": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+
+def object_counts() -> dict[str, dict[str, int]]:
+    """Live numpy arrays and pandas DataFrames and their memory.
+
+    Arrays are not tracked by the garbage collector, they are found as
+    referents of tracked objects (attributes, containers, frames). Only arrays
+    owning their data count towards `bytes`.
+
+    Returns:
+        dict: {"ndarray": {"count", "bytes"}, "DataFrame": {"count", "bytes"}}
+    """
+    objects = gc.get_objects()
+    seen: set[int] = set()
+    arrays = frames = 0
+    array_bytes = frame_bytes = 0
+    dataframe = getattr(sys.modules.get("pandas"), "DataFrame", None)
+    for obj in (*objects, *gc.get_referents(*objects)):
+        if id(obj) in seen:
+            continue
+        if isinstance(obj, np.ndarray):
+            seen.add(id(obj))
+            arrays += 1
+            if obj.base is None:
+                array_bytes += obj.nbytes
+        elif dataframe is not None and isinstance(obj, dataframe):
+            seen.add(id(obj))
+            frames += 1
+            frame_bytes += int(obj.memory_usage(index=True, deep=False).sum())
+    return {
+        "ndarray": {"count": arrays, "bytes": array_bytes},
+        "DataFrame": {"count": frames, "bytes": frame_bytes},
+    }
@@ -0,0 +1,153 @@
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+IMPEDANCE_DRIVE_AMPS = 6.0e-9  # 6 nA
+BOARD_RESISTOR_OHMS = 2 * 4.7e3  # 4.7 kOhm
+
+
+def estimate_impedance(std_uv: np.ndarray) -> np.ndarray:
+    """Electrode impedance in kOhm from the signal standard deviation.
+
+    Args:
+        std_uv (np.ndarray): per-channel standard deviation in microvolts
+
+    Returns:
+        np.ndarray: impedance estimate in kOhm, clipped at 0
+    """
+    impedance = (
+        (np.sqrt(2.0) * std_uv * 1.0e-6) / IMPEDANCE_DRIVE_AMPS - BOARD_RESISTOR_OHMS
+    ) / 1000
+    return np.maximum(impedance, 0)
+
+
+class StreamingQuality:
+    """Rolling per-channel signal quality of one device.
+
+    Each chunk is reduced once to per-channel count, sum, sum of squares and
+    number of saturated samples. Window statistics are running totals of those
+    reductions, expired chunks are subtracted, so an update costs O(chunk).
+
+    Args:
+        n_channels (int): number of channels
+        sfreq (float): sampling rate in Hz
+        window (float): length of the rolling window in seconds
+        flat_std (float): std in microvolts below which a channel is flat
+        saturation_level (float): absolute value in microvolts treated as clipped
+        max_impedance (float): impedance in kOhm above which contact is bad
+    """
+
+    def __init__(
+        self,
+        n_channels: int,
+        sfreq: float,
+        window: float = 2.0,
+        flat_std: float = 0.5,
+        saturation_level: float = 390_000.0,
+        max_impedance: float = 1000.0,
+    ) -> None:
+        self.n_channels = n_channels
+        self.sfreq = sfreq
+        self.window_samples = max(1, int(window * sfreq))
+        self.flat_std = flat_std
+        self.saturation_level = saturation_level
+        self.max_impedance = max_impedance
+        self.reset()
+
+    def reset(self) -> None:
+        self._chunks: deque = deque()
+        self._count = 0
+        self._sum = np.zeros(self.n_channels)
+        self._sumsq = np.zeros(self.n_channels)
+        self._saturated = np.zeros(self.n_channels)
+        # Accumulating around a reference keeps sum of squares accurate with DC offsets
+        self._reference: Optional[np.ndarray] = None
+
+    def update(self, chunk: np.ndarray) -> None:
+        """Add a new chunk of shape (n_channels, n_samples), values in microvolts"""
+        chunk = np.asarray(chunk, dtype=float)
+        count = chunk.shape[-1]
+        if count == 0:
+            return
+        if self._reference is None:
+            self._reference = chunk[:, 0].copy()
+        centered = chunk - self._reference[:, None]
+        stats = (
+            count,
+            centered.sum(axis=1),
+            np.einsum("ij,ij->i", centered, centered),
+            (np.abs(chunk) >= self.saturation_level).sum(axis=1),
+        )
+        self._chunks.append(stats)
+        self._add(stats, 1)
+        while self._count - self._chunks[0][0] >= self.window_samples:
+            self._add(self._chunks.popleft(), -1)
+
+    def _add(self, stats: tuple, sign: int) -> None:
+        count, total, sumsq, saturated = stats
+        self._count += sign * count
+        self._sum += sign * total
+        self._sumsq += sign * sumsq
+        self._saturated += sign * saturated
+
+    def std(self) -> np.ndarray:
+        """Per-channel standard deviation over the window, in microvolts"""
+        if self._count == 0:
+            return np.full(self.n_channels, np.nan)
+        mean = self._sum / self._count
+        return np.sqrt(np.maximum(self._sumsq / self._count - mean**2, 0))
+
+    def summary(self) -> dict:
+        """Per-channel quality over the current window.
+
+        Returns:
+            dict: lists of std (uV), impedance (kOhm), flatline, saturated and
+            good flags, plus the number of samples in the window
+        """
+        std = self.std()
+        impedance = estimate_impedance(std)
+        flat = std < self.flat_std
+        saturated = self._saturated > 0
+        good = ~flat & ~saturated & (impedance <= self.max_impedance)
+        if self._count == 0:
+            good[:] = False
+        return {
+            "samples": int(self._count),
+            "std": std.tolist(),
+            "impedance": impedance.tolist(),
+            "flatline": flat.tolist(),
+            "saturated": saturated.tolist(),
+            "good": good.tolist(),
+        }
+
+
+class QualityMonitor:
+    """Per-device signal quality monitors created on first use.
+
+    Args:
+        **settings: keyword arguments passed to `StreamingQuality`
+    """
+
+    def __init__(self, **settings) -> None:
+        self.settings = settings
+        self.monitors: dict[str, StreamingQuality] = {}
+
+    def update(self, device: str, chunk: np.ndarray, sfreq: float) -> StreamingQuality:
+        """Add a new chunk (n_channels, n_samples) in microvolts for `device`"""
+        monitor = self.monitors.get(device)
+        n_channels = np.shape(chunk)[0]
+        if monitor is None or monitor.sfreq != sfreq or monitor.n_channels != n_channels:
+            monitor = StreamingQuality(n_channels, sfreq, **self.settings)
+            self.monitors[device] = monitor
+        monitor.update(chunk)
+        return monitor
+
+    def summary(self) -> dict[str, dict]:
+        return {device: monitor.summary() for device, monitor in self.monitors.items()}
+
+    def reset(self, device: Optional[str] = None) -> None:
+        if device is None:
+            self.monitors.clear()
+        else:
+            self.monitors.pop(device, None)
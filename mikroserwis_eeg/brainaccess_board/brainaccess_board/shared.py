@@ -0,0 +1,262 @@
+import json
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+import numpy as np
+
+from .metrics import registry
+
+MAGIC = b"EEGSHM02"
+# magic, seq, n_channels, capacity, write_pos, sfreq, relaxation, stress, updated, meta_len, dtype
+HEADER = struct.Struct("<8sQQQQddqdQ8s")
+HEADER_SIZE = 128
+META_SIZE = 16384
+SEQ_OFFSET = 8
+
+# Segments created by writers in this process, their tracker entries must stay
+_created: set[str] = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without letting this process unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if name in _created:
+            return shm
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+        return shm
+
+
+class SharedWindowWriter:
+    """Single producer of the latest sample window and computed levels.
+
+    The segment holds a fixed header, a small JSON metadata area and a ring of
+    samples of shape (n_channels, capacity) and the given dtype. Every publish is wrapped
+    in a sequence lock: the counter is odd while a write is in progress, so
+    readers can detect and retry torn reads without any locking.
+
+    Args:
+        name (str): shared memory name, creation fails if it already exists
+        n_channels (int): number of channels in the ring
+        capacity (int): ring length in samples
+        sfreq (float): sampling rate in Hz, may be updated by `publish`
+        dtype (np.dtype): sample dtype of the ring, float32 halves its size
+    """
+
+    def __init__(
+        self,
+        name: str,
+        n_channels: int,
+        capacity: int,
+        sfreq: float = 0.0,
+        dtype: np.dtype = np.float64,
+    ) -> None:
+        self.dtype = np.dtype(dtype)
+        size = HEADER_SIZE + META_SIZE + n_channels * capacity * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+        self.name = name
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self.sfreq = sfreq
+        self.seq = 0
+        self.write_pos = 0
+        self.relaxation = float("nan")
+        self.stress = -1
+        self.meta = b""
+        self.ring = np.ndarray(
+            (n_channels, capacity), dtype=self.dtype, buffer=self.shm.buf,
+            offset=HEADER_SIZE + META_SIZE,
+        )
+        self.ring[:] = 0
+        self._write_header()
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(
+            self.shm.buf, 0, MAGIC, self.seq, self.n_channels, self.capacity,
+            self.write_pos, self.sfreq, self.relaxation, self.stress, time.time(),
+            len(self.meta), self.dtype.str.encode(),
+        )
+
+    def publish(
+        self,
+        samples: Optional[np.ndarray] = None,
+        relaxation: Optional[float] = None,
+        stress: Optional[int] = None,
+        meta: Optional[dict] = None,
+        sfreq: Optional[float] = None,
+    ) -> bool:
+        """Append new samples and replace the levels in one consistent update.
+
+        Args:
+            samples (np.ndarray | None): new samples of shape (n_channels, n_samples)
+            relaxation (float | None): latest relaxation level
+            stress (int | None): latest stress level
+            meta (dict | None): small JSON-serialisable extra state
+            sfreq (float | None): sampling rate
+
+        Returns:
+            bool: False when `meta` encodes to more than `META_SIZE` bytes and
+            readers keep the previous metadata
+        """
+        stored = True
+        self._begin()
+        if samples is not None:
+            samples = np.asarray(samples)
+            skipped, _ = self.positions(samples.shape[1])
+            samples = samples[:, skipped:]
+            count = samples.shape[1]
+            start = self.write_pos % self.capacity
+            first = min(count, self.capacity - start)
+            self.ring[:, start:start + first] = samples[:, :first]
+            self.ring[:, : count - first] = samples[:, first:]
+            self.write_pos += count
+        if sfreq is not None:
+            self.sfreq = sfreq
+        self.relaxation = float("nan") if relaxation is None else float(relaxation)
+        self.stress = -1 if stress is None else int(stress)
+        if meta is not None:
+            encoded = json.dumps(meta).encode()
+            if len(encoded) <= META_SIZE:
+                self.meta = encoded
+                self.shm.buf[HEADER_SIZE:HEADER_SIZE + len(encoded)] = encoded
+            else:
+                stored = False
+                registry.inc("board_shared_meta_overflow",
+                             help="Shared memory updates whose metadata did not fit")
+        self._end()
+        return stored
+
+    def positions(self, count: int) -> tuple[int, int]:
+        """Where the next `publish` of `count` samples puts them.
+
+        Only the last `capacity` samples fit the ring, the leading ones are
+        skipped; the kept ones are numbered from the current `write_pos`.
+
+        Returns:
+            tuple: number of skipped leading samples and the position of the
+            first kept sample
+        """
+        return max(0, count - self.capacity), self.write_pos
+
+    def touch(self) -> None:
+        """Refresh the update time only, tells readers the producer is alive"""
+        self._begin()
+        self._end()
+
+    def _begin(self) -> None:
+        self.seq += 1
+        struct.pack_into("<Q", self.shm.buf, SEQ_OFFSET, self.seq)
+
+    def _end(self) -> None:
+        # Header fields are written while seq is still odd, the even seq is
+        # stored last so readers never accept a half-written header
+        self._write_header()
+        self.seq += 1
+        struct.pack_into("<Q", self.shm.buf, SEQ_OFFSET, self.seq)
+
+    def close(self, unlink: bool = True) -> None:
+        del self.ring
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _created.discard(self.name)
+
+
+class SharedWindowReader:
+    """Reader of a segment published by `SharedWindowWriter`.
+
+    Reads never touch the database. `ring` is a zero-copy view of the sample
+    buffer; `read_levels` and `read_window` return consistent copies.
+
+    Args:
+        name (str): shared memory name
+        retries (int): attempts before giving up on a consistent read
+    """
+
+    def __init__(self, name: str, retries: int = 100) -> None:
+        self.shm = _attach(name)
+        self.name = name
+        self.retries = retries
+        header = HEADER.unpack_from(self.shm.buf, 0)
+        if header[0] != MAGIC:
+            self.shm.close()
+            raise ValueError(f"Shared memory {name} is not an EEG window segment")
+        self.n_channels, self.capacity = header[2], header[3]
+        self.dtype = np.dtype(header[10].rstrip(b"\0").decode())
+        self.ring = np.ndarray(
+            (self.n_channels, self.capacity), dtype=self.dtype, buffer=self.shm.buf,
+            offset=HEADER_SIZE + META_SIZE,
+        )
+
+    def _seq(self) -> int:
+        return struct.unpack_from("<Q", self.shm.buf, SEQ_OFFSET)[0]
+
+    def _consistent(self, read: Any) -> Any:
+        for _ in range(self.retries):
+            before = self._seq()
+            if before % 2:
+                time.sleep(0)
+                continue
+            result = read()
+            if self._seq() == before:
+                return result
+        raise TimeoutError(f"No consistent snapshot of {self.name}")
+
+    def _header(self) -> dict:
+        _, seq, _, _, write_pos, sfreq, relaxation, stress, updated, meta_len, _ = (
+            HEADER.unpack_from(self.shm.buf, 0)
+        )
+        return {
+            "seq": seq,
+            "write_pos": write_pos,
+            "sfreq": sfreq,
+            "relaxation": None if np.isnan(relaxation) else relaxation,
+            "stress": None if stress < 0 else stress,
+            "updated": updated,
+            "meta_len": meta_len,
+        }
+
+    def read_levels(self) -> dict:
+        """Latest levels, sampling rate, update time and metadata"""
+
+        def read() -> dict:
+            header = self._header()
+            meta_len = header.pop("meta_len")
+            raw = bytes(self.shm.buf[HEADER_SIZE:HEADER_SIZE + meta_len])
+            header["meta"] = raw
+            return header
+
+        header = self._consistent(read)
+        header["meta"] = json.loads(header["meta"]) if header["meta"] else {}
+        return header
+
+    def read_window(self, n_samples: Optional[int] = None) -> tuple[np.ndarray, int]:
+        """Copy of the last `n_samples` samples (all available by default).
+
+        Returns:
+            tuple: (array of shape (n_channels, n), total samples written)
+        """
+
+        def read() -> tuple[np.ndarray, int]:
+            write_pos = self._header()["write_pos"]
+            available = min(write_pos, self.capacity)
+            count = available if n_samples is None else min(n_samples, available)
+            end = write_pos % self.capacity
+            index = np.arange(end - count, end) % self.capacity
+            return self.ring[:, index], write_pos
+
+        return self._consistent(read)
+
+    def close(self) -> None:
+        del self.ring
+        self.shm.close()
@@ -2,11 +2,27 @@ import sqlite3
 import pathlib
 import numpy as np
 import io
+import lzma
 import threading
+import time
+import zlib
 
 from typing import Union, Optional, List, Dict
 
-lock = threading.Lock()
+from .metrics import registry
+
+# Size of sqlite3's per-connection prepared statement cache
+CACHED_STATEMENTS = 256
+
+STAGE_METRIC = "board_db_stage_seconds"
+STAGE_HELP = "Time spent in each stage of the board database read path"
+
+NPY_MAGIC = b"\x93NUMPY"
+XZ_MAGIC = b"\xfd7zXZ"
+COMPRESSORS = {
+    "zlib": zlib.compress,
+    "lzma": lzma.compress,
+}
 
 
 def adapt_array(arr: np.ndarray) -> sqlite3.Binary:
@@ -19,59 +35,134 @@ def adapt_array(arr: np.ndarray) -> sqlite3.Binary:
     return sqlite3.Binary(out.read())
 
 
+def compress_array(arr: np.ndarray, compression: str = "zlib") -> sqlite3.Binary:
+    """
+    Converts a NumPy array to a compressed binary format ('zlib' or 'lzma').
+    `convert_array` recognises the format, so compressed and plain blobs can
+    be read the same way.
+    """
+    return sqlite3.Binary(COMPRESSORS[compression](adapt_array(arr)))
+
+
 def convert_array(text: bytes) -> np.ndarray:
     """
     Converts a binary format back to a NumPy array.
     """
+    if text[:6] != NPY_MAGIC:
+        if text[:6] == XZ_MAGIC:
+            text = lzma.decompress(text)
+        else:
+            text = zlib.decompress(text)
     out = io.BytesIO(text)
     out.seek(0)
     return np.load(out)
 
 
+# Seconds the current thread spent in `convert_array` during the running query
+_decoding = threading.local()
+
+
+def _timed_convert_array(text: bytes) -> np.ndarray:
+    """
+    `convert_array` as called by sqlite3 inside `fetchall`, timed separately
+    so that `query` can report the blob decode apart from the SQL itself.
+    """
+    start = time.perf_counter()
+    try:
+        return convert_array(text)
+    finally:
+        _decoding.seconds = getattr(_decoding, "seconds", 0.0) + time.perf_counter() - start
+
+
 sqlite3.register_adapter(np.ndarray, adapt_array)
-sqlite3.register_converter("array", convert_array)
+sqlite3.register_converter("array", _timed_convert_array)
 
 
-def get_handle(name: Union[pathlib.Path, str], uri: bool = False) -> Dict:
+def get_handle(
+    name: Union[pathlib.Path, str], uri: bool = False, read_only: bool = False
+) -> Dict:
     """
     Establishes a connection to an SQLite database and sets up the cursor.
 
     Parameters:
     name (Union[pathlib.Path, str]): Path to the SQLite database file.
     uri (bool): Whether to treat the name as a URI.
+    read_only (bool): Open an existing file without changing it: no journal
+    mode switch, no file created.
 
     Returns:
-    Dict: A dictionary containing the cursor and connection objects.
+    Dict: A dictionary containing the cursor, connection and lock objects.
+    Each handle has its own lock, so separate handles can be read from
+    different threads concurrently.
     """
+    database = str(name)
+    if read_only and not uri:
+        database = f"{pathlib.Path(name).resolve().as_uri()}?mode=ro"
     con = sqlite3.connect(
-        str(name),
+        database,
         detect_types=sqlite3.PARSE_DECLTYPES,
         check_same_thread=False,
-        uri=uri,
+        uri=uri or read_only,
+        cached_statements=CACHED_STATEMENTS,
     )
     cur = con.cursor()
-    cur.execute("PRAGMA journal_mode=wal")
-    return {"cur": cur, "con": con}
+    if not read_only:
+        cur.execute("PRAGMA journal_mode=wal")
+    return {
+        "cur": cur,
+        "con": con,
+        "lock": threading.Lock(),
+        "name": name,
+        "uri": uri,
+        "read_only": read_only,
+    }
+
+
+def clone_handle(handle: Dict) -> Dict:
+    """
+    Opens a new connection to the same database as `handle`, for use from
+    another thread.
+
+    Parameters:
+    handle (Dict): The database handle to clone.
+
+    Returns:
+    Dict: A new database handle.
+    """
+    return get_handle(handle["name"], uri=handle["uri"], read_only=handle.get("read_only", False))
 
 
-def query(handle: Dict, sql_query: str) -> List:
+def query(handle: Dict, sql_query: str, params: tuple = ()) -> List:
     """
     Executes a given SQL query and fetches all results.
 
     Parameters:
     handle (Dict): The database handle containing cursor and connection.
-    sql_query (str): The SQL query to execute.
+    sql_query (str): The SQL query to execute. Values should be passed as
+        `?` placeholders so the prepared statement is reused from the cache.
+    params (tuple): Values bound to the placeholders.
 
     Returns:
     List: Query results.
+
+    The "query" stage covers the SQL and row transfer; array blobs are decoded
+    by the registered converter during the fetch and reported as "decode".
     """
-    with lock:
+    with handle["lock"]:
+        _decoding.seconds = 0.0
+        start = time.perf_counter()
         try:
-            handle["cur"].execute(sql_query)
-            return handle["cur"].fetchall()
+            handle["cur"].execute(sql_query, params)
+            rows = handle["cur"].fetchall()
         except Exception as e:
             print(f"Error at query {sql_query}: {e}")
-            return []
+            rows = []
+        elapsed = time.perf_counter() - start
+        decoding = _decoding.seconds
+    registry.observe(STAGE_METRIC, elapsed - decoding, {"stage": "query"}, STAGE_HELP)
+    if decoding:
+        registry.observe(STAGE_METRIC, decoding, {"stage": "decode"}, STAGE_HELP)
+    return rows
 
 
 def get_tables(handle: Dict) -> List[str]:
@@ -149,6 +240,60 @@ def get_first_timestamp(handle: Dict, device: str) -> Optional[float]:
     return result[0][0] if result else None
 
 
+def get_span(handle: Dict, device: str) -> Optional[tuple]:
+    """
+    Summarizes the extent of a data table from its first and last rows.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+
+    Returns:
+    Optional[tuple]: `(rows, first_local_clock, last_local_clock, first_time,
+        last_time)`, or None if the table is missing or empty.
+    """
+    data = get_table(handle, name="data", name2=device)
+    if not data:
+        return None
+    first = query(handle, f"SELECT MIN(rowid) FROM `{data}`")
+    last = query(handle, f"SELECT MAX(rowid) FROM `{data}`")
+    if not first or first[0][0] is None:
+        return None
+    count = query(handle, f"SELECT COUNT(*) FROM `{data}`")[0][0]
+    sql_query = f"SELECT time, local_clock FROM `{data}` WHERE rowid = ?"
+    first_time, first_clock = query(handle, sql_query, (first[0][0],))[0]
+    last_time, last_clock = query(handle, sql_query, (last[0][0],))[0]
+    return (
+        count,
+        first_clock,
+        last_clock,
+        float(np.ravel(first_time)[0]),
+        float(np.ravel(last_time)[-1]),
+    )
+
+
+def get_data_version(handle: Dict) -> Optional[int]:
+    """
+    Reads `PRAGMA data_version`, which changes whenever another connection
+    commits to the database.
+
+    Parameters:
+    handle (Dict): The database handle, kept open between calls.
+
+    Returns:
+    Optional[int]: The data version, or None on error.
+
+    Change watchers poll this every few milliseconds, so it bypasses `query`
+    and its read-latency metrics.
+    """
+    with handle["lock"]:
+        try:
+            return handle["cur"].execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error at query PRAGMA data_version: {e}")
+            return None
+
+
 class InvalidDirectionError(Exception):
     pass
 
@@ -178,13 +323,14 @@ def get_data(
         sql_query = (
             f"select data, time, local_clock from `{data}` ORDER BY local_clock DESC"
         )
+        return query(handle, sql_query)
     elif direction == "last":
-        sql_query = f"SELECT data, time, local_clock FROM `{data}` ORDER BY local_clock DESC LIMIT {count}"
+        sql_query = f"SELECT data, time, local_clock FROM `{data}` ORDER BY local_clock DESC LIMIT ?"
     elif direction == "first":
-        sql_query = f"SELECT data, time, local_clock FROM `{data}` ORDER BY local_clock INC LIMIT {count}"
+        sql_query = f"SELECT data, time, local_clock FROM `{data}` ORDER BY local_clock ASC LIMIT ?"
     else:
         raise InvalidDirectionError("Direction must be 'all', 'last', or 'first'.")
-    return query(handle, sql_query)
+    return query(handle, sql_query, (count,))
 
 
 def get_last_seconds_data(handle: Dict, device: str, duration: int) -> List:
@@ -202,8 +348,8 @@ def get_last_seconds_data(handle: Dict, device: str, duration: int) -> List:
     data = get_table(handle, name="data", name2=device)
     if not data:
         return []
-    sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE local_clock+{duration} > (SELECT MAX(local_clock) FROM `{data}`) ORDER BY local_clock DESC"
-    return query(handle, sql_query)
+    sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE local_clock > (SELECT MAX(local_clock) FROM `{data}`) - ? ORDER BY local_clock DESC"
+    return query(handle, sql_query, (duration,))
 
 
 def get_devices(handle: Dict) -> List[str]:
@@ -239,10 +385,236 @@ def get_data_after(handle: Dict, start: float, column: str, device: str) -> List
     Returns:
     List: Data records.
     """
+    if column not in ("time", "local_clock"):
+        raise ValueError("Column must be 'time' or 'local_clock'.")
+    data = get_table(handle, name="data", name2=device)
+    sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE {column} > ? ORDER BY {column}"
+    return query(handle, sql_query, (start,))
+
+
+def find_rowid(handle: Dict, table: str, local_clock: float) -> Optional[int]:
+    """
+    Finds the first row whose `local_clock` is not smaller than the given value.
+
+    Rows are appended in acquisition order, so `local_clock` grows with the
+    rowid and a binary search over the rowid B-tree needs O(log n) point
+    lookups instead of a table scan.
+
+    Parameters:
+    handle (Dict): The database handle.
+    table (str): The data table name.
+    local_clock (float): The value to search for.
+
+    Returns:
+    Optional[int]: The rowid, or None if all rows are older.
+    """
+    # Separate queries: SQLite only optimizes a lone MIN or MAX into a B-tree seek
+    first = query(handle, f"SELECT MIN(rowid) FROM `{table}`")
+    last = query(handle, f"SELECT MAX(rowid) FROM `{table}`")
+    if not first or first[0][0] is None:
+        return None
+    lo, hi = first[0][0], last[0][0] + 1
+    sql_query = f"SELECT rowid, local_clock FROM `{table}` WHERE rowid >= ? ORDER BY rowid LIMIT 1"
+    while lo < hi:
+        mid = (lo + hi) // 2
+        row = query(handle, sql_query, (mid,))
+        if not row or row[0][1] >= local_clock:
+            hi = mid
+        else:
+            lo = row[0][0] + 1
+    row = query(handle, sql_query, (lo,))
+    return row[0][0] if row else None
+
+
+def get_data_between(handle: Dict, device: str, start: float, end: float) -> List:
+    """
+    Retrieves data records with `start <= local_clock`, up to and including
+    the first record at or after `end`, in ascending order.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    start (float): Start of the range (local clock).
+    end (float): End of the range (local clock).
+
+    Returns:
+    List: Data records.
+    """
+    data = get_table(handle, name="data", name2=device)
+    if not data:
+        return []
+    first = find_rowid(handle, data, start)
+    if first is None:
+        return []
+    last = find_rowid(handle, data, end)
+    if last is None:
+        sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE rowid >= ? ORDER BY rowid"
+        return query(handle, sql_query, (first,))
+    sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE rowid BETWEEN ? AND ? ORDER BY rowid"
+    return query(handle, sql_query, (first, last))
+
+
+def get_data_after_rowid(
+    handle: Dict, device: str, rowid: int, count: int = -1
+) -> List:
+    """
+    Retrieves data records appended after the given rowid, in insertion order.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    rowid (int): The last rowid already read.
+    count (int): Maximal number of records, -1 for no limit.
+
+    Returns:
+    List: `(rowid, data, time, local_clock)` records.
+    """
+    data = get_table(handle, name="data", name2=device)
+    if not data:
+        return []
+    sql_query = f"SELECT rowid, data, time, local_clock FROM `{data}` WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    return query(handle, sql_query, (rowid, count))
+
+
+def get_row_clocks(handle: Dict, device: str) -> List:
+    """
+    Lists the rowid and local clock of every record without reading the blobs.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+
+    Returns:
+    List: `(rowid, local_clock)` records in insertion order.
+    """
     data = get_table(handle, name="data", name2=device)
-    sql_query = f"SELECT data, time, local_clock FROM `{data}` WHERE {column} > {start} ORDER BY {column}"
+    if not data:
+        return []
+    sql_query = f"SELECT rowid, local_clock FROM `{data}` ORDER BY rowid"
     return query(handle, sql_query)
 
 
+def get_local_clock(handle: Dict, device: str, rowid: int) -> Optional[float]:
+    """
+    Reads the local clock of one record.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    rowid (int): The rowid of the record.
+
+    Returns:
+    Optional[float]: The local clock, or None if there is no such record.
+    """
+    data = get_table(handle, name="data", name2=device)
+    if not data:
+        return None
+    result = query(handle, f"SELECT local_clock FROM `{data}` WHERE rowid = ?", (rowid,))
+    return result[0][0] if result else None
+
+
+def create_device_tables(
+    handle: Dict,
+    device: str,
+    channels: List[str],
+    channels_type: List[str],
+    channels_unit: List[str],
+    sf: float,
+    device_id: Optional[str] = None,
+) -> None:
+    """
+    Creates the board-format `meta_<device>` and `data_<device>` tables and
+    stores the device metadata row.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    channels (List[str]): Channel names.
+    channels_type (List[str]): Channel types (e.g. 'EEG').
+    channels_unit (List[str]): Channel units (e.g. 'uV').
+    sf (float): Sampling rate, 0 for marker devices.
+    device_id (Optional[str]): Value of the metadata `id` column.
+    """
+    with handle["lock"]:
+        cur = handle["cur"]
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS `meta_{device}` "
+            "(channels TEXT, channels_type TEXT, channels_unit TEXT, sf REAL, id TEXT)"
+        )
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS `data_{device}` "
+            "(data array, time array, local_clock REAL)"
+        )
+        cur.execute(
+            f"INSERT INTO `meta_{device}` VALUES (?, ?, ?, ?, ?)",
+            (
+                ",".join(channels),
+                ",".join(channels_type),
+                ",".join(channels_unit),
+                sf,
+                device_id or device,
+            ),
+        )
+        handle["con"].commit()
+
+
+def insert_data(handle: Dict, device: str, rows: List[tuple]) -> None:
+    """
+    Appends chunks to the data table of a device.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    rows (List[tuple]): `(data, time, local_clock)` tuples, `data` and `time`
+        being NumPy arrays.
+    """
+    with handle["lock"]:
+        handle["cur"].executemany(
+            f"INSERT INTO `data_{device}` (data, time, local_clock) VALUES (?, ?, ?)",
+            rows,
+        )
+        handle["con"].commit()
+
+
+def create_chunk_index(handle: Dict, device: str, rows: List[tuple]) -> None:
+    """
+    Stores the time/sample index of a compacted data table in `index_<device>`.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+    rows (List[tuple]): `(data_rowid, first_sample, n_samples, first_time,
+        last_time, local_clock)` tuples.
+    """
+    with handle["lock"]:
+        cur = handle["cur"]
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS `index_{device}` "
+            "(data_rowid INTEGER PRIMARY KEY, first_sample INTEGER, n_samples INTEGER, "
+            "first_time REAL, last_time REAL, local_clock REAL)"
+        )
+        cur.executemany(f"INSERT INTO `index_{device}` VALUES (?, ?, ?, ?, ?, ?)", rows)
+        handle["con"].commit()
+
+
+def get_chunk_index(handle: Dict, device: str) -> List:
+    """
+    Retrieves the chunk index of a compacted data table, empty for tables
+    written by the board.
+
+    Parameters:
+    handle (Dict): The database handle.
+    device (str): The device identifier.
+
+    Returns:
+    List: `(data_rowid, first_sample, n_samples, first_time, last_time,
+    local_clock)` records.
+    """
+    index = get_table(handle, name="index_", name2=device)
+    if not index:
+        return []
+    return query(handle, f"SELECT * FROM `{index}` ORDER BY data_rowid")
+
+
 def close_db(handle: Dict) -> None:
     handle["con"].close()
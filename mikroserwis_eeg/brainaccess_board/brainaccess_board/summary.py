@@ -0,0 +1,229 @@
+import json
+import os
+import pathlib
+from typing import Any, Optional
+
+import numpy as np
+
+from .sq import get_data_after_rowid
+
+DEFAULT_LEVELS = (1.0, 10.0, 60.0)
+# Rows summarised per batch, bounds memory when catching up on a long session
+BATCH_ROWS = 10000
+
+
+def _reduce_bins(data: np.ndarray, times: np.ndarray, t0: float, resolution: float) -> tuple:
+    """Group samples into bins of `resolution` seconds.
+
+    Returns:
+        tuple: bin ids, counts and per-channel min, max and sum of every bin
+    """
+    bins = np.floor((times - t0) / resolution).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    counts = np.diff(np.r_[starts, bins.shape[0]])
+    return (
+        bins[starts],
+        counts,
+        np.minimum.reduceat(data, starts, axis=1),
+        np.maximum.reduceat(data, starts, axis=1),
+        np.add.reduceat(data, starts, axis=1),
+    )
+
+
+class SummaryStore:
+    """Incrementally maintained min/max/mean pyramid of a board database.
+
+    Every device and decimation level is an append-only float64 file next to
+    the database (`<database>.summary/<device>_<level>s.bin`), one record per
+    completed bin: bin start, sample count, then per-channel min, max and
+    mean. Files are read through `np.memmap`, so overviews of long sessions
+    never touch the `data_*` tables. Bins still filling up are kept in
+    `state.json` together with the last summarised rowid.
+
+    Args:
+        database (str | pathlib.Path): board database file
+        levels (tuple): bin lengths in seconds
+        directory (str | pathlib.Path | None): sidecar directory
+    """
+
+    def __init__(
+        self,
+        database: str | pathlib.Path,
+        levels: tuple = DEFAULT_LEVELS,
+        directory: Optional[str | pathlib.Path] = None,
+    ) -> None:
+        self.database = str(database)
+        self.levels = tuple(sorted(float(level) for level in levels))
+        self.directory = pathlib.Path(directory or f"{database}.summary")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.state_file = self.directory / "state.json"
+        self.state: dict[str, Any] = {"levels": list(self.levels), "devices": {}}
+        if self.state_file.exists():
+            state = json.loads(self.state_file.read_text())
+            if state.get("levels") == list(self.levels):
+                self.state = state
+
+    def _level_file(self, device: str, level: float) -> pathlib.Path:
+        return self.directory / f"{device}_{level:g}s.bin"
+
+    def _save_state(self) -> None:
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.state_file)
+
+    def update(self, handle: dict, device: str) -> int:
+        """Summarise rows added to `device` since the last update.
+
+        Args:
+            handle (dict): database handle
+            device (str): data device
+
+        Returns:
+            int: number of new samples summarised
+        """
+        total = 0
+        while True:
+            dev_state = self.state["devices"].get(device)
+            rows = get_data_after_rowid(
+                handle, device, dev_state["last_rowid"] if dev_state else 0, BATCH_ROWS
+            )
+            if not rows:
+                break
+            total += self._summarise(device, rows)
+            if len(rows) < BATCH_ROWS:
+                break
+        if total:
+            self._save_state()
+        return total
+
+    def _summarise(self, device: str, rows: list) -> int:
+        dev_state = self.state["devices"].get(device)
+        data = np.block([x[1] for x in rows]).astype(np.float64)
+        times = np.block([x[2] for x in rows]).astype(np.float64)
+        if dev_state is None:
+            dev_state = {
+                "last_rowid": 0,
+                "t0": float(times[0]),
+                "n_channels": int(data.shape[0]),
+                "open": {},
+            }
+            self.state["devices"][device] = dev_state
+            for level in self.levels:
+                self._level_file(device, level).unlink(missing_ok=True)
+
+        for level in self.levels:
+            ids, counts, mins, maxs, sums = _reduce_bins(data, times, dev_state["t0"], level)
+            key = f"{level:g}"
+            partial = dev_state["open"].get(key)
+            completed = []
+            if partial is not None:
+                if partial["bin"] == ids[0]:
+                    counts[0] += partial["count"]
+                    mins[:, 0] = np.minimum(mins[:, 0], partial["min"])
+                    maxs[:, 0] = np.maximum(maxs[:, 0], partial["max"])
+                    sums[:, 0] += partial["sum"]
+                else:
+                    completed.append(self._record(partial["bin"], partial["count"],
+                                                  partial["min"], partial["max"],
+                                                  partial["sum"], dev_state["t0"], level))
+            for i in range(len(ids) - 1):
+                completed.append(self._record(ids[i], counts[i], mins[:, i], maxs[:, i],
+                                              sums[:, i], dev_state["t0"], level))
+            dev_state["open"][key] = {
+                "bin": int(ids[-1]),
+                "count": int(counts[-1]),
+                "min": mins[:, -1].tolist(),
+                "max": maxs[:, -1].tolist(),
+                "sum": sums[:, -1].tolist(),
+            }
+            if completed:
+                with open(self._level_file(device, level), "ab") as f:
+                    f.write(np.vstack(completed).tobytes())
+        dev_state["last_rowid"] = int(rows[-1][0])
+        return int(data.shape[1])
+
+    @staticmethod
+    def _record(bin_id, count, mins, maxs, sums, t0, level) -> np.ndarray:
+        mins = np.asarray(mins, dtype=np.float64)
+        return np.concatenate(
+            [
+                [t0 + bin_id * level, count],
+                mins,
+                np.asarray(maxs, dtype=np.float64),
+                np.asarray(sums, dtype=np.float64) / count,
+            ]
+        )
+
+    def _read_level(self, device: str, level: float) -> np.ndarray:
+        dev_state = self.state["devices"][device]
+        width = 2 + 3 * dev_state["n_channels"]
+        path = self._level_file(device, level)
+        if path.exists() and path.stat().st_size:
+            records = np.memmap(path, dtype=np.float64, mode="r").reshape(-1, width)
+        else:
+            records = np.empty((0, width))
+        partial = dev_state["open"].get(f"{level:g}")
+        if partial is not None:
+            last = self._record(partial["bin"], partial["count"], partial["min"],
+                                partial["max"], partial["sum"], dev_state["t0"], level)
+            records = np.vstack([records, last])
+        return records
+
+    def get_overview(
+        self,
+        device: str,
+        time_range: Optional[tuple] = None,
+        max_points: int = 1000,
+    ) -> dict[str, Any]:
+        """Coarse min/max/mean of `device` with at most `max_points` bins.
+
+        The finest level that fits is used; if even the coarsest has too many
+        bins they are merged further on the fly.
+
+        Args:
+            device (str): data device
+            time_range (tuple | None): (start, end) in sample `time` units
+            max_points (int): maximal number of bins returned
+
+        Returns:
+            dict: {"time", "count", "min", "max", "mean", "resolution"}, the
+            per-channel arrays having shape (n_channels, n_bins)
+        """
+        if device not in self.state["devices"]:
+            return {}
+        n_channels = self.state["devices"][device]["n_channels"]
+        for level in self.levels:
+            records = self._read_level(device, level)
+            if time_range is not None:
+                start, end = time_range
+                first = np.searchsorted(records[:, 0], start - level, side="right")
+                last = np.searchsorted(records[:, 0], end, side="right")
+                records = records[first:last]
+            if len(records) <= max_points:
+                break
+        resolution = level
+        if len(records) > max_points:
+            factor = int(np.ceil(len(records) / max_points))
+            starts = np.arange(0, len(records), factor)
+            counts = np.add.reduceat(records[:, 1], starts)
+            c = n_channels
+            weighted = records[:, 2 + 2 * c:] * records[:, 1:2]
+            records = np.column_stack(
+                [
+                    records[starts, 0],
+                    counts,
+                    np.minimum.reduceat(records[:, 2:2 + c], starts, axis=0),
+                    np.maximum.reduceat(records[:, 2 + c:2 + 2 * c], starts, axis=0),
+                    np.add.reduceat(weighted, starts, axis=0) / counts[:, None],
+                ]
+            )
+            resolution = level * factor
+        c = n_channels
+        return {
+            "time": np.array(records[:, 0]),
+            "count": np.array(records[:, 1]),
+            "min": np.array(records[:, 2:2 + c].T),
+            "max": np.array(records[:, 2 + c:2 + 2 * c].T),
+            "mean": np.array(records[:, 2 + 2 * c:].T),
+            "resolution": resolution,
+        }
@@ -1,14 +1,19 @@
+from __future__ import annotations
+
 import json
 import socket
 import numpy as np
-import mne
 import pathlib
 import appdirs
 from contextlib import closing
+from typing import TYPE_CHECKING, Optional
 
 from collections import defaultdict
 from pydantic import ValidationError, BaseModel
 
+if TYPE_CHECKING:
+    import mne
+
 
 user_log_dir: pathlib.Path = pathlib.Path(
     appdirs.user_log_dir(appname="baboard", appauthor="Neurotechnology")
@@ -21,6 +26,7 @@ class RunningSessionOptions(BaseModel):
 
     current_save_file: str
     socket_port: int
+    event_port: Optional[int] = None
 
 
 def get_utils_dict() -> RunningSessionOptions | None:
@@ -37,20 +43,27 @@ def get_utils_dict() -> RunningSessionOptions | None:
 def convert_to_mne(
     data: dict,
     markers: dict,
+    copy: bool = True,
 ) -> mne.io.RawArray:
     """Convert data to MNE RawArray
 
     Args:
         data (dict): data to convert
         markers (dict): markers to add to the data
+        copy (bool): leave `data["data"]` untouched; with False a float64
+            array is scaled in place and shared with the RawArray
 
     Returns:
         mne.io.RawArray: converted data
 
     """
+    import mne
+
     info = create_info(data)
-    data_units = get_units_conversion(data)
-    data["data"] = data["data"] * data_units
+    if copy or data["data"].dtype != np.float64:
+        data["data"] = np.multiply(data["data"], get_units_conversion(data), dtype=np.float64)
+    else:
+        scale_units(data)
     raw_data = mne.io.RawArray(data["data"], info)
     onset = np.array([])
     description = []
@@ -84,6 +97,8 @@ def create_info(data: dict) -> mne.Info:
     Returns:
         mne.Info: MNE Info object.
     """
+    import mne
+
     channel_types = [
         "eeg" if _type == "EEG" else "misc" for _type in data["meta"]["channels_type"]
     ]
@@ -124,6 +139,24 @@ def get_units_conversion(data: dict) -> np.ndarray:
     return np.array(result).reshape(-1, 1)
 
 
+def scale_units(data: dict) -> dict:
+    """Convert `data["data"]` to volts in place.
+
+    Floating arrays keep their dtype, so float32 windows are scaled without
+    a float64 copy; other dtypes are converted to float64 first.
+
+    Args:
+        data (dict): data with "meta" channel units
+
+    Returns:
+        dict: the same dict
+    """
+    if not np.issubdtype(data["data"].dtype, np.floating) or not data["data"].flags.writeable:
+        data["data"] = data["data"].astype(np.float64)
+    data["data"] *= get_units_conversion(data).astype(data["data"].dtype)
+    return data
+
+
 def find_free_port() -> int:
     """Find a free port on the localhost
 
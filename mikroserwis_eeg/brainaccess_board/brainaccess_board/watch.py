@@ -0,0 +1,175 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+from typing import Optional
+
+from .sq import close_db, get_data_version, get_handle
+
+# inotify(7) constants
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal inotify watch on the directory of a database (Linux only)"""
+
+    def __init__(self, directory: pathlib.Path, names: set[str]) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+        self.names = names
+
+    def drain(self) -> bool:
+        """Read pending events, True if one of them concerns the database"""
+        relevant = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return relevant
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = EVENT.unpack_from(buffer, offset)
+                offset += EVENT.size
+                name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                relevant = relevant or name in self.names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class ChangeWatcher:
+    """Wakes callers when the board commits new rows to a database.
+
+    Commits are detected with `PRAGMA data_version` on a persistent
+    connection, polled with a backoff growing from `min_interval` to
+    `max_interval` while nothing changes. On Linux, inotify on the database
+    directory wakes waiters as soon as the `-wal` file is written and resets
+    the backoff, since the commit becomes visible only once the WAL index
+    has been updated as well.
+
+    Args:
+        filename (str | pathlib.Path): board database file
+        min_interval (float): first polling interval after a change, in seconds
+        max_interval (float): longest polling interval
+        use_inotify (bool): use inotify when available
+    """
+
+    def __init__(
+        self,
+        filename: str | pathlib.Path,
+        min_interval: float = 0.005,
+        max_interval: float = 0.25,
+        use_inotify: bool = True,
+    ) -> None:
+        self.filename = pathlib.Path(filename)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.handle = get_handle(self.filename)
+        self.version = get_data_version(self.handle)
+        self.inotify: Optional[_Inotify] = None
+        if use_inotify and sys.platform.startswith("linux"):
+            name = self.filename.name
+            try:
+                self.inotify = _Inotify(self.filename.resolve().parent, {name, f"{name}-wal"})
+            except OSError:
+                self.inotify = None
+
+    def changed(self) -> bool:
+        """Non-blocking check whether rows were committed since the last change"""
+        version = get_data_version(self.handle)
+        if version is None or version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def _next_interval(self) -> float:
+        interval = self.interval
+        self.interval = min(self.interval * 2, self.max_interval)
+        return interval
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until new rows are committed.
+
+        Args:
+            timeout (float | None): give up after this many seconds
+
+        Returns:
+            bool: True if the database changed, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.changed():
+                self.interval = self.min_interval
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            delay = self._next_interval()
+            if remaining is not None:
+                delay = min(delay, remaining)
+            if self.inotify is not None:
+                ready, _, _ = select.select([self.inotify.fd], [], [], delay)
+                if ready and self.inotify.drain():
+                    self.interval = self.min_interval
+            else:
+                time.sleep(delay)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """Asynchronous `wait`, the event loop keeps running while idle"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            if self.changed():
+                self.interval = self.min_interval
+                return True
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            delay = self._next_interval()
+            if remaining is not None:
+                delay = min(delay, remaining)
+            if self.inotify is not None:
+                event = asyncio.Event()
+                loop.add_reader(self.inotify.fd, event.set)
+                try:
+                    await asyncio.wait_for(event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    loop.remove_reader(self.inotify.fd)
+                if self.inotify.drain():
+                    self.interval = self.min_interval
+            else:
+                await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        close_db(self.handle)
+
+    def __enter__(self) -> "ChangeWatcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
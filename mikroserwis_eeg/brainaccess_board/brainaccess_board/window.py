@@ -0,0 +1,182 @@
+"""Recent-sample ring buffer and the binary format of downloaded windows.
+
+A window is sent as float32 samples in sample-major order, shape
+(n_samples, n_channels), little-endian. Two encodings are supported:
+
+- raw: `HEADER` (magic, n_channels, n_samples, sfreq, first and last sample
+  time), a uint32 length and the channel names as a JSON list, then the samples
+- npy: a standard `.npy` file, readable with `np.load`
+
+Both are produced by `iter_window` in chunks, so a server can stream them, and
+decoded by `decode_window`.
+"""
+import io
+import json
+import struct
+from typing import Any, Iterator, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"EEGWIN01"
+# magic, n_channels, n_samples, sfreq, first_time, last_time
+HEADER = struct.Struct("<8sIIddd")
+FORMATS = ("raw", "npy")
+WINDOW_DTYPE = np.dtype("<f4")
+CHUNK_BYTES = 64 * 1024
+
+
+class SampleRing:
+    """Fixed-size ring of the most recent samples and their times.
+
+    Args:
+        n_channels (int): number of channels
+        capacity (int): ring length in samples
+        dtype (np.dtype): sample dtype
+    """
+
+    def __init__(self, n_channels: int, capacity: int, dtype: np.dtype = np.float32) -> None:
+        self.n_channels = n_channels
+        self.capacity = max(1, capacity)
+        self.data = np.zeros((n_channels, self.capacity), dtype=dtype)
+        self.times = np.zeros(self.capacity, dtype=np.float64)
+        self.write_pos = 0
+
+    def __len__(self) -> int:
+        return min(self.write_pos, self.capacity)
+
+    def append(self, samples: np.ndarray, times: np.ndarray) -> None:
+        """Add samples of shape (n_channels, n) with their times, dropping the oldest"""
+        samples = samples[:, -self.capacity:]
+        times = np.ravel(times)[-self.capacity:]
+        count = samples.shape[1]
+        start = self.write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[:, start:start + first] = samples[:, :first]
+        self.data[:, : count - first] = samples[:, first:]
+        self.times[start:start + first] = times[:first]
+        self.times[: count - first] = times[first:]
+        self.write_pos += count
+
+    def _index(self) -> np.ndarray:
+        end = self.write_pos % self.capacity
+        return np.arange(end - len(self), end) % self.capacity
+
+    @property
+    def first_time(self) -> Optional[float]:
+        return float(self.times[self._index()[0]]) if len(self) else None
+
+    @property
+    def last_time(self) -> Optional[float]:
+        return float(self.times[(self.write_pos - 1) % self.capacity]) if len(self) else None
+
+    def covers(self, start: float) -> bool:
+        """Whether every sample from time `start` on is still in the ring"""
+        first = self.first_time
+        return first is not None and (first <= start or self.write_pos <= self.capacity)
+
+    def read(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        channels: Optional[Sequence[int]] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Copy of the samples with `start` <= time < `end`, in time order.
+
+        Returns:
+            tuple: samples (n_selected_channels, n) and their times
+        """
+        index = self._index()
+        times = self.times[index]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+        return self._take(index[lo:hi], channels)
+
+    def last(
+        self, seconds: float, channels: Optional[Sequence[int]] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Copy of the samples newer than `seconds` before the last one"""
+        index = self._index()
+        if not len(index):
+            return self._take(index, channels)
+        times = self.times[index]
+        lo = int(np.searchsorted(times, times[-1] - seconds, side="right"))
+        return self._take(index[lo:], channels)
+
+    def _take(
+        self, index: np.ndarray, channels: Optional[Sequence[int]]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        rows = slice(None) if channels is None else list(channels)
+        return self.data[rows][:, index], self.times[index]
+
+
+def iter_window(
+    data: np.ndarray,
+    sfreq: float,
+    channels: Sequence[str],
+    times: Optional[np.ndarray] = None,
+    fmt: str = "raw",
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """Encode a window of shape (n_channels, n_samples) in chunks.
+
+    Args:
+        data (np.ndarray): samples, converted to little-endian float32
+        sfreq (float): sampling rate in Hz
+        channels (Sequence[str]): channel names
+        times (np.ndarray | None): sample times, first and last go to the raw header
+        fmt (str): one of `FORMATS`
+        chunk_bytes (int): approximate size of the yielded chunks
+
+    Yields:
+        bytes: header followed by the samples
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown window format {fmt!r}, expected one of {FORMATS}")
+    samples = np.ascontiguousarray(np.asarray(data).T, dtype=WINDOW_DTYPE)
+    n_samples, n_channels = samples.shape
+    if fmt == "raw":
+        first = float(times[0]) if times is not None and len(times) else float("nan")
+        last = float(times[-1]) if times is not None and len(times) else float("nan")
+        names = json.dumps(list(channels)).encode()
+        yield (
+            HEADER.pack(MAGIC, n_channels, n_samples, sfreq, first, last)
+            + struct.pack("<I", len(names))
+            + names
+        )
+    else:
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header,
+            {"descr": WINDOW_DTYPE.str, "fortran_order": False, "shape": (n_samples, n_channels)},
+        )
+        yield header.getvalue()
+    rows = max(1, chunk_bytes // max(1, n_channels * WINDOW_DTYPE.itemsize))
+    for row in range(0, n_samples, rows):
+        yield samples[row:row + rows].tobytes()
+
+
+def decode_window(payload: bytes) -> dict[str, Any]:
+    """Decode a window produced by `iter_window` (either format).
+
+    Returns:
+        dict: "data" (n_channels, n_samples) float32, and for the raw format
+        "sfreq", "channels", "first_time" and "last_time"
+    """
+    if payload[:6] == b"\x93NUMPY":
+        return {"data": np.load(io.BytesIO(payload)).T}
+    magic, n_channels, n_samples, sfreq, first, last = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise ValueError("Not an EEG window payload")
+    (length,) = struct.unpack_from("<I", payload, HEADER.size)
+    offset = HEADER.size + 4
+    channels = json.loads(payload[offset:offset + length])
+    samples = np.frombuffer(
+        payload, dtype=WINDOW_DTYPE, count=n_samples * n_channels, offset=offset + length
+    )
+    return {
+        "data": samples.reshape(n_samples, n_channels).T,
+        "sfreq": sfreq,
+        "channels": channels,
+        "first_time": first,
+        "last_time": last,
+    }
@@ -0,0 +1,135 @@
+"""BoardEvents against a real ZMQ PUB socket on an ephemeral port.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m pytest tests
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+import pytest
+import zmq
+
+import brainaccess_board as bb
+from brainaccess_board import message_queue as mq
+
+TIMEOUT = 5.0
+WARMUP = "device.warmup"
+
+
+@pytest.fixture
+def publisher():
+    socket = zmq.Context.instance().socket(zmq.PUB)
+    socket.setsockopt(zmq.LINGER, 0)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    yield socket, port
+    socket.close()
+
+
+def send(socket, topic, payload):
+    socket.send_multipart([topic.encode(), json.dumps(payload).encode()])
+
+
+def wait_subscribed(socket, received):
+    """Publish warm-up events until the subscriber gets one (ZMQ slow joiner)"""
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        send(socket, WARMUP, {})
+        try:
+            if received.get(timeout=0.05).topic == WARMUP:
+                break
+        except queue.Empty:
+            continue
+    else:
+        raise TimeoutError("Subscriber did not connect")
+    # Drop warm-up events still in flight
+    time.sleep(0.1)
+    while not received.empty():
+        received.get_nowait()
+
+
+def drain(received, count):
+    return [received.get(timeout=TIMEOUT) for _ in range(count)]
+
+
+def test_parse_event_formats():
+    event = mq.parse_event([b"device.connected", b'{"device": "d0"}'])
+    assert (event.topic, event.data) == (mq.DEVICE_CONNECTED, {"device": "d0"})
+    event = mq.parse_event([b'{"event": "session.save_file", "current_save_file": "a.db"}'])
+    assert event.topic == mq.SAVE_FILE_CHANGED and event.data["current_save_file"] == "a.db"
+    assert mq.parse_event([b'{"command": "ping"}']).topic == "ping"
+    assert mq.parse_event([b"recording.started", b""]).data == {}
+
+
+def test_callbacks_run_in_listener_thread(publisher, caplog):
+    socket, port = publisher
+    events = bb.BoardEvents(port=port, topics=("device.", "session."), host="127.0.0.1",
+                            logger=logging.getLogger(__name__))
+    received = queue.Queue()
+    threads = set()
+
+    def record(event):
+        threads.add(threading.current_thread().name)
+        received.put(event)
+
+    def fail(event):
+        raise RuntimeError("callback failure")
+
+    events.on("", fail)
+    events.on("", record)
+    connected = []
+    events.on(mq.DEVICE_CONNECTED)(connected.append)
+
+    with events:
+        wait_subscribed(socket, received)
+        send(socket, mq.DEVICE_CONNECTED, {"device": "d0"})
+        send(socket, mq.RECORDING_STARTED, {})  # not subscribed
+        socket.send(json.dumps({"event": mq.SAVE_FILE_CHANGED, "current_save_file": "b.db"}).encode())
+        got = drain(received, 2)
+        time.sleep(0.2)
+
+    assert [e.topic for e in got] == [mq.DEVICE_CONNECTED, mq.SAVE_FILE_CHANGED]
+    assert got[0].data == {"device": "d0"}
+    assert got[1].data["current_save_file"] == "b.db"
+    assert received.empty()
+    # The failing callback is logged and does not stop the others
+    assert [e.data["device"] for e in connected] == ["d0"]
+    assert "callback failure" in caplog.text
+    assert threads == {"board-events"}
+    assert events._thread is None
+
+
+def test_async_iterator(publisher):
+    socket, port = publisher
+
+    async def consume():
+        topics = []
+        async for event in bb.BoardEvents(port=port, topics=("recording.",), host="127.0.0.1"):
+            topics.append(event.topic)
+            if event.topic == mq.RECORDING_STOPPED:
+                return topics
+
+    async def produce(task):
+        # Keep publishing until the iterator has subscribed
+        while not task.done():
+            send(socket, mq.DEVICE_CONNECTED, {})
+            send(socket, mq.RECORDING_STARTED, {})
+            await asyncio.sleep(0.05)
+            send(socket, mq.RECORDING_STOPPED, {})
+            await asyncio.sleep(0.05)
+
+    async def main():
+        task = asyncio.create_task(consume())
+        producer = asyncio.create_task(produce(task))
+        try:
+            return await asyncio.wait_for(task, TIMEOUT)
+        finally:
+            producer.cancel()
+
+    topics = asyncio.run(main())
+    assert topics[-1] == mq.RECORDING_STOPPED
+    assert set(topics) <= {mq.RECORDING_STARTED, mq.RECORDING_STOPPED}
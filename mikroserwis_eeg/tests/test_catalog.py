@@ -0,0 +1,33 @@
+"""SessionCatalog scans must leave the indexed files untouched.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m pytest tests
+"""
+import sqlite3
+
+import brainaccess_board as bb
+from benchmarks.synthetic import generate_session
+
+
+def test_scan_does_not_modify_other_files(tmp_path):
+    generate_session(tmp_path / "session.db", duration=5, marker_interval=0)
+    other = sqlite3.connect(tmp_path / "other.db")
+    other.execute("CREATE TABLE t (x)")
+    other.commit()
+    other.close()
+    (tmp_path / "junk.db").write_bytes(b"not a database" * 10)
+
+    with bb.SessionCatalog(tmp_path / "catalog.sqlite") as catalog:
+        first = catalog.scan(tmp_path)
+        second = catalog.scan(tmp_path)
+        assert len(catalog.find()) == 1
+
+    assert first == {"added": 1, "updated": 0, "unchanged": 0, "skipped": 2, "removed": 0}
+    # Skipped files are remembered, so the rescan opens nothing
+    assert second == {"added": 0, "updated": 0, "unchanged": 3, "skipped": 0, "removed": 0}
+    other = sqlite3.connect(tmp_path / "other.db")
+    assert other.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    other.close()
+    assert not (tmp_path / "other.db-wal").exists()
+    assert not (tmp_path / "other.db-shm").exists()
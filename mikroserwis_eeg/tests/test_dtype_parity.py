@@ -0,0 +1,51 @@
+"""float32 reads must score like the float64 path they replaced.
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+import brainaccess_board as bb
+from app import score_relaxation, stress_from_relaxation
+from benchmarks.synthetic import generate_session
+
+CHUNK = 250
+
+
+def _levels(path, device, dtype):
+    data = bb.ReadDB(str(path)).get_arrays(device=device, dtype=dtype, scale=True)[device]
+    # The processor's four channels are filtered together, channel 0 (o1) is scored
+    samples = data["data"][:4]
+    sfreq = data["meta"]["srate"]
+    filter_bank = bb.FilterBank(bandpass=(1.0, 40.0), notch=50.0)
+    baseline = bb.StreamingBaseline()
+    levels = []
+    # Streamed in chunks, like the processor reads new rows
+    for start in range(0, samples.shape[1], CHUNK):
+        filtered = filter_bank.process(device, samples[:, start:start + CHUNK], sfreq)
+        levels.append(score_relaxation(baseline, filtered[0], finetuning=1))
+    return data["data"].dtype, filtered.dtype, np.array(levels), baseline
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    path = tmp_path_factory.mktemp("parity") / "session.db"
+    info = generate_session(path, duration=60, marker_interval=0)
+    return path, info["devices"][0]
+
+
+def test_float32_scores_match_float64(session):
+    path, device = session
+    read32, filtered32, levels32, baseline32 = _levels(path, device, np.float32)
+    read64, filtered64, levels64, baseline64 = _levels(path, device, np.float64)
+
+    assert read32 == np.float32 and filtered32 == np.float32
+    assert read64 == np.float64 and filtered64 == np.float64
+    assert len(levels32) == len(levels64) > 1
+    np.testing.assert_allclose(levels32, levels64, atol=0.5)
+    assert [stress_from_relaxation(x) for x in levels32] == [
+        stress_from_relaxation(x) for x in levels64
+    ]
+    np.testing.assert_allclose(baseline32.mean, baseline64.mean, rtol=1e-4)
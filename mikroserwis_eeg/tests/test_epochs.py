@@ -0,0 +1,35 @@
+"""ReadDB.get_epochs on a synthetic session with markers "1"-"4".
+
+Run from the `mikroserwis_eeg` directory:
+
+    python -m pytest tests
+"""
+import mne
+import pytest
+
+import brainaccess_board as bb
+from benchmarks.synthetic import MARKER_DEVICE, generate_session
+
+
+@pytest.fixture(scope="module")
+def session(tmp_path_factory):
+    path = tmp_path_factory.mktemp("epochs") / "session.db"
+    info = generate_session(path, duration=20, marker_interval=2.0)
+    return bb.ReadDB(str(path)), info["devices"][0]
+
+
+def test_epochs_as_mne(session):
+    db, device = session
+    epochs = db.get_epochs(device, MARKER_DEVICE, event_filter={"1", "2"}, as_mne=True)
+    assert isinstance(epochs, mne.EpochsArray)
+    assert set(epochs.event_id) == {"1", "2"}
+    assert len(epochs) > 0
+
+
+def test_no_matching_events(session):
+    db, device = session
+    result = db.get_epochs(device, MARKER_DEVICE, event_filter="missing")
+    assert result["data"].shape[0] == 0
+    assert result["events"] == [] and result["dropped"] == 0
+    with pytest.raises(ValueError, match="No events match"):
+        db.get_epochs(device, MARKER_DEVICE, event_filter="missing", as_mne=True)